@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+
+class Overloaded(Exception):
+    """資源已滿（等待佇列已滿或排隊逾時），應立即回覆 503 / 429 並附 Retry-After。"""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """請求的截止時間已到。"""
+
+
+def new_deadline(timeout: Optional[float]) -> Optional[float]:
+    """把相對秒數轉成 event loop 時間上的截止時間。"""
+    if timeout is None or timeout <= 0:
+        return None
+    return asyncio.get_running_loop().time() + timeout
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """距離截止時間還剩幾秒；沒有截止時間時回傳 None，已超過時拋出 DeadlineExceeded。"""
+    if deadline is None:
+        return None
+    remaining = deadline - asyncio.get_running_loop().time()
+    if remaining <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return remaining
+
+
+def cap_timeout(timeout: Optional[float], deadline: Optional[float]) -> Optional[float]:
+    """取 timeout 與截止時間剩餘秒數中較小的一個。"""
+    remaining = time_left(deadline)
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class ResourceLimiter:
+    """
+    某一類資源（LLM、輕量工具、瀏覽器摘要…）的併發上限與有上限的等待佇列
+
+    - 同時最多 limit 個持有者，額外最多 max_waiting 個排隊，再多就立即拒絕
+    - 排隊最久等 max_wait 秒（或請求截止時間），逾時同樣拒絕
+    - 拒絕時附上依平均持有時間估算的 Retry-After
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int, max_wait: float = 30.0):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self._held_seconds = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def retry_after(self) -> float:
+        admitted = self.stats["admitted"]
+        average = self._held_seconds / admitted if admitted else 1.0
+        # 大約要等前面排隊的人都做完
+        return min(60.0, max(1.0, average * (self.waiting + 1) / self.limit))
+
+    def _reject(self, reason: str, key: str) -> Overloaded:
+        self.stats[key] += 1
+        return Overloaded(f"{self.name} is overloaded: {reason}", retry_after=self.retry_after())
+
+    async def acquire(self, deadline: Optional[float] = None):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            # 截止時間已過時在這裡就拋出 DeadlineExceeded，不算成排隊逾時
+            timeout = cap_timeout(self.max_wait, deadline)
+            if self.waiting >= self.max_waiting:
+                raise self._reject(f"{self.waiting} requests already waiting", "rejected")
+            self.waiting += 1
+            self.stats["queued"] += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                if timeout < self.max_wait:
+                    # 先到的是請求的截止時間，不是資源過載
+                    raise DeadlineExceeded(f"request deadline exceeded while waiting for {self.name}") from None
+                raise self._reject(f"waited longer than {self.max_wait}s", "timed_out") from None
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.stats["admitted"] += 1
+
+    def release(self, held_seconds: float = 0.0):
+        self.active -= 1
+        self._held_seconds += held_seconds
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        await self.acquire(deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "max_wait": self.max_wait,
+            **self.stats,
+        }
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, limit: int, max_waiting: int, max_wait: float) -> "ResourceLimiter":
+        """讀取 <prefix>_CONCURRENCY、<prefix>_QUEUE、<prefix>_QUEUE_TIMEOUT。"""
+        return cls(
+            name,
+            limit=int(os.getenv(f"{prefix}_CONCURRENCY", limit)),
+            max_waiting=int(os.getenv(f"{prefix}_QUEUE", max_waiting)),
+            max_wait=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", max_wait)),
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """取一個 token；成功回傳 0，否則回傳需要等待的秒數。"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    每個呼叫端（API key 或 IP）一個 token bucket：平均每秒 rate 個請求，最多連續 burst 個
+
+    只保留最近使用的 max_keys 個 bucket，避免大量不同 IP 讓記憶體無限增長。
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.stats = {"allowed": 0, "limited": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str) -> float:
+        """允許時回傳 0，否則回傳建議的 Retry-After 秒數。"""
+        if not self.enabled:
+            return 0.0
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.take()
+        self.stats["limited" if wait else "allowed"] += 1
+        return wait
+
+    def snapshot(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "keys": len(self._buckets), **self.stats}
@@ -0,0 +1,338 @@
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+import uuid
+import zlib
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 數字與 transcript id 之類的識別碼必須完全相同才算同一個問題（「3 加 5」與「3 加 6」的 n-gram 幾乎一樣）
+EXACT_TERMS = re.compile(r"[0-9a-f]{32}|\d+(?:\.\d+)?")
+# 關鍵詞：英文單字與中文字。字元 n-gram 看不出只換了一個詞的問題（Tokyo / Kyoto、台北 / 台南、decisions / action items），
+# 所以除了虛詞以外的詞都必須相同才算同一個問題，相似度只用來容許虛詞、標點與語序的差異
+KEY_TERMS = re.compile(r"[a-z]+(?:'[a-z]+)?|[\u4e00-\u9fff]")
+# 虛詞；否定詞（not、no、never、不、沒、未、別、無、非）刻意不列入，「safe」與「not safe」不會共用回答
+FUNCTION_WORDS = frozenset(
+    "a an the of from in on at to for by with about into and or is are was were be been being do does did "
+    "this that these those it its what which who whom whose how please can could would will should may might "
+    "me my i we our us you your tell give show".split()
+)
+FUNCTION_CHARS = frozenset("的了是嗎呢吧啊呀喔哦請幫我你您妳一下個這那些有在中和與及也都就還把被給讓要想能會可以麼什")
+# 關鍵詞相同時只剩語序與虛詞的差異：換句話說的問題約 0.71 以上，主詞受詞對調（台北到台南 / 台南到台北）約 0.67
+DEFAULT_THRESHOLD = 0.7
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def scope_hash(scope: str) -> int:
+    # 存成 int64 陣列，查詢時以向量化比較篩選同 scope 的項目
+    return int.from_bytes(hashlib.blake2b(scope.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class HashedNgramEncoder:
+    """
+    不需要模型的預設 encoder：字元 1~3-gram 以 crc32 雜湊到 dim 維（帶正負號），次數取 1 + log，最後做 L2 正規化。
+
+    中英文都適用，只能抓到字面上的相近（換句話說、同義詞抓不到）；crc32 在不同行程之間穩定，存到磁碟的向量可以沿用。
+    """
+
+    def __init__(self, dim: int = 512, ngram_range: tuple = (1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"hashed-ngram-{dim}-{ngram_range[0]}-{ngram_range[1]}"
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        counts = {}
+        text = normalize_query(text)
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                gram = text[i:i + n]
+                if gram.strip():
+                    counts[gram] = counts.get(gram, 0) + 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram, count in counts.items():
+            h = zlib.crc32(gram.encode("utf-8"))
+            vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+        return vector
+
+    def encode(self, texts: list) -> np.ndarray:
+        vectors = np.stack([self._encode_one(text) for text in texts])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class SentenceTransformerEncoder:
+    """本機的 sentence-transformers 模型（選用套件，第一次 encode 時才載入）。"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.name = f"sentence-transformers-{model_name}"
+        self._model = None
+
+    def encode(self, texts: list) -> np.ndarray:
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name)
+        return np.asarray(self._model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def load_encoder(spec: str):
+    """
+    依 ANSWER_CACHE_ENCODER 建立 encoder：
+
+    - hashed 或 hashed:<維度>              預設的字元 n-gram 雜湊
+    - sentence-transformers:<模型名稱>     本機 sentence-transformers 模型
+    - <module>:<屬性>                      自訂類別或工廠函式，回傳有 name 屬性與 encode(texts) -> 已正規化的 ndarray 的物件
+    """
+    kind, _, value = (spec or "hashed").partition(":")
+    if kind == "hashed":
+        return HashedNgramEncoder(dim=int(value or 512))
+    if kind == "sentence-transformers":
+        return SentenceTransformerEncoder(value or "all-MiniLM-L6-v2")
+    return getattr(importlib.import_module(kind), value)()
+
+
+class AnswerCache:
+    """
+    /query 的語意回答快取
+
+    以 encoder 把問題轉成向量，存在行程內的 NumPy 矩陣；查詢時計算與所有項目的 cosine 相似度，
+    scope（模型、工具版本、問題中的數字與識別碼、虛詞以外的關鍵詞）相同且相似度達 threshold 的最相近項目即為命中。
+    項目超過 ttl 秒過期；超過 max_entries 時淘汰最久沒被用到的項目。
+    設定 path 時啟動會載入先前的內容，並每 save_every 次寫入後與檔案中其他 worker 存的內容合併再存回磁碟（encoder 不同時不沿用）。
+    命中率與延遲分布每 report_every 次查詢以 logger 輸出一次。
+    """
+
+    def __init__(
+        self,
+        encoder,
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl: float = 3600,
+        max_entries: int = 2000,
+        max_query_chars: int = 2000,
+        path: Optional[str] = None,
+        save_every: int = 20,
+        report_every: int = 100,
+    ):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_query_chars = max_query_chars
+        self.path = path
+        self.save_every = save_every
+        self.report_every = report_every
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: list = []  # 與 _vectors 的列對齊：{"query", "answer", "scope", "created_at", "last_used"}
+        self._scopes = np.zeros(0, dtype=np.int64)  # 每一列的 scope_hash
+        self._unsaved = 0
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "skipped": 0, "stores": 0, "expired": 0, "evicted": 0}
+        # 最近的查詢延遲（秒），分成命中與未命中兩組
+        self._hit_latency = deque(maxlen=1000)
+        self._miss_latency = deque(maxlen=1000)
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        return cls(
+            load_encoder(os.getenv("ANSWER_CACHE_ENCODER", "hashed")),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000)),
+            max_query_chars=int(os.getenv("ANSWER_CACHE_MAX_QUERY_CHARS", 2000)),
+            path=os.getenv("ANSWER_CACHE_PATH", os.path.join("cache", "answer_cache.npz")) or None,
+            report_every=int(os.getenv("ANSWER_CACHE_REPORT_EVERY", 100)),
+        )
+
+    @staticmethod
+    def scope_for(query: str, context: str = "") -> str:
+        query = normalize_query(query)
+        terms = sorted(set(EXACT_TERMS.findall(query)))
+        keys = sorted({t for t in KEY_TERMS.findall(query) if t not in FUNCTION_WORDS and t not in FUNCTION_CHARS})
+        return f"{context}|{','.join(terms)}|{' '.join(keys)}"
+
+    def cacheable(self, query: str) -> bool:
+        # 直接貼上的長逐字稿不是「問題」，不做語意比對
+        return 0 < len(query) <= self.max_query_chars
+
+    def _expire(self, now: float):
+        # 項目依建立順序排列（淘汰只刪除、不重排），過期的一定是開頭的一段
+        expired = 0
+        while expired < len(self._entries) and now - self._entries[expired]["created_at"] > self.ttl:
+            expired += 1
+        if not expired:
+            return
+        self.stats["expired"] += expired
+        self._entries = self._entries[expired:]
+        self._vectors = self._vectors[expired:] if self._entries else None
+        self._scopes = self._scopes[expired:]
+
+    def encode(self, query: str) -> np.ndarray:
+        """只計算向量、不動到索引，可以交給其他執行緒（模型型 encoder 較慢時不卡住 event loop）。"""
+        return self.encoder.encode([query])[0].astype(np.float32)
+
+    def lookup(self, query: str, context: str = "", vector: Optional[np.ndarray] = None) -> Optional[dict]:
+        """回傳 {"answer", "similarity", "query"}，沒有夠相近的項目時回傳 None；vector 為 encode(query) 的結果。"""
+        if not self.cacheable(query):
+            self.stats["skipped"] += 1
+            return None
+        now = time.time()
+        self.stats["lookups"] += 1
+        self._expire(now)
+        best = None
+        if self._entries:
+            same_scope = self._scopes == scope_hash(self.scope_for(query, context))
+            if same_scope.any():
+                vector = vector if vector is not None else self.encode(query)
+                similarities = np.where(same_scope, self._vectors @ vector, -np.inf)
+                index = int(np.argmax(similarities))
+                if similarities[index] >= self.threshold:
+                    best = index
+        if best is None:
+            self.stats["misses"] += 1
+            self._maybe_report()
+            return None
+        entry = self._entries[best]
+        entry["last_used"] = now
+        self.stats["hits"] += 1
+        self._maybe_report()
+        return {"answer": entry["answer"], "similarity": round(float(similarities[best]), 4), "query": entry["query"]}
+
+    def record_latency(self, seconds: float, hit: bool):
+        """由呼叫端記錄整個查詢的耗時（命中：從收到查詢到回答；未命中：agent 迴圈）。"""
+        (self._hit_latency if hit else self._miss_latency).append(seconds)
+
+    def store(self, query: str, answer: str, context: str = "", vector: Optional[np.ndarray] = None) -> bool:
+        """加入一筆問答；回傳 True 表示累積的新項目已達 save_every，呼叫端應該呼叫 save()。"""
+        if not self.cacheable(query) or not answer:
+            return False
+        now = time.time()
+        row = (vector if vector is not None else self.encode(query))[None, :]
+        scope = self.scope_for(query, context)
+        self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+        self._scopes = np.append(self._scopes, scope_hash(scope))
+        self._entries.append({"query": query, "answer": answer, "scope": scope, "created_at": now, "last_used": now})
+        self.stats["stores"] += 1
+        if len(self._entries) > self.max_entries:
+            self._expire(now)
+        while len(self._entries) > self.max_entries:
+            oldest = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+            del self._entries[oldest]
+            self._vectors = np.delete(self._vectors, oldest, axis=0)
+            self._scopes = np.delete(self._scopes, oldest)
+            self.stats["evicted"] += 1
+        self._unsaved += 1
+        return bool(self.path) and self._unsaved >= self.save_every
+
+    def save(self):
+        """
+        存到 path（先寫暫存檔再改名）；會寫檔，在 async 程式中請以 asyncio.to_thread 呼叫。
+        索引只會被整個換掉（vstack / delete 都產生新陣列），這裡拿到的是當下的一致版本。
+        多個 worker 共用同一個檔案：寫入前先與檔案中的內容合併，不會蓋掉其他 worker 存的項目；
+        兩個 worker 剛好同時存檔時其中一方這次的新項目可能沒寫進去，它們仍在該 worker 的記憶體中，下次存檔會再寫入。
+        """
+        if not self.path:
+            return
+        entries, vectors = list(self._entries), self._vectors
+        self._unsaved = 0
+        stored = self._read()
+        if stored is not None:
+            entries, vectors = self._merge(stored, (entries, vectors))
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(
+            tmp_path,
+            vectors=vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32),
+            meta=np.array(json.dumps({"encoder": self.encoder.name, "entries": entries}, ensure_ascii=False)),
+        )
+        os.replace(tmp_path, self.path)
+
+    def _merge(self, *sources) -> tuple:
+        """合併多份 (entries, vectors)：同 scope 的同一個問題保留最近用到的，去掉過期的，最多保留 max_entries 筆。"""
+        now = time.time()
+        rows = {}
+        for entries, vectors in sources:
+            for entry, vector in zip(entries, vectors if vectors is not None else []):
+                if now - entry["created_at"] > self.ttl:
+                    continue
+                key = (entry["scope"], normalize_query(entry["query"]))
+                if key not in rows or entry["last_used"] >= rows[key][0]["last_used"]:
+                    rows[key] = (entry, vector)
+        kept = sorted(rows.values(), key=lambda row: row[0]["last_used"])[-self.max_entries:]
+        if not kept:
+            return [], None
+        # _expire 假設項目依建立順序排列
+        kept.sort(key=lambda row: row[0]["created_at"])
+        return [entry for entry, _ in kept], np.stack([vector for _, vector in kept]).astype(np.float32)
+
+    def _read(self) -> Optional[tuple]:
+        """讀取 path 中的 (entries, vectors)；沒有檔案、無法讀取或 encoder 不同時回傳 None。"""
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(str(data["meta"]))
+                vectors = data["vectors"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable answer cache {self.path}: {e}")
+            return None
+        if meta.get("encoder") != self.encoder.name:
+            logger.info(f"Answer cache {self.path} was built with {meta.get('encoder')}, ignoring it")
+            return None
+        entries = meta["entries"]
+        if not entries or len(entries) != len(vectors):
+            return None
+        return entries, vectors.astype(np.float32)
+
+    def _load(self):
+        stored = self._read()
+        if stored is not None:
+            self._entries, self._vectors = self._merge(stored)
+            self._scopes = np.array([scope_hash(entry["scope"]) for entry in self._entries], dtype=np.int64)
+        logger.info(f"Loaded {len(self._entries)} cached answers from {self.path}")
+
+    def _maybe_report(self):
+        if self.report_every and self.stats["lookups"] % self.report_every == 0:
+            snapshot = self.snapshot()
+            logger.info(
+                f"Answer cache: hit rate {snapshot['hit_rate']:.1%} ({self.stats['hits']}/{self.stats['lookups']}), "
+                f"{snapshot['entries']} entries, hit latency ms {snapshot['hit_latency_ms']}, "
+                f"miss latency ms {snapshot['miss_latency_ms']}"
+            )
+
+    @staticmethod
+    def _distribution(samples) -> dict:
+        if not samples:
+            return {}
+        values = sorted(samples)
+
+        def pick(p):
+            return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1] * 1000, 2)}
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "encoder": self.encoder.name,
+            "hit_latency_ms": self._distribution(self._hit_latency),
+            "miss_latency_ms": self._distribution(self._miss_latency),
+        }
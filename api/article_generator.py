@@ -1,14 +1,33 @@
 import os
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-import undetected_chromedriver as uc
+import logging
+from contextlib import contextmanager
 import time
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.callbacks import get_openai_callback
-from langchain_core.prompts import ChatPromptTemplate
+import asyncio
+import random
+from long_transcript import chunk_transcript
+from utils.tokens import estimate_tokens
+from utils.telemetry import span, record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+# Selenium、undetected_chromedriver、LangChain 與 openai 都在第一次用到的方法中才 import：
+# 工具伺服器啟動時不必載入它們，只提供 add / get_weather 等輕量工具的實例也不會佔用這些記憶體
+
+
+@contextmanager
+def _timed_step(timings: dict, name: str):
+    """記錄瀏覽器步驟耗時，同時產生 browser.<name> span（span_duration_seconds{span="browser.<name>"}）。"""
+    started = time.monotonic()
+    try:
+        with span(f"browser.{name}"):
+            yield
+    finally:
+        timings[name] = time.monotonic() - started
+
 
 class ArticleGenerator:
+    SUMMARY_PROMPT = "你是一位專業的技術會議紀錄助理，負責從系統開發、AI應用與Chatbot專案的會議逐字稿中，萃取並彙整出條理分明、專業且精煉的繁體中文會議摘要。請依據以下分類，並以Markdown格式、標題、條列式、加粗重點等方式，產出結構化的紀錄：一、技術討論要點 - 條列本次會議針對系統架構設計、Chatbot流程、AI模型選型與整合的核心技術討論（如API設計、資料流程、LLM/RAG部署邏輯、模型微調策略、第三方服務串接等）。如有提及API參數、資料結構、模型設定、流程圖或關鍵邏輯，請具體條列。若逐字稿資訊不足，請根據上下文合理推測，並以（推估）標註。二、系統與應用層決策 - 明確列出拍板定案的技術與應用方案（如：模型類型、開發框架、服務部署平台、前後端整合方式），並簡要補充決策依據或選型理由（如效能、成本、可擴展性等）。三、後續待辦與執行排程 - 條列尚待完成的具體項目，包含模型訓練、資料清洗、API建置、前端串接、測試/驗證流程等，並標明預計完成時程及預期產出。若有KPI或驗收標準（如自動化覆蓋率、流程時效等），請明確列出。四、任務負責人 / 技術角色 - 對應每項待辦，標註負責人或職能角色（如：後端工程師、ML Engineer、PM、QA、AI團隊）。五、技術風險與挑戰（如有）- 條列本次會議討論到的技術風險、挑戰，或需跨部門協作事項，並簡述應對策略。⚠️ 僅聚焦於技術與專案相關資訊，刪除非技術性閒聊與會議雜訊。請用專業術語、條列式、精煉描述，提升可讀性與專業度。如逐字稿資訊不足，請主動合理推估並標註（推估）。⚠️ 請勿在摘要中包含任何引用來源、段落標註或原文引文，僅呈現整理後的內容。"
+
     def __init__(self):
         self.user_data_dir: str = os.getenv('USER_DATA_DIR')
         self.profile_directory: str = os.getenv('PROFILE_DIRECTORY')
@@ -18,8 +37,29 @@ class ArticleGenerator:
         self.DIR = os.getenv('DIR')
         self.TEMPERATURE = float(os.getenv('TEMPERATURE', 0.7))
         self.MAX_TOKENS = int(os.getenv('MAX_TOKENS', 4096))
+        # Selenium 等待條件的逾時設定（秒）
+        self.ELEMENT_TIMEOUT = float(os.getenv('ELEMENT_TIMEOUT', 30))
+        self.ANSWER_TIMEOUT = float(os.getenv('ANSWER_TIMEOUT', 180))
+        self.ANSWER_POLL_INTERVAL = float(os.getenv('ANSWER_POLL_INTERVAL', 2))
+        self.ANSWER_STABLE_POLLS = int(os.getenv('ANSWER_STABLE_POLLS', 3))
+        # 長逐字稿 map-reduce 設定
+        self.LONG_TRANSCRIPT_CHUNK_TOKENS = int(os.getenv('LONG_TRANSCRIPT_CHUNK_TOKENS', 3000))
+        self.LONG_TRANSCRIPT_CONCURRENCY = int(os.getenv('LONG_TRANSCRIPT_CONCURRENCY', 4))
+        self.LONG_TRANSCRIPT_REDUCE_TOKENS = int(os.getenv('LONG_TRANSCRIPT_REDUCE_TOKENS', 12000))
+        # OpenAI 呼叫設定：逾時、重試（含隨機退避）與併發上限
+        self.OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 120))
+        self.OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 3))
+        self.OPENAI_CONCURRENCY = int(os.getenv('OPENAI_CONCURRENCY', 4))
+        self.OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+        self._llm = None
+        self._http_client = None
+        self._markdown_chains = {}
+        self._llm_semaphore = asyncio.Semaphore(self.OPENAI_CONCURRENCY)
+
+    def launch_webdriver(self, user_data_dir=None):
+        """啟動一個新的 Chrome；user_data_dir 可覆寫預設的使用者資料夾（同一個資料夾不能同時被兩個 Chrome 使用）。"""
+        import undetected_chromedriver as uc
 
-    def get_webdriver(self):
         for attempt in range(3):  # 嘗試最多 3 次
             try:
                 options = uc.ChromeOptions()
@@ -27,102 +67,304 @@ class ArticleGenerator:
                 options.add_argument("--disable-gpu")
                 options.add_argument("--disable-dev-shm-usage")
                 # options.add_argument("headless")
-                options.add_argument(f"--user-data-dir={self.user_data_dir}")
+                options.add_argument(f"--user-data-dir={user_data_dir or self.user_data_dir}")
                 options.add_argument(f'--profile-directory={self.profile_directory}')
-                self.driver=uc.Chrome(options=options, version_main=136, use_subprocess=True)
-                self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-                
-                return self.driver
+                with span("browser.driver_startup", attempt=attempt + 1):
+                    driver = uc.Chrome(options=options, version_main=136, use_subprocess=True)
+                    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
+                return driver
             except Exception as e:
-                print(f'Error: {e}')
-                print(f"WebDriver 啟動失敗，第 {attempt + 1} 次嘗試...")
+                logger.warning(f"WebDriver 啟動失敗，第 {attempt + 1} 次嘗試: {e}")
                 if attempt == 2:
                     raise e
                 time.sleep(2)  # 等待 2 秒後重試
 
-    def summarize_meeting(self, text):
+    def get_webdriver(self):
+        self.driver = self.launch_webdriver()
+        return self.driver
+
+    def summarize_meeting(self, text, driver=None, progress=None):
+        """
+        產生會議摘要，回傳 NotebookLM 的回答文字（由呼叫端決定存放位置，不寫入共用檔案）。
+
+        傳入 driver 時（由 BrowserPool 提供）只用該 driver 執行一次，錯誤直接拋出交給連線池處理；
+        未傳入時維持原本自行啟動瀏覽器、最多重試 3 次的行為。
+        progress(stage) 會在進入等待 NotebookLM 回答階段時被呼叫（在瀏覽器執行緒中）。
+        """
+        if driver is not None:
+            return self._summarize_with_driver(driver, text, progress)
+
         for attempt in range(3):
             try:
                 driver = self.get_webdriver()
-                url = "https://notebooklm.google.com/"
-                driver.get(url)
-                time.sleep(15)
-                # 新建專案 
-                new_created = driver.find_element(By.XPATH, '/html/body/labs-tailwind-root/div/welcome-page/div/div[2]/div[1]/div/button/span[2]')
-                while not new_created:
-                    time.sleep(0.1)
-                    new_created = driver.find_element(By.XPATH, '/html/body/labs-tailwind-root/div/welcome-page/div/div[2]/div[1]/div/button/span[2]')
-                new_created.click()
-                time.sleep(2)
-
-                # 找文字區塊按鈕
-                text_click = driver.find_element(By.XPATH, '//*[@id="mat-mdc-chip-4"]/span[2]/span')
-                driver.execute_script("arguments[0].scrollIntoView(true);", text_click)
-                while not text_click:
-                    time.sleep(0.1)
-                    text_click = driver.find_element(By.XPATH, '//*[@id="mat-mdc-chip-4"]/span[2]/span')
-                    driver.execute_script("arguments[0].scrollIntoView(true);", text_click)
-                text_click.click()
-                time.sleep(1)
-                # 找到 textarea 並輸入網址
-                text_input = driver.find_element(By.ID, 'mat-input-0')
-                while not text_input:
-                    time.sleep(0.1)
-                    text_input = driver.find_element(By.ID, 'mat-input-0')
-                text_input.send_keys(text)
-                text_button = driver.find_element(By.XPATH, '//button//span[contains(text(), " Insert ")]')
-                while not text_button:
-                    time.sleep(0.1)
-                    text_button = driver.find_element(By.XPATH, '//button//span[contains(text(), " Insert ")]')
-                text_button.click()
-                print(f'成功輸入文字: {text}')
-                time.sleep(7)
-
-
-                # 上面幾層
-                omnibar = driver.find_element(By.TAG_NAME, 'chat-panel').find_element(By.TAG_NAME, 'omnibar')
+                return self._summarize_with_driver(driver, text, progress)
+            except Exception as e:
+                # launch_webdriver 本身失敗時 self.driver 仍是 None
+                logger.error(f"summarize_meeting attempt {attempt + 1} failed: {e}")
+            finally:
+                self._quit_driver()
+        return False
+
+    def _quit_driver(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"driver quit failed: {e}")
+        self.driver = None
+
+    def _summarize_with_driver(self, driver, text, progress=None):
+        """
+        操作 NotebookLM 產生摘要；每個步驟都等待明確的就緒條件，而不是固定 sleep。
+        每個步驟的耗時會寫入 log，方便觀察時間花在哪裡。
+        """
+        from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        timings = {}
+        wait = WebDriverWait(driver, self.ELEMENT_TIMEOUT, poll_frequency=0.2)
+
+        with _timed_step(timings, "page_load"):
+            driver.get("https://notebooklm.google.com/")
+            # 新建專案
+            new_created = wait.until(EC.element_to_be_clickable(
+                (By.XPATH, '/html/body/labs-tailwind-root/div/welcome-page/div/div[2]/div[1]/div/button/span[2]')))
+        with _timed_step(timings, "new_notebook"):
+            new_created.click()
+            # 找文字區塊按鈕
+            text_click = wait.until(EC.presence_of_element_located((By.XPATH, '//*[@id="mat-mdc-chip-4"]/span[2]/span')))
+            driver.execute_script("arguments[0].scrollIntoView(true);", text_click)
+            wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="mat-mdc-chip-4"]/span[2]/span'))).click()
+        with _timed_step(timings, "insert_text"):
+            # 找到 textarea 並輸入文字
+            text_input = wait.until(EC.visibility_of_element_located((By.ID, 'mat-input-0')))
+            text_input.send_keys(text)
+            wait.until(EC.element_to_be_clickable((By.XPATH, '//button//span[contains(text(), " Insert ")]'))).click()
+            logger.debug(f'成功輸入文字: {len(text)} 字')
+        with _timed_step(timings, "chat_ready"):
+            # 來源處理完成後，聊天輸入框才會變成可輸入
+            def prompt_input_ready(d):
+                omnibar = d.find_element(By.TAG_NAME, 'chat-panel').find_element(By.TAG_NAME, 'omnibar')
                 box = omnibar.find_element(By.TAG_NAME, 'query-box')
                 prompt_input = box.find_element(By.TAG_NAME, 'textarea')
-                while not prompt_input.is_displayed() or not prompt_input.is_enabled():
-                    time.sleep(0.1)
-                    prompt_input = box.find_element(By.TAG_NAME, 'textarea')
-                
-                j = 1
-                complete_prompt = "你是一位專業的技術會議紀錄助理，負責從系統開發、AI應用與Chatbot專案的會議逐字稿中，萃取並彙整出條理分明、專業且精煉的繁體中文會議摘要。請依據以下分類，並以Markdown格式、標題、條列式、加粗重點等方式，產出結構化的紀錄：一、技術討論要點 - 條列本次會議針對系統架構設計、Chatbot流程、AI模型選型與整合的核心技術討論（如API設計、資料流程、LLM/RAG部署邏輯、模型微調策略、第三方服務串接等）。如有提及API參數、資料結構、模型設定、流程圖或關鍵邏輯，請具體條列。若逐字稿資訊不足，請根據上下文合理推測，並以（推估）標註。二、系統與應用層決策 - 明確列出拍板定案的技術與應用方案（如：模型類型、開發框架、服務部署平台、前後端整合方式），並簡要補充決策依據或選型理由（如效能、成本、可擴展性等）。三、後續待辦與執行排程 - 條列尚待完成的具體項目，包含模型訓練、資料清洗、API建置、前端串接、測試/驗證流程等，並標明預計完成時程及預期產出。若有KPI或驗收標準（如自動化覆蓋率、流程時效等），請明確列出。四、任務負責人 / 技術角色 - 對應每項待辦，標註負責人或職能角色（如：後端工程師、ML Engineer、PM、QA、AI團隊）。五、技術風險與挑戰（如有）- 條列本次會議討論到的技術風險、挑戰，或需跨部門協作事項，並簡述應對策略。⚠️ 僅聚焦於技術與專案相關資訊，刪除非技術性閒聊與會議雜訊。請用專業術語、條列式、精煉描述，提升可讀性與專業度。如逐字稿資訊不足，請主動合理推估並標註（推估）。⚠️ 請勿在摘要中包含任何引用來源、段落標註或原文引文，僅呈現整理後的內容。"
-                try:
-                    prompt_input.send_keys(complete_prompt)
-                    prompt_input.send_keys(Keys.RETURN)
-                except Exception as e:
-                    print(f'Error: {e}')
-                    # 使用 JavaScript 強制發送鍵盤事件
-                    driver.execute_script("arguments[0].value = arguments[1];", prompt_input, complete_prompt)  # 將文字輸入到 input
-                    driver.execute_script("arguments[0].dispatchEvent(new Event('input'));", prompt_input)  # 觸發 input 事件
-
-
-                print('等候答案')
-                time.sleep(40)  # 等待答案生成
-                message = driver.find_element(By.TAG_NAME, 'chat-panel').find_elements(By.TAG_NAME, 'chat-message')[j]
-                while not message.is_displayed() or not message.is_enabled():
-                    time.sleep(0.1)
-                    message = driver.find_element(By.TAG_NAME, 'chat-panel').find_elements(By.TAG_NAME, 'chat-message')[j]
-            
-                is_succesed = self.save_article_as_txt(message.text)
-                if is_succesed:
-                    return 'summary.txt 生成成功'
-                else:
-                    return '存檔失敗'
+                return prompt_input if prompt_input.is_displayed() and prompt_input.is_enabled() else False
+            prompt_input = WebDriverWait(
+                driver, self.ELEMENT_TIMEOUT, poll_frequency=0.2,
+                ignored_exceptions=(NoSuchElementException, StaleElementReferenceException),
+            ).until(prompt_input_ready)
+            message_count = len(self._chat_messages(driver))
+
+        with _timed_step(timings, "send_prompt"):
+            complete_prompt = self.SUMMARY_PROMPT
+            try:
+                prompt_input.send_keys(complete_prompt)
+                prompt_input.send_keys(Keys.RETURN)
             except Exception as e:
-                print("出現錯誤: ", str(e))
-                self.driver.quit()
-                self.driver = None
+                logger.warning(f"send_keys failed, falling back to JavaScript input: {e}")
+                # 使用 JavaScript 強制發送鍵盤事件
+                driver.execute_script("arguments[0].value = arguments[1];", prompt_input, complete_prompt)  # 將文字輸入到 input
+                driver.execute_script("arguments[0].dispatchEvent(new Event('input'));", prompt_input)  # 觸發 input 事件
 
-        if self.driver:
-            time.sleep(5)
-            self.driver.quit()
-            return False
+        if progress is not None:
+            progress("notebooklm_answer")
+        with _timed_step(timings, "answer_wait"):
+            answer = self._wait_for_answer(driver, message_count)
+
+        logger.info("NotebookLM step timings: " + ", ".join(f"{k}={v:.1f}s" for k, v in timings.items()))
+        return answer
+
+    def _chat_messages(self, driver):
+        from selenium.webdriver.common.by import By
+
+        return driver.find_element(By.TAG_NAME, 'chat-panel').find_elements(By.TAG_NAME, 'chat-message')
+
+    def _wait_for_answer(self, driver, message_count):
+        """
+        送出前有 message_count 則訊息：第 message_count 則是送出的提示，回答是緊接在後的那一則
+        （提示的顯示文字可能多了標籤或被截短，不能用內容判斷哪一則是提示）。
+        等待回答出現，並在其文字連續 ANSWER_STABLE_POLLS 次輪詢都沒有變化時視為生成完成。
+        輪詢間隔從 0.5 秒開始，逐步放寬到 ANSWER_POLL_INTERVAL，快速回覆不用多等，慢的回覆也不會逾時失敗。
+        """
+        from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+
+        deadline = time.monotonic() + self.ANSWER_TIMEOUT
+        interval = 0.5
+        last_text = None
+        stable_polls = 0
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.ANSWER_POLL_INTERVAL)
+            try:
+                messages = self._chat_messages(driver)
+                if len(messages) <= message_count + 1:
+                    continue
+                current = messages[message_count + 1].text.strip()
+            except (NoSuchElementException, StaleElementReferenceException):
+                continue
+            if not current:
+                continue
+            if current == last_text:
+                stable_polls += 1
+                if stable_polls >= self.ANSWER_STABLE_POLLS:
+                    return current
+            else:
+                last_text = current
+                stable_polls = 0
+        if last_text:
+            logger.warning(f"Answer did not stabilise within {self.ANSWER_TIMEOUT}s, using latest text")
+            return last_text
+        raise TimeoutException(f"NotebookLM did not answer within {self.ANSWER_TIMEOUT}s")
+
+    CHUNK_PROMPT = """
+你是一位專業的技術會議紀錄助理。以下是一場長會議逐字稿中的第 {index}/{total} 段。
+請只根據這一段內容，以繁體中文條列出：技術討論要點、已拍板的決策、後續待辦（含時程）、負責人 / 角色、技術風險與挑戰。
+沒有相關內容的類別請略過，不要推測其他段落的內容，不要加入引用來源或原文引文，保持精簡。
+"""
+
+    MERGE_PROMPT = """
+你是一位專業的技術會議紀錄助理。以下是同一場會議多個段落的重點整理，
+請合併為一份不重複的條列重點（技術討論要點、決策、待辦與時程、負責人、風險），保留所有具體資訊，以繁體中文輸出。
+"""
+
+    def _get_llm(self):
+        """
+        整個 ArticleGenerator 共用同一個 ChatOpenAI 與 httpx 連線池，避免每次呼叫都重新建立用戶端與 TLS 連線。
+        重試由 _ainvoke_with_retry 負責，因此關閉 SDK 內建的重試。
+        """
+        if self._llm is None:
+            import httpx
+            from langchain_openai import ChatOpenAI
+
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=self.OPENAI_MAX_CONNECTIONS,
+                ),
+                timeout=self.OPENAI_TIMEOUT,
+            )
+            self._llm = ChatOpenAI(
+                model_name=self.MODEL,
+                temperature=self.TEMPERATURE,
+                api_key=self.OPEN_API_KEY,
+                max_tokens=self.MAX_TOKENS,
+                max_retries=0,
+                http_async_client=self._http_client)
+        return self._llm
+
+    def _get_markdown_chain(self, language):
+        # prompt 只和語言有關，依語言建立一次後重複使用
+        chain = self._markdown_chains.get(language)
+        if chain is None:
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_core.prompts import ChatPromptTemplate
+
+            qa_prompt = ChatPromptTemplate.from_messages(
+                [
+                    ("system", self.markdown_system_prompt(language)),
+                    ("human", "{content}"),
+                ]
+            )
+            chain = (
+                qa_prompt
+                | self._get_llm()
+                | StrOutputParser()
+            )
+            self._markdown_chains[language] = chain
+        return chain
+
+    async def _ainvoke_with_retry(self, runnable, payload):
+        """
+        以 ainvoke 呼叫，受 OPENAI_CONCURRENCY 併發上限與 OPENAI_TIMEOUT 逾時限制；
+        暫時性錯誤（逾時、連線、速率限制、5xx）以 full-jitter 指數退避重試 OPENAI_MAX_RETRIES 次。
+        """
+        import openai
+
+        retryable = (
+            asyncio.TimeoutError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        )
+        for attempt in range(self.OPENAI_MAX_RETRIES + 1):
+            try:
+                async with self._llm_semaphore:
+                    return await asyncio.wait_for(runnable.ainvoke(payload), self.OPENAI_TIMEOUT)
+            except retryable as e:
+                if attempt >= self.OPENAI_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, min(30.0, 1.0 * 2 ** attempt))
+                logger.warning(f"OpenAI call failed ({type(e).__name__}: {e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _acomplete(self, system_prompt, content):
+        from langchain_core.messages import SystemMessage, HumanMessage
+
+        response = await self._ainvoke_with_retry(
+            self._get_llm(), [SystemMessage(content=system_prompt), HumanMessage(content=content)])
+        return response.content
+
+    async def summarize_long_transcript(self, text, language="繁體中文", progress=None):
+        """
+        長逐字稿模式（map-reduce）：
+
+        1. 依講者 / 段落邊界切成不超過 LONG_TRANSCRIPT_CHUNK_TOKENS 的段落
+        2. 以最多 LONG_TRANSCRIPT_CONCURRENCY 個併發請求分別摘要每一段
+        3. 段落重點總量超過 LONG_TRANSCRIPT_REDUCE_TOKENS 時分組合併，直到能放進單一 prompt
+        4. 以與 convert_to_markdown_from_openai 相同的五大分類產出最終 Markdown
+        """
+        from langchain_community.callbacks import get_openai_callback
+
+        chunks = chunk_transcript(text, self.LONG_TRANSCRIPT_CHUNK_TOKENS, self.MODEL)
+        semaphore = asyncio.Semaphore(self.LONG_TRANSCRIPT_CONCURRENCY)
+        started = time.monotonic()
+
+        async def bounded(system_prompt, content):
+            async with semaphore:
+                return await self._acomplete(system_prompt, content)
+
+        if progress is not None:
+            progress("chunk_summaries")
+        with get_openai_callback() as cb:
+            partials = await asyncio.gather(*(
+                bounded(self.CHUNK_PROMPT.format(index=i + 1, total=len(chunks)), chunk)
+                for i, chunk in enumerate(chunks)
+            ))
+            logger.info(f"Long transcript: {len(chunks)} chunks summarised in {time.monotonic() - started:.1f}s")
+
+            # 段落重點仍太長時分組合併，每一輪都會讓總量變少
+            while len(partials) > 1 and estimate_tokens("\n\n".join(partials), self.MODEL) > self.LONG_TRANSCRIPT_REDUCE_TOKENS:
+                groups = []
+                current, current_tokens = [], 0
+                for partial in partials:
+                    tokens = estimate_tokens(partial, self.MODEL)
+                    if current and current_tokens + tokens > self.LONG_TRANSCRIPT_REDUCE_TOKENS:
+                        groups.append(current)
+                        current, current_tokens = [], 0
+                    current.append(partial)
+                    current_tokens += tokens
+                groups.append(current)
+                if len(groups) == len(partials):
+                    break  # 每段都已單獨超過上限，無法再合併
+                partials = await asyncio.gather(*(bounded(self.MERGE_PROMPT, "\n\n".join(group)) for group in groups))
 
-    def convert_to_markdown_from_openai(self, language="繁體中文"):
-        system_prompt = f"""
+            if progress is not None:
+                progress("markdown")
+            combined = "\n\n".join(f"## 第 {i + 1} 部分重點\n{partial}" for i, partial in enumerate(partials))
+            result = await self._acomplete(self.markdown_system_prompt(language), combined)
+
+        record_llm_usage(self.MODEL, cb.prompt_tokens, cb.completion_tokens, caller="long_transcript", cost=cb.total_cost)
+        logger.info(f"Long transcript summarised in {time.monotonic() - started:.1f}s "
+                    f"({len(chunks)} chunks, {cb.total_tokens} tokens, ${cb.total_cost:.4f})")
+        return result
+
+    def markdown_system_prompt(self, language="繁體中文"):
+        return f"""
 你是一位專業的技術會議校稿助理，負責從系統開發、AI 應用與 Chatbot 專案的概況中，萃取並彙整出條理分明、專業且精煉的繁體中文會議摘要。請依據以下分類，並以Markdown格式、標題、條列式、加粗重點等方式，再次產出結構化的紀錄，並轉為{language}：
 
 1. 技術討論要點
@@ -151,65 +393,27 @@ class ArticleGenerator:
 如逐字稿資訊不足，請主動合理推估並標註（推估）。
 ⚠️ 請勿在摘要中包含任何引用來源、段落標註或原文引文，僅呈現整理後的內容。
 """
-        # 將內容轉換為 Markdown 格式
-        with open(self.DIR + '/summary.txt', 'r', encoding='utf-8-sig') as file:
-            content = file.read()
-        with get_openai_callback() as cb:
-            model_name = self.MODEL
-            llm = ChatOpenAI(
-                model_name=model_name, 
-                temperature=self.TEMPERATURE, 
-                api_key=self.OPEN_API_KEY, 
-                max_tokens=self.MAX_TOKENS)
-
-            qa_prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system_prompt),
-                    ("human", "{content}"),
-                ]
-            )
 
-            rag_chain = (
-                qa_prompt
-                | llm
-                | StrOutputParser()
-            )
+    async def convert_to_markdown_from_openai(self, content, language="繁體中文"):
+        """把瀏覽器階段的摘要文字（記憶體中傳入）交給 OpenAI 重整為 Markdown，回傳 Markdown 字串。"""
+        from langchain_community.callbacks import get_openai_callback
 
-            result = rag_chain.invoke(
+        # 將內容轉換為 Markdown 格式
+        with span("llm.markdown", model=self.MODEL) as llm_span, get_openai_callback() as cb:
+            result = await self._ainvoke_with_retry(
+                self._get_markdown_chain(language),
                 {"content": content}
             )
+            llm_span.set(prompt_tokens=cb.prompt_tokens, completion_tokens=cb.completion_tokens)
 
+        record_llm_usage(self.MODEL, cb.prompt_tokens, cb.completion_tokens, caller="markdown", cost=cb.total_cost)
+        logger.info(f"Markdown conversion: {cb.prompt_tokens} prompt + {cb.completion_tokens} completion tokens, "
+                    f"${cb.total_cost:.4f}")
+        return result
 
-        print(f"Total Tokens: {cb.total_tokens}")
-        print(f"Prompt Tokens: {cb.prompt_tokens}")
-        print(f"Completion Tokens: {cb.completion_tokens}")
-        print(f"Total Cost (USD): ${cb.total_cost}")
-        # 將結果保存為 Markdown 文件
-        is_success = self.save_article_as_md(result, filename=self.DIR + '/summary.md')
-        return is_success
-
-    def save_article_as_md(self, content):
-        # 打開或創建一個 .md 文件
-        try:
-            filename = self.DIR + '/summary.md'
-            with open(filename, 'w+', encoding='utf-8-sig') as file:
-                # 將文章內容寫入文件
-                file.write(content)
-                print(f"文章已成功保存為 {filename}")
-            return True
-        except Exception as e:
-            print(f"保存文章時發生錯誤: {str(e)}")
-            return False
-
-    def save_article_as_txt(self, content):
-        # 打開或創建一個 .txt 文件
-        try:
-            filename = self.DIR + '/summary.txt'
-            with open(filename, 'w+', encoding='utf-8-sig') as file:
-                # 將文章內容寫入文件
-                file.write(content)
-                print(f"文章已成功保存為 {filename}")
-            return True
-        except Exception as e:
-            print(f"保存文章時發生錯誤: {str(e)}")
-            return False
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            self._llm = None
+            self._markdown_chains = {}
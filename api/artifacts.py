@@ -0,0 +1,66 @@
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RunArtifacts:
+    """單次摘要執行的輸出資料夾（<root>/<run_id>/），不同執行之間互不干擾。"""
+
+    def __init__(self, root: str, run_id: str):
+        self.id = run_id
+        self.path = os.path.join(root, run_id)
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def write_text(self, name: str, content: str) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        path = self.file(name)
+        # 先寫暫存檔再改名，讀取端不會看到寫到一半的內容
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8-sig') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+
+class ArtifactStore:
+    """
+    摘要產出物的存放位置
+
+    每次執行都有自己的資料夾，並依保留政策清除舊資料：
+    超過 max_age 秒，或總數超過 max_runs 時從最舊的開始刪除。
+    """
+
+    def __init__(self, root: str, max_age: float = 7 * 24 * 3600, max_runs: int = 200):
+        self.root = root
+        self.max_age = max_age
+        self.max_runs = max_runs
+
+    def new_run(self, run_id: Optional[str] = None) -> RunArtifacts:
+        return RunArtifacts(self.root, run_id or uuid.uuid4().hex)
+
+    def cleanup(self) -> int:
+        """依保留政策刪除舊的執行資料夾，回傳刪除的數量。"""
+        if not os.path.isdir(self.root):
+            return 0
+        runs = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                runs.append((entry.stat().st_mtime, entry.path))
+        runs.sort(reverse=True)  # 新的在前
+
+        now = time.time()
+        removed = 0
+        for index, (mtime, path) in enumerate(runs):
+            if index >= self.max_runs or now - mtime > self.max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} old summary artifact folder(s) from {self.root}")
+        return removed
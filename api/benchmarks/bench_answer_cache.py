@@ -0,0 +1,130 @@
+"""
+回答快取（answer_cache.AnswerCache）的查詢延遲與命中品質，不需要啟動服務
+
+1. 延遲：索引中有 N 筆問題時，一次查詢（encode + 相似度搜尋）的 p50 / p95
+2. 命中品質：換句話說的問題應該命中；數字、地名、否定或主題不同的問題不應該命中，
+   任何一組不符合預期時以非 0 結束
+
+    cd api
+    uv run ./benchmarks/bench_answer_cache.py --sizes 100 1000 5000
+    uv run ./benchmarks/bench_answer_cache.py --encoder sentence-transformers:all-MiniLM-L6-v2 --threshold 0.8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import DEFAULT_THRESHOLD, AnswerCache, load_encoder  # noqa: E402
+from bench_offline import percentile  # noqa: E402
+
+TOPICS = ["向量資料庫", "前端排版", "API 參數", "部署流程", "測試覆蓋率", "資料標註", "模型評估", "權限管理"]
+TEMPLATES = [
+    "幫我整理第 {n} 場會議關於{topic}的決議",
+    "第 {n} 次會議中{topic}有哪些待辦事項？",
+    "summarize the action items about {topic} from meeting {n}",
+]
+# (已快取的問題, 新問題, 是否應該命中)
+PAIRS = [
+    ("請幫我整理這場會議的決議", "幫我整理這場會議的決議。", True),
+    ("這場會議有哪些待辦事項？", "這場會議有哪些待辦事項", True),
+    ("summarize the decisions of this meeting", "Summarize the decisions from this meeting", True),
+    ("What were the decisions in this meeting?", "what were the decisions in this meeting", True),
+    ("會議中誰負責前端排版？", "會議中前端排版是誰負責？", True),
+    ("今天台北天氣如何", "台北今天天氣如何", True),
+    # 多了關鍵詞（事項）就不命中：寧可重新回答也不拿錯的回答
+    ("幫我整理這場會議的決議", "請幫我整理這場會議的決議事項", False),
+    ("請幫我計算 3 加 5", "請幫我計算 3 加 6", False),
+    ("第 12 場會議的決議", "第 13 場會議的決議", False),
+    ("幫我整理這場會議的決議", "今天台北的天氣如何", False),
+    ("這場會議有哪些待辦事項？", "這場會議有哪些風險？", False),
+    ("what is the weather in Tokyo today", "what is the weather in Kyoto today", False),
+    ("台北今天的天氣如何", "台南今天的天氣如何", False),
+    ("is it safe to deploy on friday", "is it not safe to deploy on friday", False),
+    ("這個版本可以上線嗎", "這個版本不可以上線嗎", False),
+    ("summarize the decisions of this meeting", "summarize the action items of this meeting", False),
+    ("台北到台南要多久", "台南到台北要多久", False),
+]
+CONTEXT = "bench|tools"
+
+
+def make_questions(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(n=i, topic=rng.choice(TOPICS)) for i in range(count)]
+
+
+def measure_latency(encoder, size: int, lookups: int, seed: int) -> dict:
+    cache = AnswerCache(encoder, max_entries=size, ttl=3600)
+    questions = make_questions(size, seed)
+    for question in questions:
+        cache.store(question, "answer", CONTEXT)
+    rng = random.Random(seed + 1)
+    hit, miss = [], []
+    for _ in range(lookups):
+        # 一半是索引中已有的問題，一半是新的問題
+        query = rng.choice(questions) if rng.random() < 0.5 else rng.choice(TEMPLATES).format(n=size + rng.randrange(10 ** 6), topic="其他")
+        started = time.perf_counter()
+        result = cache.lookup(query, CONTEXT, cache.encode(query))
+        (hit if result else miss).append(time.perf_counter() - started)
+    both = hit + miss
+    return {
+        "entries": size,
+        "lookups": lookups,
+        "hit_rate": round(len(hit) / lookups, 3),
+        "p50_ms": round(percentile(both, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(both, 0.95) * 1000, 3),
+        "max_ms": round(max(both) * 1000, 3),
+    }
+
+
+def measure_quality(encoder, threshold: float) -> dict:
+    rows = []
+    for cached, query, expected in PAIRS:
+        cache = AnswerCache(encoder, threshold=threshold)
+        cache.store(cached, "answer", CONTEXT)
+        similarity = float(cache._vectors[0] @ cache.encode(query))
+        hit = cache.lookup(query, CONTEXT) is not None
+        rows.append({"cached": cached, "query": query, "similarity": round(similarity, 3), "hit": hit, "expected": expected})
+    return {
+        "threshold": threshold,
+        "true_hits": sum(r["hit"] and r["expected"] for r in rows),
+        "missed": sum(not r["hit"] and r["expected"] for r in rows),
+        "false_hits": sum(r["hit"] and not r["expected"] for r in rows),
+        "pairs": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lookup latency and hit quality of the semantic answer cache")
+    parser.add_argument("--encoder", default="hashed", help="同 ANSWER_CACHE_ENCODER")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果 JSON 路徑")
+    args = parser.parse_args()
+
+    encoder = load_encoder(args.encoder)
+    result = {"benchmark": "answer_cache", "encoder": encoder.name, "latency": [], "quality": measure_quality(encoder, args.threshold)}
+    for size in args.sizes:
+        level = measure_latency(encoder, size, args.lookups, args.seed)
+        result["latency"].append(level)
+        print(f"entries={size:<6} p50={level['p50_ms']:.3f}ms p95={level['p95_ms']:.3f}ms max={level['max_ms']:.3f}ms hit_rate={level['hit_rate']}")
+    quality = result["quality"]
+    for row in quality["pairs"]:
+        mark = "ok " if row["hit"] == row["expected"] else "BAD"
+        print(f"{mark} {row['similarity']:.3f} {'hit ' if row['hit'] else 'miss'} {row['cached']} -> {row['query']}")
+    print(f"threshold {args.threshold}: {quality['true_hits']} true hits, {quality['missed']} missed, {quality['false_hits']} false hits")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if quality["missed"] or quality["false_hits"]:
+        sys.exit(f"answer cache quality check failed at threshold {args.threshold}")
+
+
+if __name__ == "__main__":
+    main()
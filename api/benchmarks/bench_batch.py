@@ -0,0 +1,127 @@
+"""
+/query/batch 吞吐量：項目數增加時，逐筆呼叫 /query 與一次送出批次的比較
+
+sequential：像原本的夜間批次一樣，一次一個 HTTP 請求、等完成再送下一個
+batch     ：所有項目放進一個 /query/batch 請求，以 NDJSON 逐筆收回結果（記錄第一筆與最後一筆的時間）
+
+    cd api
+    # 對執行中的 API
+    uv run ./benchmarks/bench_batch.py --items 10 50 200 --concurrency 8
+    # 不需要 OpenAI 與 Chrome：以 bench_offline.py 的替身啟動整套服務
+    uv run ./benchmarks/bench_batch.py --offline --items 10 50 200 --duplicate-ratio 0.3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from bench_offline import OfflineStack
+
+QUERIES = ["請幫我計算 {n} 加 5", "台北天氣如何？第 {n} 次", "multiply {n} times 8"]
+
+
+def make_items(count: int, duplicate_ratio: float, seed: int) -> list:
+    """產生 count 筆查詢，其中約 duplicate_ratio 比例與先前的某一筆完全相同。"""
+    rng = random.Random(seed)
+    items = []
+    for n in range(count):
+        if items and rng.random() < duplicate_ratio:
+            items.append(rng.choice(items))
+        else:
+            items.append(QUERIES[n % len(QUERIES)].format(n=n))
+    return items
+
+
+async def run_sequential(http: httpx.AsyncClient, base_url: str, items: list) -> dict:
+    started = time.perf_counter()
+    ok = 0
+    for query in items:
+        res = await http.post(f"{base_url}/query", json={"query": query})
+        ok += res.status_code == 200
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "ok": ok, "items_per_s": round(len(items) / elapsed, 2)}
+
+
+async def run_batch(http: httpx.AsyncClient, base_url: str, items: list, concurrency: int) -> dict:
+    started = time.perf_counter()
+    first = None
+    done = {}
+    statuses = {"ok": 0, "error": 0}
+    async with http.stream("POST", f"{base_url}/query/batch", json={"items": items, "concurrency": concurrency}) as res:
+        res.raise_for_status()
+        async for line in res.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "item":
+                first = first or time.perf_counter() - started
+                statuses[event["status"]] += 1
+            elif event["type"] == "done":
+                done = event
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "first_item_s": round(first or 0.0, 3),
+        **statuses,
+        "items_per_s": round(len(items) / elapsed, 2),
+        "server_elapsed_s": done.get("elapsed_s"),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Throughput of /query/batch versus one /query per item")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="與先前項目完全相同的比例（測試去重）")
+    parser.add_argument("--skip-sequential", action="store_true", help="項目很多時略過逐筆呼叫的基準")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--offline", action="store_true", help="以 benchmarks/fakes.py 的替身在本機啟動整套服務")
+    parser.add_argument("--fake-config", default="")
+    parser.add_argument("--env", action="append", default=[])
+    parser.add_argument("--mcp-port", type=int, default=18000)
+    parser.add_argument("--api-port", type=int, default=18001)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="結果 JSON 路徑")
+    args = parser.parse_args()
+
+    stack = None
+    base_url = args.url.rstrip("/")
+    if args.offline:
+        # 預設關閉快速路徑與工具快取，每一筆都走 LLM agent 迴圈；批次需要足夠的 LLM 併發
+        args.env = [f"BATCH_CONCURRENCY={args.concurrency}", f"LLM_CONCURRENCY={args.concurrency}", *args.env]
+        stack = OfflineStack(args)
+        await stack.start()
+        base_url = f"http://127.0.0.1:{args.api_port}"
+
+    results = []
+    try:
+        async with httpx.AsyncClient(timeout=None) as http:
+            for count in args.items:
+                items = make_items(count, args.duplicate_ratio, args.seed)
+                row = {"items": count, "unique": len(set(items))}
+                if not args.skip_sequential:
+                    row["sequential"] = await run_sequential(http, base_url, items)
+                row["batch"] = await run_batch(http, base_url, items, args.concurrency)
+                results.append(row)
+                line = f"items={count:<5} unique={row['unique']:<5} batch {row['batch']['items_per_s']:8.2f} items/s " \
+                       f"(first after {row['batch']['first_item_s']:.2f}s)"
+                if "sequential" in row:
+                    speedup = row["sequential"]["elapsed_s"] / row["batch"]["elapsed_s"]
+                    line += f" | sequential {row['sequential']['items_per_s']:8.2f} items/s | x{speedup:.1f}"
+                print(line)
+    finally:
+        if stack is not None:
+            stack.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "batch", "concurrency": args.concurrency,
+                       "duplicate_ratio": args.duplicate_ratio, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
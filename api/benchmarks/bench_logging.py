@@ -0,0 +1,89 @@
+"""
+Log 設定對請求延遲的影響
+
+模擬一個請求：數個 await（代表 LLM / 工具呼叫）之間穿插 INFO 與 DEBUG log（含大型的回應內容），
+比較三種設定下每個請求的延遲：
+- off：停用 log
+- sync：直接掛 FileHandler + StreamHandler（寫檔在 event loop 上進行）
+- queue：utils.logger.setup_logging 的佇列式設定（寫檔交給背景執行緒）
+
+    cd api
+    uv run ./benchmarks/bench_logging.py --mode queue --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import setup_logging, correlation_id, new_correlation_id
+
+PAYLOAD = "LLM response: " + "模型回應內容 " * 800
+
+
+def configure(mode: str, log_file: str):
+    root = logging.getLogger()
+    if mode == "off":
+        logging.disable(logging.CRITICAL)
+    elif mode == "sync":
+        root.setLevel(logging.DEBUG)
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        for handler in (logging.FileHandler(log_file, encoding="utf-8"), logging.StreamHandler(open(os.devnull, "w"))):
+            handler.setFormatter(formatter)
+            root.addHandler(handler)
+    else:
+        # stdout 導到 /dev/null，只量測 log 本身的成本
+        sys.stdout = open(os.devnull, "w")
+        setup_logging("bench", log_file)
+
+
+async def simulated_request(logger: logging.Logger, steps: int) -> float:
+    correlation_id.set(new_correlation_id())
+    start = time.perf_counter()
+    logger.info("Processing query (42 chars)")
+    for _ in range(steps):
+        await asyncio.sleep(0)
+        logger.info("LLM response: 120 chars, tools=['add']")
+        logger.debug(PAYLOAD)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Request latency with different logging setups")
+    parser.add_argument("--mode", choices=["off", "sync", "queue"], default="queue")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=4, help="每個請求中的 LLM / 工具輪次")
+    args = parser.parse_args()
+
+    log_file = os.path.join(tempfile.mkdtemp(), "bench.log")
+    configure(args.mode, log_file)
+    logger = logging.getLogger("MCPClient")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            return await simulated_request(logger, args.steps)
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one() for _ in range(args.requests))))
+    elapsed = time.perf_counter() - start
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    sys.stderr.write(
+        f"mode={args.mode} requests={args.requests} throughput={args.requests / elapsed:.0f} req/s "
+        f"mean={statistics.mean(latencies) * 1000:.3f}ms p50={pct(0.5):.3f}ms "
+        f"p95={pct(0.95):.3f}ms p99={pct(0.99):.3f}ms\n"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
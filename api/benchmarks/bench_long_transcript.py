@@ -0,0 +1,72 @@
+"""
+長逐字稿 map-reduce 摘要：延遲隨逐字稿長度的變化
+
+產生不同長度的合成逐字稿，量測切段時間、段數與整體摘要延遲。
+預設呼叫真實的 OpenAI API（需 OPENAI/OPEN_API_KEY）；加上 --simulate-llm-ms 時改用固定延遲的模擬回應，
+只觀察切段與併發排程本身的擴展性。
+
+    cd api
+    uv run ./benchmarks/bench_long_transcript.py --lines 200 1000 5000 --simulate-llm-ms 800
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from article_generator import ArticleGenerator
+from long_transcript import chunk_transcript
+from utils.tokens import estimate_tokens
+
+SPEAKERS = ["PM", "後端工程師", "ML Engineer", "QA"]
+SENTENCES = [
+    "我們這週要把 RAG 的檢索流程接到新的向量資料庫上，API 參數維持 top_k 與 score_threshold。",
+    "模型部分先用 gpt-4o，成本如果太高再評估微調小模型。",
+    "前端串接預計下週三完成，需要後端先提供 streaming 的介面。",
+    "測試覆蓋率目標是 80%，自動化驗收流程由 QA 負責。",
+    "風險是第三方服務的速率限制，需要加上重試與排隊機制。",
+]
+
+
+def synthetic_transcript(lines: int) -> str:
+    return "\n".join(
+        f"{SPEAKERS[i % len(SPEAKERS)]}：{SENTENCES[i % len(SENTENCES)]}" for i in range(lines)
+    )
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Long transcript map-reduce latency vs transcript length")
+    parser.add_argument("--lines", type=int, nargs="+", default=[200, 1000, 3000])
+    parser.add_argument("--simulate-llm-ms", type=float, default=None,
+                        help="以固定延遲模擬 LLM 回應，不呼叫 OpenAI")
+    args = parser.parse_args()
+
+    generator = ArticleGenerator()
+    if args.simulate_llm_ms is not None:
+        async def fake_complete(system_prompt, content):
+            await asyncio.sleep(args.simulate_llm_ms / 1000)
+            return content[:200]
+        generator._acomplete = fake_complete
+
+    print(f"{'lines':>6} {'tokens':>8} {'chunks':>6} {'chunk(ms)':>10} {'total(s)':>9}")
+    for lines in args.lines:
+        text = synthetic_transcript(lines)
+        tokens = estimate_tokens(text, generator.MODEL)
+
+        start = time.perf_counter()
+        chunks = chunk_transcript(text, generator.LONG_TRANSCRIPT_CHUNK_TOKENS, generator.MODEL)
+        chunk_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        await generator.summarize_long_transcript(text)
+        total = time.perf_counter() - start
+        print(f"{lines:>6} {tokens:>8} {len(chunks):>6} {chunk_ms:>10.1f} {total:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
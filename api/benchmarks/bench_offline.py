@@ -0,0 +1,306 @@
+"""
+離線端對端基準測試：不需要 OpenAI 金鑰，也不會開啟真的 Chrome
+
+以 offline_servers.py 在本機啟動工具伺服器與 API（LLM 與 Selenium 由 benchmarks/fakes.py 的替身取代，
+延遲與工具呼叫腳本可由 --fake-config 設定），依各個併發等級對 /query 送出請求，
+統計 p50 / p95 / p99 延遲、吞吐量與兩個行程的記憶體，並把結果寫成 JSON，方便比較不同 commit。
+
+    cd api
+    uv run ./benchmarks/bench_offline.py --concurrency 1 4 16 --requests 64
+    # 與先前的結果比較
+    uv run ./benchmarks/bench_offline.py --compare benchmarks/results/offline-abc1234.json
+    # 調整替身延遲（JSON 字串或檔案），例如更快的 LLM 與瀏覽器
+    uv run ./benchmarks/bench_offline.py --fake-config '{"llm": {"first_token_ms": 100}, "browser": {"answer_start_ms": 2000}}'
+
+預設關閉快速路徑與工具結果快取，讓每個請求都走完 LLM agent 迴圈；可用 --env FAST_ROUTER=true 等覆寫。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+
+DEFAULT_QUERIES = [
+    "請幫我計算 3 加 5",
+    "台北天氣如何？",
+    "請幫我摘要這份會議逐字稿 #{n}：PM：這週要把 RAG 接上新的向量資料庫。後端工程師：API 參數維持 top_k。",
+]
+DEFAULT_ENV = {
+    "FAST_ROUTER": "false",
+    "TOOL_CACHE": "false",
+    "RATE_LIMIT_PER_SECOND": "0",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def rss_mb(pid: int) -> dict:
+    """Linux 上讀取 /proc/<pid>/status 的目前與最高 RSS（MB）；其他平台回傳空 dict。"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=API_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+class OfflineStack:
+    """在暫存資料夾中啟動替身版的工具伺服器與 API，log、快取與產出物都不會寫進專案目錄。"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="bench-offline-")
+        self.processes = {}
+
+    def _env(self) -> dict:
+        env = dict(os.environ)
+        env.update(DEFAULT_ENV)
+        env.update({
+            "MCP_TOOL_URL": f"http://127.0.0.1:{self.args.mcp_port}/mcp",
+            "MCP_TOOL_URLS": "",
+            "MCP_HEAVY_TOOL_URLS": "",
+            "OPENAI_API_KEY": "offline",
+            "DIR": self.workdir,
+            "USER_DATA_DIR": os.path.join(self.workdir, "chrome"),
+            "LOG_FILE": os.path.join(self.workdir, "mcp_client.log"),
+            "MCP_SERVER_LOG_FILE": os.path.join(self.workdir, "mcp_server.log"),
+            "CONVERSATION_LOG_DIR": os.path.join(self.workdir, "conversations"),
+            "TOOL_SCHEMA_CACHE": os.path.join(self.workdir, "tool_schemas.json"),
+            "TRACE_FILE": os.path.join(self.workdir, "traces.jsonl"),
+        })
+        if self.args.fake_config:
+            env["FAKE_BACKEND_CONFIG"] = self.args.fake_config
+        for item in self.args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        return env
+
+    def _spawn(self, service: str, port: int):
+        output = open(os.path.join(self.workdir, f"{service}.out"), "w")
+        self.processes[service] = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "offline_servers.py"), service, "--port", str(port)],
+            cwd=self.workdir, env=self._env(), stdout=output, stderr=subprocess.STDOUT,
+        )
+
+    async def _wait_ready(self, url: str, service: str, timeout: float):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=2.0) as http:
+            while time.monotonic() < deadline:
+                if self.processes[service].poll() is not None:
+                    raise RuntimeError(f"{service} exited early, see {self.workdir}/{service}.out")
+                try:
+                    res = await http.get(url)
+                    if res.status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"{service} was not ready within {timeout}s, see {self.workdir}/{service}.out")
+
+    async def start(self) -> dict:
+        started = time.perf_counter()
+        self._spawn("mcp", self.args.mcp_port)
+        await self._wait_ready(f"http://127.0.0.1:{self.args.mcp_port}/metrics", "mcp", self.args.startup_timeout)
+        mcp_ready = time.perf_counter() - started
+        self._spawn("api", self.args.api_port)
+        await self._wait_ready(f"http://127.0.0.1:{self.args.api_port}/tool-servers", "api", self.args.startup_timeout)
+        return {"mcp_server_s": round(mcp_ready, 3), "api_s": round(time.perf_counter() - started - mcp_ready, 3)}
+
+    def memory(self) -> dict:
+        return {service: rss_mb(process.pid) for service, process in self.processes.items()}
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run_level(http: httpx.AsyncClient, stack: OfflineStack, args, concurrency: int) -> dict:
+    url = f"http://127.0.0.1:{args.api_port}/query"
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    counter = iter(range(10 ** 9))
+
+    async def send(record: bool):
+        n = next(counter)
+        query = args.query[n % len(args.query)].replace("{n}", f"{concurrency}-{n}")
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                res = await http.post(url, json={"query": query, "timeout": args.deadline})
+                status = res.status_code
+            except httpx.HTTPError:
+                status = 0
+            if record:
+                results.append((status, time.perf_counter() - start))
+
+    await asyncio.gather(*(send(False) for _ in range(args.warmup)))
+
+    peak = {}
+
+    async def sample_memory():
+        while True:
+            for service, usage in stack.memory().items():
+                if usage:
+                    peak[service] = max(peak.get(service, 0.0), usage["rss_mb"])
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    await asyncio.gather(*(send(True) for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    ok = [latency for status, latency in results if status == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": dict(Counter(str(status) for status, _ in results)),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(percentile(ok, 0.50), 4),
+            "p95": round(percentile(ok, 0.95), 4),
+            "p99": round(percentile(ok, 0.99), 4),
+            "mean": round(sum(ok) / len(ok), 4) if ok else 0.0,
+            "max": round(max(ok), 4) if ok else 0.0,
+        },
+        "memory_peak_rss_mb": peak,
+    }
+
+
+def span_means(metrics_text: str) -> dict:
+    """從 /metrics 取出每個 span 的平均耗時（秒），看出時間花在哪個階段。"""
+    sums, counts = {}, {}
+    for match in re.finditer(r'^span_duration_seconds_(sum|count)\{span="([^"]+)"\} (\S+)$', metrics_text, re.MULTILINE):
+        kind, name, value = match.groups()
+        (sums if kind == "sum" else counts)[name] = float(value)
+    return {name: {"count": int(counts[name]), "mean_s": round(sums[name] / counts[name], 4)}
+            for name in sorted(counts) if counts[name]}
+
+
+def print_level(level: dict):
+    latency = level["latency_s"]
+    print(
+        f"c={level['concurrency']:<4} n={level['requests']:<5} ok={level['ok']:<5} "
+        f"p50={latency['p50']:.3f}s p95={latency['p95']:.3f}s p99={latency['p99']:.3f}s "
+        f"thr={level['throughput_rps']:.2f} req/s rss={level['memory_peak_rss_mb']}"
+    )
+
+
+def print_comparison(current: dict, baseline: dict):
+    print(f"\nvs {baseline.get('commit', '?')}:")
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        deltas = []
+        for key in ("p50", "p95", "p99"):
+            before, after = old["latency_s"][key], level["latency_s"][key]
+            deltas.append(f"{key} {(after - before) / before * 100:+.1f}%" if before else f"{key} n/a")
+        before, after = old["throughput_rps"], level["throughput_rps"]
+        deltas.append(f"thr {(after - before) / before * 100:+.1f}%" if before else "thr n/a")
+        print(f"c={level['concurrency']:<4} " + "  ".join(deltas))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end /query benchmark with a fake LLM and browser")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=48, help="每個併發等級的請求數")
+    parser.add_argument("--warmup", type=int, default=3, help="每個等級開始前不計入統計的請求數")
+    parser.add_argument("--query", action="append", help="查詢內容，可重複指定並輪流送出；{n} 代換為請求編號")
+    parser.add_argument("--deadline", type=float, default=300.0, help="送給 API 的 timeout 欄位（秒）")
+    parser.add_argument("--fake-config", default="", help="替身設定（JSON 字串或檔案，格式見 benchmarks/fakes.py）")
+    parser.add_argument("--env", action="append", default=[], help="傳給兩個服務的環境變數 KEY=VALUE，可重複指定")
+    parser.add_argument("--mcp-port", type=int, default=18000)
+    parser.add_argument("--api-port", type=int, default=18001)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="結果 JSON 路徑，預設 benchmarks/results/offline-<commit>.json")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+    args.query = args.query or DEFAULT_QUERIES
+
+    stack = OfflineStack(args)
+    try:
+        startup = await stack.start()
+        print(f"stack ready in {startup} (workdir {stack.workdir})")
+        levels = []
+        async with httpx.AsyncClient(timeout=args.deadline + 30, limits=httpx.Limits(max_connections=None)) as http:
+            for concurrency in args.concurrency:
+                level = await run_level(http, stack, args, concurrency)
+                print_level(level)
+                levels.append(level)
+            metrics = (await http.get(f"http://127.0.0.1:{args.api_port}/metrics")).text
+            server_metrics = (await http.get(f"http://127.0.0.1:{args.mcp_port}/metrics")).text
+        memory = stack.memory()
+    finally:
+        stack.stop()
+
+    revision = git_commit()
+    result = {
+        "benchmark": "offline_query",
+        **revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "queries": args.query,
+            "fake_config": args.fake_config,
+            "env": {**DEFAULT_ENV, **dict(item.partition("=")[::2] for item in args.env)},
+        },
+        "startup_s": startup,
+        "levels": levels,
+        "memory_final": memory,
+        "spans": {"api": span_means(metrics), "mcp_server": span_means(server_metrics)},
+    }
+    output = args.output or os.path.join(BENCH_DIR, "results", f"offline-{(revision['commit'] or 'unknown')[:7]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+超載測試：以固定的到達速率（open loop）送出超過服務容量的請求
+
+統計成功請求的 p50 / p95 / p99 延遲，以及 429 / 503 / 504 的數量與拒絕回應的延遲。
+有 admission control 時，超出容量的請求會很快被拒絕，成功請求的延遲應維持穩定，而不是隨排隊無限增長。
+
+    cd api
+    # 對執行中的 API（建議 QUERY_CONCURRENCY=4 QUERY_QUEUE=8 RATE_LIMIT_PER_SECOND=0）
+    uv run ./benchmarks/bench_overload.py --rate 20 --duration 15
+    # 不需啟動服務：在行程內以模擬的 200ms 工作比較有無 admission control
+    uv run ./benchmarks/bench_overload.py --simulate --rate 50 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import ResourceLimiter, Overloaded
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(label: str, results: list):
+    statuses = Counter(status for status, _ in results)
+    ok = [latency for status, latency in results if status == 200]
+    rejected = [latency for status, latency in results if status in (429, 503)]
+    print(
+        f"{label:<14} sent={len(results):>5} ok={statuses[200]:>5} 429={statuses[429]:>4} 503={statuses[503]:>4} "
+        f"504={statuses[504]:>4} other={sum(v for k, v in statuses.items() if k not in (200, 429, 503, 504)):>4} | "
+        f"ok p50={percentile(ok, 0.5):.2f}s p95={percentile(ok, 0.95):.2f}s p99={percentile(ok, 0.99):.2f}s | "
+        f"reject p99={percentile(rejected, 0.99) * 1000:.0f}ms"
+    )
+
+
+async def open_loop(send, rate: float, duration: float) -> list:
+    """以 Poisson 到達、平均每秒 rate 個請求送出 duration 秒，不等前一個完成。"""
+    tasks = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        tasks.append(asyncio.create_task(send()))
+        await asyncio.sleep(random.expovariate(rate))
+    return await asyncio.gather(*tasks)
+
+
+async def run_http(args):
+    import httpx
+
+    async with httpx.AsyncClient(timeout=args.timeout) as http:
+        async def send():
+            start = time.perf_counter()
+            try:
+                res = await http.post(args.url, json={"query": args.query, "timeout": args.deadline})
+                status = res.status_code
+            except httpx.TimeoutException:
+                status = 0
+            return status, time.perf_counter() - start
+
+        report("http", await open_loop(send, args.rate, args.duration))
+
+
+async def run_simulated(args):
+    work = args.work_ms / 1000
+
+    async def unlimited():
+        start = time.perf_counter()
+        # 模擬共享的下游資源：同時處理越多，每個請求越慢
+        await asyncio.sleep(work * max(1, unlimited.active / args.capacity))
+        return 200, time.perf_counter() - start
+    unlimited.active = 0
+
+    async def tracked():
+        unlimited.active += 1
+        try:
+            return await unlimited()
+        finally:
+            unlimited.active -= 1
+
+    report("no limit", await open_loop(tracked, args.rate, args.duration))
+
+    limiter = ResourceLimiter("sim", limit=args.capacity, max_waiting=args.capacity * 2, max_wait=2.0)
+
+    async def admitted():
+        start = time.perf_counter()
+        try:
+            async with limiter.slot():
+                await asyncio.sleep(work)
+            return 200, time.perf_counter() - start
+        except Overloaded as e:
+            return e.status_code, time.perf_counter() - start
+
+    report("admission", await open_loop(admitted, args.rate, args.duration))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Open-loop overload test for /query admission control")
+    parser.add_argument("--url", default="http://localhost:8001/query")
+    parser.add_argument("--query", default="請幫我計算 3 加 5")
+    parser.add_argument("--rate", type=float, default=20.0, help="每秒送出的請求數")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--deadline", type=float, default=30.0, help="送給 API 的 timeout 欄位（秒）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="HTTP client 逾時（秒）")
+    parser.add_argument("--simulate", action="store_true", help="在行程內模擬，不需要啟動服務")
+    parser.add_argument("--capacity", type=int, default=4, help="模擬模式的併發上限")
+    parser.add_argument("--work-ms", type=float, default=200.0, help="模擬模式每個請求的處理時間")
+    args = parser.parse_args()
+
+    if args.simulate:
+        await run_simulated(args)
+    else:
+        await run_http(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+/query 併發負載測試
+
+對執行中的 FastAPI 服務（預設 http://localhost:8001）以不同併發數送出相同的查詢，
+量測每個併發等級的吞吐量（req/s）與平均延遲，用來確認 /query 可以同時服務多個使用者。
+
+    cd api
+    uv run ./benchmarks/bench_query_load.py --concurrency 1 2 4 8 --requests 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def run_level(url: str, query: str, concurrency: int, total: int, timeout: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(timeout=timeout) as http:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    res = await http.post(url, json={"query": query, "conversation_id": f"bench-{concurrency}-{i}"})
+                    res.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors += 1
+                    print(f"request {i} failed: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_latency_s": statistics.mean(latencies) if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test for /query")
+    parser.add_argument("--url", default="http://localhost:8001/query")
+    parser.add_argument("--query", default="請幫我計算 3 加 5")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} {'mean(s)':>8}")
+    for level in args.concurrency:
+        r = await run_level(args.url, args.query, level, args.requests, args.timeout)
+        print(f"{r['concurrency']:>11} {r['requests']:>8} {r['errors']:>6} "
+              f"{r['throughput_rps']:>8.2f} {r['mean_latency_s']:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
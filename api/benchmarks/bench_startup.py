@@ -0,0 +1,198 @@
+"""
+冷啟動基準測試：import 時間、是否載入了重量級套件，以及從啟動到第一個回應的時間
+
+1. 以 python -X importtime 分別 import main 與 mcp_server，統計總 import 時間與最耗時的頂層套件，
+   並確認 Selenium、undetected_chromedriver、langchain_openai、langgraph 等沒有在啟動時被載入
+2. 啟動工具伺服器（預設 ENABLE_SUMMARIZATION=false、BROWSER_PRELAUNCH=false）與 API，
+   量測到兩者可以服務、以及第一個 /query（快速路徑的加法，不需要 OpenAI 金鑰）完成的時間
+
+    cd api
+    uv run ./benchmarks/bench_startup.py --runs 3
+    # 當成回歸測試：載入了重量級套件或超過時間上限時以非 0 結束
+    uv run ./benchmarks/bench_startup.py --check --max-import-ms 1500 --max-first-response-s 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_offline import API_DIR, BENCH_DIR, git_commit
+
+# 只有在摘要或 LLM 路徑上才需要的套件，啟動時不應該出現在 sys.modules
+HEAVY_MODULES = [
+    "selenium", "undetected_chromedriver", "langchain_openai", "langchain_community",
+    "langgraph", "langchain_mcp_adapters", "openai", "tiktoken", "numpy",
+]
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def service_env(workdir: str, summarization: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "ENABLE_SUMMARIZATION": "true" if summarization else "false",
+        "BROWSER_PRELAUNCH": "false",
+        "FAST_ROUTER": "true",
+        "RATE_LIMIT_PER_SECOND": "0",
+        "DIR": workdir,
+        "LOG_FILE": os.path.join(workdir, "mcp_client.log"),
+        "MCP_SERVER_LOG_FILE": os.path.join(workdir, "mcp_server.log"),
+        "CONVERSATION_LOG_DIR": os.path.join(workdir, "conversations"),
+        "TOOL_SCHEMA_CACHE": os.path.join(workdir, "tool_schemas.json"),
+    })
+    return env
+
+
+def measure_import(module: str, env: dict) -> dict:
+    """在新的直譯器中 import module，回傳總 import 時間、最耗時的頂層套件與被載入的重量級套件。"""
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=API_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    top_level = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total_us += int(self_us)
+        if len(indent) == 1:
+            top_level.append((int(cumulative_us), name))
+    modules = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "process_wall_ms": round(wall * 1000, 1),
+        "modules": len(modules),
+        "heaviest": [{"package": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(top_level, reverse=True)[:10]],
+        "heavy_loaded": sorted(m for m in HEAVY_MODULES if m in modules),
+    }
+
+
+async def wait_ready(http: httpx.AsyncClient, url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited early while waiting for {url}")
+        try:
+            if (await http.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError(f"{url} was not ready within {timeout}s")
+
+
+async def measure_first_response(args, env: dict, workdir: str) -> dict:
+    """啟動工具伺服器與 API，回傳各自可以服務的時間與第一個 /query 完成的時間（秒，從啟動工具伺服器起算）。"""
+    env = dict(env, MCP_TOOL_URL=f"http://127.0.0.1:{args.mcp_port}/mcp", MCP_TOOL_URLS="", MCP_HEAVY_TOOL_URLS="")
+    processes = []
+    output = open(os.path.join(workdir, "services.out"), "a")
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as http:
+            processes.append(subprocess.Popen(
+                [sys.executable, "mcp_server.py", "--host", "127.0.0.1", "--port", str(args.mcp_port)],
+                cwd=API_DIR, env=env, stdout=output, stderr=subprocess.STDOUT,
+            ))
+            await wait_ready(http, f"http://127.0.0.1:{args.mcp_port}/metrics", processes[-1], args.startup_timeout)
+            mcp_ready = time.perf_counter() - started
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.api_port),
+                 "--log-level", "warning"],
+                cwd=API_DIR, env=env, stdout=output, stderr=subprocess.STDOUT,
+            ))
+            await wait_ready(http, f"http://127.0.0.1:{args.api_port}/tool-servers", processes[-1], args.startup_timeout)
+            api_ready = time.perf_counter() - started
+            res = await http.post(f"http://127.0.0.1:{args.api_port}/query", json={"query": args.query})
+            res.raise_for_status()
+            first_response = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        output.close()
+    return {
+        "mcp_server_ready_s": round(mcp_ready, 3),
+        "api_ready_s": round(api_ready, 3),
+        "first_response_s": round(first_response, 3),
+    }
+
+
+def median_of(runs: list, key: str) -> float:
+    return round(statistics.median(run[key] for run in runs), 3)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark: import time, heavy modules and time to first response")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--summarization", action="store_true", help="以 ENABLE_SUMMARIZATION=true 量測")
+    parser.add_argument("--query", default="add 3 and 5", help="第一個 /query 的內容（預設走快速路徑，不呼叫 LLM）")
+    parser.add_argument("--skip-services", action="store_true", help="只量測 import，不啟動服務")
+    parser.add_argument("--mcp-port", type=int, default=18100)
+    parser.add_argument("--api-port", type=int, default=18101)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--check", action="store_true", help="不符合下列條件時以非 0 結束")
+    parser.add_argument("--max-import-ms", type=float, help="main / mcp_server 各自的 import 時間上限")
+    parser.add_argument("--max-first-response-s", type=float, help="從啟動到第一個回應的時間上限")
+    parser.add_argument("--output", help="結果 JSON 路徑，預設 benchmarks/results/startup-<commit>.json")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = service_env(workdir, args.summarization)
+    result = {"benchmark": "startup", **git_commit(), "summarization": args.summarization, "imports": {}}
+
+    for module in ("main", "mcp_server"):
+        runs = [measure_import(module, env) for _ in range(args.runs)]
+        summary = dict(runs[-1], import_ms=median_of(runs, "import_ms"), process_wall_ms=median_of(runs, "process_wall_ms"))
+        result["imports"][module] = summary
+        print(f"import {module:<11} {summary['import_ms']:8.1f} ms  ({summary['modules']} modules, "
+              f"heavy loaded: {summary['heavy_loaded'] or 'none'})")
+        for item in summary["heaviest"][:5]:
+            print(f"    {item['package']:<28} {item['cumulative_ms']:8.1f} ms")
+
+    if not args.skip_services:
+        runs = [await measure_first_response(args, env, workdir) for _ in range(args.runs)]
+        result["services"] = {key: median_of(runs, key) for key in runs[0]}
+        result["services"]["runs"] = runs
+        print("startup (median): " + ", ".join(f"{k}={v}s" for k, v in result["services"].items() if k != "runs"))
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"startup-{(result['commit'] or 'unknown')[:7]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"results written to {output}")
+
+    if args.check:
+        failures = []
+        for module, summary in result["imports"].items():
+            if summary["heavy_loaded"]:
+                failures.append(f"import {module} loaded {summary['heavy_loaded']}")
+            if args.max_import_ms is not None and summary["import_ms"] > args.max_import_ms:
+                failures.append(f"import {module} took {summary['import_ms']} ms > {args.max_import_ms} ms")
+        services = result.get("services")
+        if services and args.max_first_response_s is not None and services["first_response_s"] > args.max_first_response_s:
+            failures.append(f"first response after {services['first_response_s']}s > {args.max_first_response_s}s")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+MCP 工具呼叫延遲：每次新建 session vs. 連線池
+
+before：每次呼叫都重新建立 transport 並執行 MCP initialize（舊版 MultiServerMCPClient.session() 的行為）
+after ：透過 MCPSessionPool 重複使用已初始化的 session
+
+需先啟動 mcp_server.py：
+    cd api
+    uv run ./mcp_server.py
+    uv run ./benchmarks/bench_tool_latency.py --calls 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from session_pool import MCPSessionPool
+
+
+def summarize(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if samples else 0.0
+    print(f"{label:<14} n={len(samples):<4} mean={statistics.mean(samples) * 1000:8.2f} ms  "
+          f"p50={statistics.median(samples) * 1000:8.2f} ms  p95={p95 * 1000:8.2f} ms")
+
+
+async def fresh_session_call(url: str, tool: str, args: dict):
+    async with streamablehttp_client(url) as (read_stream, write_stream, _):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            return await session.call_tool(tool, args)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-call MCP tool latency, fresh session vs pooled")
+    parser.add_argument("--url", default="http://localhost:8000/mcp")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--tool", default="add")
+    args = parser.parse_args()
+    tool_args = {"a": 3, "b": 5}
+
+    before = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        await fresh_session_call(args.url, args.tool, tool_args)
+        before.append(time.perf_counter() - start)
+
+    pool = MCPSessionPool(lambda: streamablehttp_client(args.url), max_size=1)
+    await pool.start()
+    after = []
+    try:
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            await pool.call_tool(args.tool, tool_args)
+            after.append(time.perf_counter() - start)
+    finally:
+        await pool.close()
+
+    summarize("fresh session", before)
+    summarize("pooled", after)
+    print(f"pool stats: {pool.snapshot()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
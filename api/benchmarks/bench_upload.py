@@ -0,0 +1,148 @@
+"""
+逐字稿上傳的記憶體基準測試：把整份逐字稿放進 JSON 字串，與先以 POST /transcripts 串流上傳再傳 transcript_id 的比較
+
+以 bench_offline.py 的替身啟動整套服務，每種方式送出一個摘要工作並等它完成，
+量測 API 與工具伺服器在這個請求期間的最高 RSS（Linux：請求前以 /proc/<pid>/clear_refs 重設 VmHWM）。
+
+json      ：POST /summaries {"text": 全文}
+upload    ：POST /transcripts（chunked 原始 body）-> POST /summaries {"transcript_id"}
+multipart ：POST /transcripts（multipart "file" 欄位）-> POST /summaries {"transcript_id"}
+
+    cd api
+    uv run ./benchmarks/bench_upload.py --mb 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from bench_offline import OfflineStack
+
+LINE = "PM：這週要把 RAG 接上新的向量資料庫，後端工程師確認 API 參數維持 top_k，前端需要調整結果卡片的排版。\n"
+# 瀏覽器替身只需要跑完流程，不需要模擬真實的等待時間
+FAST_BROWSER = {"browser": {"driver_startup_ms": 100, "page_load_ms": 50, "source_ready_ms": 50,
+                            "answer_start_ms": 50, "answer_stream_ms": 50}}
+
+
+def write_transcript(path: str, megabytes: float, tag: str):
+    """產生約 megabytes MB 的逐字稿；每種方式加上不同的標記，避免命中上一輪的摘要快取。"""
+    line = LINE.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(f"會議編號：{tag}\n".encode("utf-8"))
+        for _ in range(int(megabytes * 1024 * 1024 / len(line)) + 1):
+            f.write(line)
+
+
+def reset_peak(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+async def file_chunks(path: str, size: int = 256 * 1024):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+async def submit(http: httpx.AsyncClient, base_url: str, mode: str, path: str) -> tuple:
+    """依 mode 送出摘要工作，回傳 (job_id, 上傳耗時秒數)。"""
+    started = time.perf_counter()
+    if mode == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            body = {"text": f.read()}
+    else:
+        if mode == "upload":
+            res = await http.post(f"{base_url}/transcripts", params={"filename": os.path.basename(path)},
+                                  content=file_chunks(path), headers={"Content-Type": "text/plain; charset=utf-8"})
+        else:
+            with open(path, "rb") as f:
+                res = await http.post(f"{base_url}/transcripts", files={"file": (os.path.basename(path), f, "text/plain")})
+        res.raise_for_status()
+        body = {"transcript_id": res.json()["transcript_id"]}
+    upload_s = time.perf_counter() - started
+    res = await http.post(f"{base_url}/summaries", json=body)
+    res.raise_for_status()
+    return res.json()["job_id"], upload_s
+
+
+async def wait_job(http: httpx.AsyncClient, base_url: str, job_id: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = (await http.get(f"{base_url}/summaries/{job_id}")).json()
+        if job.get("status") not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"job {job_id} did not finish within {timeout}s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Peak memory of a summary request: JSON text versus streamed transcript upload")
+    parser.add_argument("--mb", type=float, default=20.0, help="逐字稿大小（MB）")
+    parser.add_argument("--modes", nargs="+", default=["json", "upload", "multipart"], choices=["json", "upload", "multipart"])
+    parser.add_argument("--job-timeout", type=float, default=600.0)
+    parser.add_argument("--fake-config", default=json.dumps(FAST_BROWSER))
+    parser.add_argument("--env", action="append", default=[])
+    parser.add_argument("--mcp-port", type=int, default=18200)
+    parser.add_argument("--api-port", type=int, default=18201)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="結果 JSON 路徑")
+    args = parser.parse_args()
+
+    # 長逐字稿會改走分段摘要（大量替身 LLM 呼叫），這裡只比較傳遞逐字稿的方式
+    args.env = ["LONG_TRANSCRIPT_MODE=never", f"TRANSCRIPT_MAX_MB={args.mb * 2}", *args.env]
+    stack = OfflineStack(args)
+    await stack.start()
+    base_url = f"http://127.0.0.1:{args.api_port}"
+    workdir = tempfile.mkdtemp(prefix="bench-upload-")
+    results = []
+    try:
+        async with httpx.AsyncClient(timeout=None) as http:
+            for mode in args.modes:
+                path = os.path.join(workdir, f"transcript-{mode}.txt")
+                write_transcript(path, args.mb, f"{mode}-{time.time()}")
+                pids = {service: process.pid for service, process in stack.processes.items()}
+                reset = all([reset_peak(pid) for pid in pids.values()])
+                before = stack.memory()
+                started = time.perf_counter()
+                job_id, upload_s = await submit(http, base_url, mode, path)
+                job = await wait_job(http, base_url, job_id, args.job_timeout)
+                after = stack.memory()
+                row = {
+                    "mode": mode,
+                    "status": job.get("status"),
+                    "upload_s": round(upload_s, 3),
+                    "total_s": round(time.perf_counter() - started, 3),
+                    "peak_reset": reset,
+                    "memory": {
+                        service: {
+                            "rss_before_mb": before[service].get("rss_mb"),
+                            "peak_rss_mb": after[service].get("peak_rss_mb"),
+                            "peak_over_baseline_mb": round(after[service]["peak_rss_mb"] - before[service]["rss_mb"], 1),
+                        }
+                        for service in pids if before.get(service) and after.get(service)
+                    },
+                }
+                results.append(row)
+                memory = "  ".join(f"{service} +{m['peak_over_baseline_mb']} MB (peak {m['peak_rss_mb']})"
+                                   for service, m in row["memory"].items())
+                print(f"{mode:<10} {row['status']:<10} upload {row['upload_s']:6.2f}s total {row['total_s']:6.2f}s  {memory}")
+                if not reset:
+                    print("  (無法重設 VmHWM，peak 為行程啟動以來的最高值)")
+    finally:
+        stack.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "upload", "transcript_mb": args.mb, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
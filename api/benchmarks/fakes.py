@@ -0,0 +1,328 @@
+"""
+離線基準測試用的替身：不呼叫 OpenAI、不開真的 Chrome
+
+- FakeChatModel：取代 ChatOpenAI 的 LangChain chat model，依設定的延遲與工具呼叫腳本產生確定性的回應
+- FakeNotebookDriver：模擬 NotebookLM 頁面的 Selenium driver，ArticleGenerator 的等待條件與輪詢流程照常執行
+- install_llm / install_browser：把替身裝進 langchain_openai / undetected_chromedriver 的位置
+
+設定以 JSON 傳入（環境變數 FAKE_BACKEND_CONFIG，可以是 JSON 字串或檔案路徑），未指定的欄位使用 DEFAULT_CONFIG。
+"""
+import asyncio
+import copy
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+from utils.tokens import estimate_tokens
+
+DEFAULT_CONFIG = {
+    "llm": {
+        "first_token_ms": 400,   # 送出請求到第一個片段
+        "token_ms": 10,          # 之後每個片段的間隔
+        "answer_tokens": 40,     # 最終回答的片段數
+        # 有帶工具時依序比對最後一則使用者訊息，第一個符合的腳本決定每一輪要呼叫的工具；
+        # 第 n 輪（本輪已呼叫過 n 次工具）使用 steps[n]，超出時產生最終回答。args 中的 "{query}" 代換為使用者訊息
+        "scripts": [
+            {"match": "加|add|plus", "steps": [{"tool": "add", "args": {"a": 3, "b": 5}}]},
+            {"match": "乘|multiply|times", "steps": [{"tool": "multiply", "args": {"a": 7, "b": 8}}]},
+            {"match": "天氣|weather", "steps": [{"tool": "get_weather", "args": {"location": "Taipei"}}]},
+            {"match": "摘要|逐字稿|summar", "steps": [{"tool": "summarize_meeting", "args": {"text": "{query}"}}]},
+        ],
+    },
+    "browser": {
+        "driver_startup_ms": 3000,   # 啟動 Chrome
+        "page_load_ms": 1500,        # 開啟 NotebookLM 首頁
+        "source_ready_ms": 4000,     # 插入文字後到聊天框可以輸入
+        "answer_start_ms": 8000,     # 送出提示後到回答開始出現
+        "answer_stream_ms": 6000,    # 回答逐步出現的時間
+        "answer": "## 技術討論要點\n- （離線測試）模擬的 NotebookLM 摘要內容",
+        "prompt_echo": "{prompt}",   # 聊天紀錄中提示那一則顯示的文字（真實頁面可能多了標籤或被截短）
+    },
+}
+
+
+def load_config(value: Optional[str] = None) -> dict:
+    """讀取 FAKE_BACKEND_CONFIG（JSON 字串或檔案路徑），與 DEFAULT_CONFIG 逐區塊合併。"""
+    value = value if value is not None else os.getenv("FAKE_BACKEND_CONFIG", "")
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if not value:
+        return config
+    if os.path.exists(value):
+        with open(value, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    else:
+        overrides = json.loads(value)
+    for section, fields in overrides.items():
+        config.setdefault(section, {}).update(fields)
+    return config
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content or [])
+
+
+def _substitute(value, query: str):
+    if value == "{query}":
+        return query
+    if isinstance(value, dict):
+        return {k: _substitute(v, query) for k, v in value.items()}
+    return value
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    確定性的 chat model：延遲為 first_token_ms + 片段數 × token_ms，不含隨機成分
+
+    建構參數與 ChatOpenAI 相容（model / model_name 以外的參數會被忽略），可直接替換 ChatOpenAI 類別。
+    """
+
+    model_name: str = "gpt-4o"
+    settings: dict = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            model_name=kwargs.get("model_name") or kwargs.get("model") or "gpt-4o",
+            settings=load_config()["llm"],
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _plan(self, messages: list, tools: Optional[list]) -> tuple:
+        """回傳 (tool_call 或 None, 回答文字)。"""
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        query = _text(messages[last_human].content) if last_human >= 0 else ""
+        if tools:
+            tool_names = {t.get("function", {}).get("name") for t in tools if isinstance(t, dict)}
+            step = sum(1 for m in messages[last_human + 1:] if isinstance(m, AIMessage) and m.tool_calls)
+            for script in self.settings.get("scripts", []):
+                if not re.search(script["match"], query, re.IGNORECASE):
+                    continue
+                steps = script.get("steps", [])
+                if step < len(steps) and steps[step]["tool"] in tool_names:
+                    call = steps[step]
+                    return {
+                        "name": call["tool"],
+                        "args": _substitute(call.get("args", {}), query),
+                        "id": f"call_{uuid.uuid4().hex[:12]}",
+                    }, ""
+                break
+        words = max(1, int(self.settings.get("answer_tokens", 40)))
+        return None, " ".join(f"answer{i}" for i in range(words))
+
+    def _usage(self, messages: list, completion: str) -> dict:
+        prompt_tokens = sum(estimate_tokens(_text(m.content), self.model_name) for m in messages)
+        completion_tokens = estimate_tokens(completion, self.model_name)
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _chunks(self, messages: list, tools: Optional[list]) -> list:
+        call, answer = self._plan(messages, tools)
+        if call is not None:
+            args = json.dumps(call["args"], ensure_ascii=False)
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": args, "id": call["id"], "index": 0}
+            ])]
+            completion = call["name"] + args
+        else:
+            chunks = [AIMessageChunk(content=(" " if i else "") + word) for i, word in enumerate(answer.split(" "))]
+            completion = answer
+        chunks.append(AIMessageChunk(content="", usage_metadata=self._usage(messages, completion)))
+        return chunks
+
+    def _delays(self, count: int):
+        yield self.settings.get("first_token_ms", 0) / 1000
+        for _ in range(count - 1):
+            yield self.settings.get("token_ms", 0) / 1000
+
+    def _generate(self, messages, stop=None, run_manager=None, tools: Optional[list] = None, **kwargs: Any) -> ChatResult:
+        chunks = self._chunks(messages, tools)
+        for delay in self._delays(len(chunks)):
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=_merge(chunks))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools: Optional[list] = None, **kwargs: Any) -> ChatResult:
+        chunks = self._chunks(messages, tools)
+        await asyncio.sleep(sum(self._delays(len(chunks))))
+        return ChatResult(generations=[ChatGeneration(message=_merge(chunks))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools: Optional[list] = None, **kwargs: Any):
+        chunks = self._chunks(messages, tools)
+        for chunk, delay in zip(chunks, self._delays(len(chunks))):
+            await asyncio.sleep(delay)
+            if run_manager is not None and isinstance(chunk.content, str) and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+
+def _merge(chunks: list) -> AIMessage:
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        merged = merged + chunk
+    return AIMessage(
+        content=merged.content,
+        tool_calls=merged.tool_calls,
+        usage_metadata=merged.usage_metadata,
+    )
+
+
+class FakeElement:
+    def __init__(self, page: "FakeNotebookDriver", name: str, text_fn=None):
+        self.page = page
+        self.name = name
+        self._text_fn = text_fn
+
+    @property
+    def text(self) -> str:
+        return self._text_fn() if self._text_fn else ""
+
+    def is_displayed(self) -> bool:
+        return True
+
+    def is_enabled(self) -> bool:
+        return True
+
+    def click(self):
+        self.page._click(self.name)
+
+    def send_keys(self, *values):
+        self.page._send_keys(self.name, "".join(values))
+
+    def find_element(self, by=By.ID, value=None):
+        return self.page._find(value, parent=self.name)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self.page._find_all(value, parent=self.name)
+
+
+class FakeNotebookDriver:
+    """
+    只實作 ArticleGenerator._summarize_with_driver 用到的 Selenium API 的假頁面
+
+    流程：首頁 -> 新建筆記本 -> 貼上文字 -> 插入（source_ready_ms 後聊天框可輸入）
+    -> 送出提示（提示立即顯示為一則訊息，answer_start_ms 後回答那一則出現，answer_stream_ms 內逐字長出，之後不再變化）
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.state = "blank"
+        self.source_ready_at = None
+        self.prompt = ""
+        self.messages = []
+
+    def _ms(self, key: str) -> float:
+        return self.settings.get(key, 0) / 1000
+
+    def get(self, url: str):
+        time.sleep(self._ms("page_load_ms"))
+        self.state = "welcome"
+        self.source_ready_at = None
+        self.prompt = ""
+        self.messages = []
+
+    def execute_script(self, script: str, *args):
+        return None
+
+    def quit(self):
+        self.state = "closed"
+
+    def _find(self, value: str, parent: Optional[str] = None) -> FakeElement:
+        if self.state == "welcome" and "welcome-page" in value:
+            return FakeElement(self, "new_notebook")
+        if self.state in ("notebook", "pasting") and "mat-mdc-chip-4" in value:
+            return FakeElement(self, "paste_text")
+        if self.state == "pasting" and value == "mat-input-0":
+            return FakeElement(self, "source_input")
+        if self.state == "pasting" and "Insert" in value:
+            return FakeElement(self, "insert")
+        if self.state == "sources" and value in ("chat-panel", "omnibar", "query-box"):
+            return FakeElement(self, value)
+        if self.state == "sources" and value == "textarea" and parent == "query-box":
+            if time.monotonic() < self.source_ready_at:
+                raise NoSuchElementException("source is still being processed")
+            return FakeElement(self, "prompt_input")
+        raise NoSuchElementException(f"no element {value!r} in state {self.state}")
+
+    def _find_all(self, value: str, parent: Optional[str] = None) -> list:
+        if parent == "chat-panel" and value == "chat-message":
+            now = time.monotonic()
+            return [FakeElement(self, "message", text_fn) for shown_at, text_fn in self.messages if now >= shown_at]
+        return []
+
+    def find_element(self, by=By.ID, value=None) -> FakeElement:
+        return self._find(value)
+
+    def find_elements(self, by=By.ID, value=None) -> list:
+        return self._find_all(value)
+
+    def _click(self, name: str):
+        if name == "new_notebook":
+            self.state = "notebook"
+        elif name == "paste_text":
+            self.state = "pasting"
+        elif name == "insert":
+            self.state = "sources"
+            self.source_ready_at = time.monotonic() + self._ms("source_ready_ms")
+
+    def _send_keys(self, name: str, value: str):
+        if name != "prompt_input":
+            return
+        if value != Keys.RETURN:
+            self.prompt += value
+            return
+        prompt, sent_at = self.prompt, time.monotonic()
+        answer = self.settings.get("answer", "")
+        start, stream = self._ms("answer_start_ms"), self._ms("answer_stream_ms")
+
+        def answer_text():
+            elapsed = time.monotonic() - sent_at - start
+            if elapsed <= 0:
+                return ""
+            shown = len(answer) if stream <= 0 else int(len(answer) * min(1.0, elapsed / stream))
+            return answer[:shown]
+
+        echo = self.settings.get("prompt_echo", "{prompt}").replace("{prompt}", prompt)
+        # 提示立即出現；回答那一則在 answer_start_ms 後才出現
+        self.messages.append((sent_at, lambda: echo))
+        self.messages.append((sent_at + start, answer_text))
+
+
+class FakeChromeOptions:
+    def __init__(self):
+        self.arguments = []
+
+    def add_argument(self, argument: str):
+        self.arguments.append(argument)
+
+
+def install_llm():
+    """讓 MCPClient 與 ArticleGenerator 建立的 ChatOpenAI 都變成 FakeChatModel（兩者都在使用時才 from langchain_openai import）。"""
+    import langchain_openai
+
+    langchain_openai.ChatOpenAI = FakeChatModel
+
+
+def install_browser():
+    """讓 ArticleGenerator.launch_webdriver 啟動 FakeNotebookDriver 而不是 undetected_chromedriver。"""
+    settings = load_config()["browser"]
+
+    def chrome(**kwargs):
+        time.sleep(settings.get("driver_startup_ms", 0) / 1000)
+        return FakeNotebookDriver(settings)
+
+    # launch_webdriver 在呼叫時才 import undetected_chromedriver，會拿到這個替身
+    sys.modules["undetected_chromedriver"] = SimpleNamespace(Chrome=chrome, ChromeOptions=FakeChromeOptions)
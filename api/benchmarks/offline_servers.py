@@ -0,0 +1,46 @@
+"""
+以替身（benchmarks/fakes.py）啟動工具伺服器或 API，供 bench_offline.py 使用，也可以手動啟動做離線測試
+
+    cd api
+    uv run ./benchmarks/offline_servers.py mcp --port 18000
+    MCP_TOOL_URL=http://127.0.0.1:18000/mcp uv run ./benchmarks/offline_servers.py api --port 18001
+
+替身必須在 import mcp_server / main 之前裝好，因此以 runpy 執行 mcp_server.py 原本的 __main__。
+"""
+import argparse
+import os
+import runpy
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+import fakes  # noqa: E402  (benchmarks/ 目錄已在 sys.path 上)
+
+
+def run_mcp_server(host: str, port: int):
+    fakes.install_llm()
+    fakes.install_browser()
+    sys.argv = [os.path.join(API_DIR, "mcp_server.py"), "--host", host, "--port", str(port)]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+
+def run_api(host: str, port: int):
+    import uvicorn
+
+    fakes.install_llm()
+    import main
+
+    uvicorn.run(main.app, host=host, port=port, log_level=os.getenv("UVICORN_LOG_LEVEL", "warning"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the MCP tool server or the API with a fake LLM and browser")
+    parser.add_argument("service", choices=["mcp", "api"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+    if args.service == "mcp":
+        run_mcp_server(args.host, args.port)
+    else:
+        run_api(args.host, args.port)
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolFull(Exception):
+    """等待佇列已滿，呼叫端應稍後重試。"""
+
+
+class _Job:
+    def __init__(self, fn: Callable, max_attempts: int):
+        self.fn = fn
+        self.max_attempts = max_attempts
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+        # 送出時的 contextvars（correlation id、目前的 span），讓工作執行緒中的 log 與 span 歸到同一個請求
+        self.context = contextvars.copy_context()
+
+
+class BrowserWorker(threading.Thread):
+    """
+    持有一個 Chrome driver 的背景執行緒
+
+    driver 在啟動時就預先建立，之後跨 job 重複使用；
+    執行滿 max_jobs_per_driver 個 job 或 job 執行失敗（視為瀏覽器狀態不可信）時關閉並重新啟動。
+    """
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        super().__init__(name=f"browser-worker-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.driver = None
+        self.jobs_on_driver = 0
+        self.busy = False
+
+    def _launch(self):
+        started = time.monotonic()
+        self.driver = self.pool.driver_factory(self.index)
+        self.jobs_on_driver = 0
+        logger.info(f"[{self.name}] driver launched in {time.monotonic() - started:.1f}s")
+
+    def _recycle(self, reason: str):
+        logger.info(f"[{self.name}] recycling driver ({reason})")
+        self.pool._count("recycled")
+        try:
+            if self.driver is not None:
+                self.driver.quit()
+        except Exception as e:
+            logger.warning(f"[{self.name}] driver quit failed: {e}")
+        self.driver = None
+
+    def run(self):
+        if self.pool.prelaunch:
+            try:
+                self._launch()
+            except Exception as e:
+                logger.error(f"[{self.name}] driver prelaunch failed: {e}")
+
+        while True:
+            job = self.pool._queue.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self.busy = True
+            try:
+                self._run_job(job)
+            finally:
+                self.busy = False
+                self.pool._queue.task_done()
+
+        if self.driver is not None:
+            self._recycle("shutdown")
+
+    def _run_job(self, job: _Job):
+        started = time.monotonic()
+        wait = started - job.submitted_at
+        last_error: Optional[BaseException] = None
+        for attempt in range(job.max_attempts):
+            try:
+                if self.driver is None:
+                    self._launch()
+                result = job.context.run(job.fn, self.driver)
+                self.jobs_on_driver += 1
+                wall = time.monotonic() - started
+                self.pool._record_job(wall, wait, ok=True)
+                logger.info(f"[{self.name}] job done in {wall:.1f}s (queued {wait:.1f}s, attempt {attempt + 1})")
+                job.future.set_result(result)
+                if self.jobs_on_driver >= self.pool.max_jobs_per_driver:
+                    self._recycle(f"reached {self.jobs_on_driver} jobs")
+                return
+            except Exception as e:
+                last_error = e
+                logger.error(f"[{self.name}] job attempt {attempt + 1} failed: {e}")
+                self._recycle("crash")
+        self.pool._record_job(time.monotonic() - started, wait, ok=False)
+        job.future.set_exception(last_error)
+
+
+class BrowserPool:
+    """
+    Selenium 瀏覽器工作池
+
+    - size 個預先啟動的 driver，各自使用獨立的 Chrome 使用者資料夾，在各自的執行緒中執行
+    - job 進入有上限的佇列（queue_depth），滿了直接拋出 BrowserPoolFull
+    - submit() 可在 event loop 中 await，不會阻塞其他 MCP 工具
+    """
+
+    def __init__(
+        self,
+        driver_factory: Callable[[int], object],
+        size: int = 1,
+        queue_depth: int = 8,
+        max_jobs_per_driver: int = 20,
+        max_attempts: int = 3,
+        prelaunch: bool = True,
+    ):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.queue_depth = queue_depth
+        self.max_jobs_per_driver = max_jobs_per_driver
+        self.max_attempts = max_attempts
+        self.prelaunch = prelaunch
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=queue_depth)
+        self._workers: list[BrowserWorker] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._stats = {
+            "jobs_completed": 0,
+            "jobs_failed": 0,
+            "recycled": 0,
+            "rejected": 0,
+            "total_wall_s": 0.0,
+            "max_wall_s": 0.0,
+            "last_wall_s": 0.0,
+            "total_wait_s": 0.0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.size):
+                worker = BrowserWorker(self, i)
+                worker.start()
+                self._workers.append(worker)
+        logger.info(f"Browser pool started: size={self.size}, queue_depth={self.queue_depth}")
+
+    def submit_nowait(self, fn: Callable) -> Future:
+        """送出 job，fn 會在工作執行緒中以 fn(driver) 呼叫。回傳 concurrent.futures.Future。"""
+        if self._closed:
+            raise RuntimeError("browser pool is shut down")
+        self.start()
+        job = _Job(fn, self.max_attempts)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise BrowserPoolFull(f"browser queue is full ({self.queue_depth} jobs waiting)")
+        return job.future
+
+    async def submit(self, fn: Callable):
+        return await asyncio.wrap_future(self.submit_nowait(fn))
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _record_job(self, wall: float, wait: float, ok: bool):
+        with self._lock:
+            self._stats["jobs_completed" if ok else "jobs_failed"] += 1
+            self._stats["total_wall_s"] += wall
+            self._stats["total_wait_s"] += wait
+            self._stats["last_wall_s"] = wall
+            self._stats["max_wall_s"] = max(self._stats["max_wall_s"], wall)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        finished = stats["jobs_completed"] + stats["jobs_failed"]
+        stats.update({
+            "size": self.size,
+            "busy": sum(1 for w in self._workers if w.busy),
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.queue_depth,
+            "avg_wall_s": stats["total_wall_s"] / finished if finished else 0.0,
+            "avg_wait_s": stats["total_wait_s"] / finished if finished else 0.0,
+        })
+        return stats
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        停止所有 worker 並關閉各自的 driver（Chrome / chromedriver 行程）；可以重複呼叫。
+
+        還在排隊的 job 直接取消，執行中的 job 做完才會結束；wait 時每個 worker 最多等 timeout 秒。
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.future.cancel()
+            self._queue.task_done()
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for worker in workers:
+                worker.join(timeout)
+                if worker.is_alive():
+                    logger.warning(f"[{worker.name}] still running after {timeout}s, driver not closed")
+        logger.info("Browser pool shut down")
@@ -0,0 +1,202 @@
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+
+from utils.tokens import estimate_tokens
+
+# 每則訊息在 chat 格式中的固定開銷（role、分隔符號等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# truncate_to_tokens 附加的「...[truncated N tokens]」說明大約佔用的 token
+TRUNCATION_NOTE_TOKENS = 12
+
+
+@dataclass
+class ContextEntry:
+    """一則已轉換成 LangChain 格式的訊息與它的 token 數。"""
+    role: str
+    message: object
+    tokens: int
+    tool_calls: bool = False
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """超過 max_tokens 時依比例保留開頭並註明截掉的 token 數。"""
+    tokens = estimate_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    cut = max(1, len(text) * max_tokens // tokens)
+    return f"{text[:cut]}\n...[truncated {tokens - max_tokens} tokens]"
+
+
+class ContextWindow:
+    """
+    維護每個對話已轉換的 LangChain 訊息，並讓每次送給 LLM 的 prompt 不超過 token 預算
+
+    轉換是增量的：Conversation.context_entries 與 messages 對齊，每次只轉換新加入的訊息，
+    過大的工具結果在轉換時就截到 tool_result_max_tokens。
+    超過預算時依序：
+    1. 舊的問答輪次只保留使用者問題與最終回答（去掉中間的工具呼叫）
+    2. 由舊到新整輪捨棄舊的問答
+    3. 目前這輪較早的工具結果改成簡短的省略說明（保留 tool_call_id 對應）
+    4. 最後一批工具結果平均縮短到剩餘的預算內
+    5. 仍然超過時（例如單一則很長的使用者訊息或工具結果），由新到舊截短訊息內容直到符合預算
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 16000,
+        tool_result_max_tokens: int = 2000,
+        min_tool_result_tokens: int = 200,
+        model: str = "gpt-4o",
+    ):
+        self.max_tokens = max_tokens
+        self.tool_result_max_tokens = tool_result_max_tokens
+        self.min_tool_result_tokens = min_tool_result_tokens
+        self.model = model
+
+    def _count(self, text) -> int:
+        if not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False, default=str)
+        return estimate_tokens(text, self.model) + MESSAGE_OVERHEAD_TOKENS
+
+    def _tool_entry(self, content: str, tool_call_id: str) -> ContextEntry:
+        return ContextEntry("tool", ToolMessage(content=content, tool_call_id=tool_call_id), self._count(content))
+
+    def _shrink(self, entry: ContextEntry, max_tokens: int) -> ContextEntry:
+        """把 entry 的文字內容截短，讓整則訊息（含開銷、tool_calls）不超過 max_tokens。"""
+        content = entry.message.content
+        fixed = entry.tokens - self._count(content)
+        limit = max_tokens - fixed - MESSAGE_OVERHEAD_TOKENS
+        while True:
+            shortened = truncate_to_tokens(content, max(0, limit), self.model)
+            tokens = fixed + self._count(shortened)
+            # truncate_to_tokens 依比例切字並附上說明，可能仍略超過，繼續縮短
+            if tokens <= max_tokens or limit <= 0:
+                break
+            limit -= max(1, tokens - max_tokens)
+        return ContextEntry(entry.role, entry.message.model_copy(update={"content": shortened}), tokens, entry.tool_calls)
+
+    def _convert(self, msg: dict) -> Optional[ContextEntry]:
+        if msg["role"] == "user":
+            return ContextEntry("user", HumanMessage(content=msg["content"]), self._count(msg["content"]))
+        if msg["role"] == "assistant":
+            tool_calls = msg.get("tool_calls") or []
+            tokens = self._count(msg["content"] or "")
+            if tool_calls:
+                tokens += self._count([{"name": c["name"], "args": c.get("args")} for c in tool_calls])
+            return ContextEntry(
+                "assistant", AIMessage(content=msg["content"], tool_calls=tool_calls), tokens, bool(tool_calls)
+            )
+        if msg["role"] == "tool":
+            content = msg["content"] if isinstance(msg["content"], str) else json.dumps(msg["content"], ensure_ascii=False)
+            return self._tool_entry(truncate_to_tokens(content, self.tool_result_max_tokens, self.model), msg["tool_call_id"])
+        return None
+
+    def sync(self, conversation) -> list:
+        """只轉換 conversation 中尚未轉換的訊息，回傳與 messages 對齊的 entries。"""
+        entries = conversation.context_entries
+        for msg in conversation.messages[len(entries):]:
+            entries.append(self._convert(msg))
+        return [entry for entry in entries if entry is not None]
+
+    @staticmethod
+    def _split_turns(entries: list) -> list:
+        turns = []
+        for entry in entries:
+            if entry.role == "user" or not turns:
+                turns.append([])
+            turns[-1].append(entry)
+        return turns
+
+    @staticmethod
+    def _tool_groups(turn: list) -> list:
+        """回傳 turn 中每一批工具呼叫的 (assistant 位置, [tool 位置...])。"""
+        groups = []
+        for i, entry in enumerate(turn):
+            if entry.tool_calls:
+                groups.append((i, []))
+            elif entry.role == "tool" and groups:
+                groups[-1][1].append(i)
+        return groups
+
+    def build(self, conversation, reserved_tokens: int = 0):
+        """
+        回傳 (LangChain 訊息, 統計)，統計含 prompt_tokens、budget、messages、
+        compacted_turns、dropped_turns、omitted_tool_results、truncated_tool_results、truncated_messages。
+        reserved_tokens 是工具 schema 等固定會送出的 token，先從預算中扣除。
+        """
+        budget = self.max_tokens - reserved_tokens
+        turns = self._split_turns(self.sync(conversation))
+        old_turns, current = turns[:-1], list(turns[-1]) if turns else []
+        stats = {
+            "compacted_turns": 0, "dropped_turns": 0, "omitted_tool_results": 0, "truncated_tool_results": 0,
+            "truncated_messages": 0,
+        }
+
+        def total():
+            return sum(e.tokens for turn in old_turns for e in turn) + sum(e.tokens for e in current)
+
+        # 1. 舊輪次只保留問題與最終回答
+        for i, turn in enumerate(old_turns):
+            if total() <= budget:
+                break
+            compact = [e for e in turn if e.role == "user" or (e.role == "assistant" and not e.tool_calls)]
+            if len(compact) < len(turn):
+                old_turns[i] = compact
+                stats["compacted_turns"] += 1
+
+        # 2. 由舊到新捨棄整輪
+        while old_turns and total() > budget:
+            old_turns.pop(0)
+            stats["dropped_turns"] += 1
+
+        # 3. 目前這輪較早的工具結果改成省略說明
+        groups = self._tool_groups(current)
+        for _, tool_indexes in groups[:-1]:
+            if total() <= budget:
+                break
+            for i in tool_indexes:
+                entry = current[i]
+                note = f"[earlier tool result omitted to fit the context window: {entry.tokens} tokens]"
+                current[i] = self._tool_entry(note, entry.message.tool_call_id)
+                stats["omitted_tool_results"] += 1
+
+        # 4. 最後一批工具結果平均分配剩下的預算
+        if groups and total() > budget:
+            tool_indexes = groups[-1][1]
+            others = total() - sum(current[i].tokens for i in tool_indexes)
+            per_tool = max(self.min_tool_result_tokens, (budget - others) // max(1, len(tool_indexes)))
+            for i in tool_indexes:
+                entry = current[i]
+                if entry.tokens > per_tool:
+                    content = truncate_to_tokens(entry.message.content, per_tool, self.model)
+                    current[i] = self._tool_entry(content, entry.message.tool_call_id)
+                    stats["truncated_tool_results"] += 1
+
+        # 5. 最後手段：截短過長的訊息；優先截最新一則截短後就能符合預算的，沒有的話先截最長的一則
+        def removable(entry):
+            if entry.tool_calls or not isinstance(entry.message.content, str):
+                return 0
+            return entry.tokens - MESSAGE_OVERHEAD_TOKENS - TRUNCATION_NOTE_TOKENS
+
+        while (over := total() - budget) > 0:
+            candidates = [i for i, entry in enumerate(current) if removable(entry) > 0]
+            if not candidates:
+                break
+            fits = [i for i in candidates if removable(current[i]) >= over]
+            i = fits[-1] if fits else max(candidates, key=lambda i: removable(current[i]))
+            shrunk = self._shrink(current[i], current[i].tokens - over)
+            if shrunk.tokens >= current[i].tokens:
+                break
+            current[i] = shrunk
+            stats["truncated_messages"] += 1
+
+        entries = [e for turn in old_turns for e in turn] + current
+        stats.update(
+            prompt_tokens=total() + reserved_tokens,
+            budget=self.max_tokens,
+            messages=len(entries),
+        )
+        return [e.message for e in entries], stats
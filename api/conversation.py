@@ -0,0 +1,36 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+
+class Conversation:
+    """
+    單一對話的狀態
+
+    每個 /query 請求各自擁有一份 Conversation，訊息歷史只存在這裡，
+    MCPClient 本身只保留 LLM、工具 schema 與傳輸連線等共用且不變的物件，
+    因此多個請求可以同時在同一個 MCPClient 上執行而不會互相覆蓋。
+    """
+
+    def __init__(self, conversation_id: Optional[str] = None):
+        self.id = conversation_id or uuid.uuid4().hex
+        # 這一次請求的 id；同一個 conversation_id 可能被多次請求使用，對話紀錄以 (turn_id, seq) 區分訊息
+        self.turn_id = uuid.uuid4().hex
+        self.created_at = datetime.now()
+        self.messages = []
+        # 已寫入對話紀錄的訊息數，之後只追加新的訊息
+        self.logged_count = 0
+        # ContextWindow 已轉換好的 LangChain 訊息，與 messages 對齊，只在新增訊息時增量轉換
+        self.context_entries = []
+
+    def add_message(self, role: str, content, **extra):
+        message = {"role": role, "content": content}
+        message.update(extra)
+        self.messages.append(message)
+        return message
+
+    def last_assistant_content(self):
+        for msg in reversed(self.messages):
+            if msg["role"] == "assistant" and msg.get("content") and not msg.get("tool_calls"):
+                return msg["content"]
+        return None
@@ -0,0 +1,147 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from utils.logger import logger
+
+
+class ConversationLogWriter:
+    """
+    非同步、只追加的對話紀錄
+
+    每則訊息寫成一行精簡 JSON（conversation_id、turn、seq、ts、message），
+    由背景 task 從有上限的佇列批次取出，在執行緒中寫入，不阻塞 event loop；
+    目前檔案超過 max_bytes 時改名封存並開新檔。
+
+    每個行程寫自己的檔案（conversations.<pid>.jsonl），多個 uvicorn worker 不會同時追加或封存同一個檔案。
+    """
+
+    def __init__(
+        self,
+        directory: str = "conversations",
+        queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_bytes: int = 20 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"conversations.{self.pid}.jsonl")
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def append(self, conversation_id: str, seq: int, message: dict, turn: Optional[str] = None) -> bool:
+        """
+        放入佇列後立即返回；佇列已滿時丟棄並計數，不讓紀錄拖慢請求。
+
+        seq 是訊息在這一次請求（turn）中的位置；同一個 conversation_id 的每次請求都從 0 開始，
+        以 (turn, seq) 區分，重建時不會互相覆蓋。
+        """
+        self.start()
+        record = {"conversation_id": conversation_id, "turn": turn, "seq": seq, "ts": time.time(), "message": message}
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Conversation log queue full, dropped {self.dropped} message(s)")
+            return False
+
+    async def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                # 等一小段時間收集更多訊息，合併成一次寫入
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                pending, batch = batch, []
+                await self._flush(pending)
+        except asyncio.CancelledError:
+            # 關閉時已收集但尚未寫出的訊息
+            if batch:
+                await self._flush(batch)
+            raise
+
+    async def _flush(self, batch: list):
+        lines = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n" for record in batch
+        )
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except Exception as e:
+            logger.error(f"Conversation log write failed: {e}")
+
+    def _write(self, lines: str):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            rotated = os.path.join(
+                self.directory, f"conversations.{self.pid}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+            )
+            os.replace(self.path, rotated)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def close(self):
+        """寫出佇列中剩餘的訊息後停止背景 task。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+
+def read_conversation(conversation_id: str, directory: str = "conversations") -> list:
+    """
+    從所有 worker 的（含已封存的）紀錄檔重建某個對話的訊息。
+
+    同一個對話的每次請求（turn）依第一則訊息的時間排序，turn 內依 seq 排序；
+    沒有 turn 欄位的舊紀錄視為同一個 turn。
+    """
+    turns = {}
+    for path in glob.glob(os.path.join(directory, "conversations*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                # 只解析可能相關的行，避免整份檔案都做 JSON 解析
+                if conversation_id not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("conversation_id") != conversation_id:
+                    continue
+                turn = turns.setdefault(record.get("turn"), {"ts": record.get("ts", 0), "messages": {}})
+                turn["ts"] = min(turn["ts"], record.get("ts", 0))
+                turn["messages"][record["seq"]] = record["message"]
+    messages = []
+    for turn in sorted(turns.values(), key=lambda t: t["ts"]):
+        messages.extend(turn["messages"][seq] for seq in sorted(turn["messages"]))
+    return messages
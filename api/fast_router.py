@@ -0,0 +1,174 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+NUMBER = r"([-+]?\d+(?:\.\d+)?)"
+JSON_TYPES = {"number": (int, float), "integer": (int,), "string": (str,), "boolean": (bool,)}
+
+
+def format_number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+@dataclass
+class Route:
+    """一個可直接呼叫的工具：query 完全符合某個 pattern 時，由 args 取出參數（None 表示不處理），answer 產生回答。"""
+    tool: str
+    patterns: list
+    args: Callable
+    answer: Callable
+    compiled: list = field(default_factory=list)
+
+    def __post_init__(self):
+        # (pattern, lang)：回答使用與問題相同的語言
+        self.compiled = [(re.compile(p, re.IGNORECASE), lang) for p, lang in self.patterns]
+
+
+def _number_args(match):
+    return {"a": float(match.group(1)), "b": float(match.group(2))}
+
+
+def _binary_answer(symbol: str):
+    def answer(args, result, lang):
+        return f"{format_number(args['a'])} {symbol} {format_number(args['b'])} = {format_number(result)}"
+    return answer
+
+
+# 多個地點、比較或預報等要求交給 LLM 處理
+NOT_A_SINGLE_LOCATION = re.compile(r"\b(?:and|or|vs|versus|compared|than|tomorrow|next|forecast)\b|和|跟|與|明天|下週|比較", re.IGNORECASE)
+# 地點的位置上出現時間、代名詞、動詞或贅字時（「今天天氣如何」、「幫我查高雄天氣」、「weather in my area」），
+# 取出的不是乾淨的地名，交給 LLM 處理
+NOT_A_PLACE = re.compile(
+    r"^the\b|\b(?:general|my|me|your|our|their|his|her|its|this|that|these|those|here|there|nearby|near|around|local|"
+    r"current|currently|now|today|tonight|weekend|morning|afternoon|evening|outside|like)\b|"
+    r"今天|今日|今晚|昨天|現在|目前|最近|這幾天|這週|本週|週末|早上|上午|中午|下午|晚上|未來|"
+    r"[我你您妳他她它]|這裡|那裡|這邊|那邊|當地|本地|附近|外面|"
+    r"覺得|認為|想|知道|查|幫|告訴|看看|請|問|說|要|會|能|可以|一下|的|嗎|呢|吧|啊",
+    re.IGNORECASE,
+)
+
+
+def _location_args(match):
+    location = match.group(1).strip()
+    if not location or NOT_A_SINGLE_LOCATION.search(location) or NOT_A_PLACE.search(location):
+        return None
+    return {"location": location}
+
+
+def _weather_answer(args, result, lang):
+    if not isinstance(result, dict):
+        return str(result)
+    location = result.get("location", args["location"])
+    if lang == "zh":
+        return f"{location}目前天氣{result.get('condition', '未知')}，氣溫 {result.get('temperature', '未知')}。"
+    return f"The weather in {location} is {result.get('condition', 'unknown')}, {result.get('temperature', 'unknown')}."
+
+
+DEFAULT_ROUTES = [
+    Route(
+        "add",
+        [
+            (rf"(?:please\s+)?(?:add|sum)\s+{NUMBER}\s+(?:and|to|\+|,)\s+{NUMBER}", "en"),
+            (rf"(?:what\s+is\s+|what's\s+)?{NUMBER}\s*(?:\+|plus)\s*{NUMBER}\s*=?", "en"),
+            (rf"{NUMBER}\s*(?:\+|加上|加)\s*{NUMBER}\s*(?:等於|是)?\s*(?:多少|幾)?", "zh"),
+        ],
+        _number_args,
+        _binary_answer("+"),
+    ),
+    Route(
+        "multiply",
+        [
+            (rf"(?:please\s+)?multiply\s+{NUMBER}\s+(?:and|by|with|\*|,)\s+{NUMBER}", "en"),
+            (rf"(?:what\s+is\s+|what's\s+)?{NUMBER}\s*(?:\*|x|×|times|multiplied\s+by)\s*{NUMBER}\s*=?", "en"),
+            (rf"{NUMBER}\s*(?:\*|×|乘以|乘)\s*{NUMBER}\s*(?:等於|是)?\s*(?:多少|幾)?", "zh"),
+        ],
+        _number_args,
+        _binary_answer("×"),
+    ),
+    Route(
+        "get_weather",
+        [
+            (r"(?:what's|what\s+is|how's|how\s+is)?\s*the\s+weather\s+(?:like\s+)?in\s+([A-Za-z][\w\s,.'-]{0,40}?)(?:\s+today)?", "en"),
+            (r"weather\s+(?:in|for)\s+([A-Za-z][\w\s,.'-]{0,40}?)", "en"),
+            (r"(?:請問)?\s*([一-鿿A-Za-z\s]{1,20}?)(?:今天|現在|目前)?的?天氣(?:如何|怎麼樣|怎樣|好嗎)?", "zh"),
+        ],
+        _location_args,
+        _weather_answer,
+    ),
+]
+
+
+class FastRouter:
+    """
+    不經過 LLM 的快速路徑
+
+    只處理格式明確的簡單請求（例如「add 3 and 5」、「台北天氣如何」）：整句必須完全符合 pattern，
+    取出的參數還要通過工具宣告的 inputSchema 檢查才會直接呼叫；其他情況一律回到 LLM agent。
+    """
+
+    def __init__(self, routes: Optional[list] = None):
+        self.routes = routes if routes is not None else DEFAULT_ROUTES
+        self.stats = {"queries": 0, "hits": 0, "fallbacks": 0, "errors": 0}
+        self._fast_seconds = 0.0
+        self._agent_seconds = 0.0
+        self._agent_queries = 0
+
+    @staticmethod
+    def _schema_allows(schema: dict, args: dict) -> bool:
+        properties = schema.get("properties") or {}
+        if any(key not in args for key in schema.get("required") or []):
+            return False
+        for key, value in args.items():
+            if key not in properties:
+                return False
+            allowed = JSON_TYPES.get(properties[key].get("type"))
+            if allowed is not None and (isinstance(value, bool) and bool not in allowed or not isinstance(value, allowed)):
+                return False
+        return True
+
+    def match(self, query: str, tools: list):
+        """回傳 (route, args, lang)；沒有符合或工具不存在 / schema 不符時回傳 None。"""
+        self.stats["queries"] += 1
+        text = query.strip().rstrip("?？!！。.").strip()
+        schemas = {t["function"]["name"]: t["function"].get("parameters") or {} for t in tools}
+        for route in self.routes:
+            if route.tool not in schemas:
+                continue
+            for pattern, lang in route.compiled:
+                match = pattern.fullmatch(text)
+                if match is None:
+                    continue
+                args = route.args(match)
+                if args is not None and self._schema_allows(schemas[route.tool], args):
+                    return route, args, lang
+        self.stats["fallbacks"] += 1
+        return None
+
+    def record_hit(self, seconds: float):
+        self.stats["hits"] += 1
+        self._fast_seconds += seconds
+
+    def record_error(self):
+        # 工具呼叫失敗，改走 LLM agent
+        self.stats["errors"] += 1
+        self.stats["fallbacks"] += 1
+
+    def record_agent(self, seconds: float):
+        self._agent_seconds += seconds
+        self._agent_queries += 1
+
+    def snapshot(self) -> dict:
+        hits = self.stats["hits"]
+        fast_avg = self._fast_seconds / hits if hits else None
+        agent_avg = self._agent_seconds / self._agent_queries if self._agent_queries else None
+        saved = (agent_avg - fast_avg) * hits if hits and agent_avg is not None else None
+        return {
+            **self.stats,
+            "hit_rate": hits / self.stats["queries"] if self.stats["queries"] else 0.0,
+            "avg_fast_path_ms": round(fast_avg * 1000, 2) if fast_avg is not None else None,
+            "avg_agent_ms": round(agent_avg * 1000, 2) if agent_avg is not None else None,
+            # 以 LLM agent 的平均延遲估算快速路徑省下的總時間
+            "estimated_saved_seconds": round(saved, 3) if saved is not None else None,
+        }
@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+from typing import Callable, Optional
+
+from session_pool import MCPSessionPool, RETRYABLE_ERRORS, ToolCallInterrupted
+from utils.logger import logger
+
+# 代表整台工具伺服器有問題的錯誤：連不上、連線中斷或逾時（工具本身回傳的錯誤不算）
+BACKEND_ERRORS = RETRYABLE_ERRORS + (OSError, asyncio.TimeoutError)
+
+
+class ToolServerBackend:
+    """一台 MCP 工具伺服器：自己的 session 連線池、進行中的請求數與健康狀態。"""
+
+    def __init__(self, url: str, pool: MCPSessionPool):
+        self.url = url
+        self.pool = pool
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0}
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for": max(0.0, round(self.ejected_until - time.monotonic(), 1)),
+            **self.stats,
+            "pool": self.pool.snapshot(),
+        }
+
+
+class LoadBalancedPool:
+    """
+    多台 MCP 工具伺服器的負載平衡，介面與 MCPSessionPool 相同（start / call_tool / list_tools / snapshot / close）
+
+    - 每次呼叫挑進行中請求數最少的健康伺服器（最少未完成請求），同數時隨機挑選
+    - 連續 eject_after 次連線層失敗的伺服器被暫時移出 eject_seconds 秒，時間到後再放回試用；
+      全部都被移出時仍會挑最早恢復的一台，不會直接拒絕請求
+    - 連線層失敗時改用另一台重試一次；工具本身回傳的錯誤不重試，
+      retry=False（有副作用的工具）時請求已送出才中斷的呼叫（ToolCallInterrupted）也不重試
+    - 指定 url 的呼叫只送到那一台（例如摘要工作的狀態只存在建立它的那台），不論健康狀態、也不改送其他台
+    """
+
+    def __init__(self, urls: list, pool_factory: Callable, eject_after: int = 3, eject_seconds: float = 30.0):
+        if not urls:
+            raise ValueError("LoadBalancedPool needs at least one tool server URL")
+        self.backends = [ToolServerBackend(url, pool_factory(url)) for url in urls]
+        self._by_url = {backend.url: backend for backend in self.backends}
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+
+    async def start(self, warm: int = 1):
+        """啟動每台伺服器的連線池；連不上的伺服器先被移出，全部都連不上才拋出例外。"""
+        errors = []
+        for backend in self.backends:
+            try:
+                await backend.pool.start(warm=warm)
+            except Exception as e:
+                errors.append(e)
+                self._record_failure(backend, e, eject=True)
+        if len(errors) == len(self.backends):
+            raise errors[0]
+
+    @property
+    def urls(self) -> list:
+        return [backend.url for backend in self.backends]
+
+    def _pick(self, exclude: Optional[ToolServerBackend] = None) -> ToolServerBackend:
+        candidates = [b for b in self.backends if b is not exclude] or self.backends
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            return min(candidates, key=lambda b: b.ejected_until)
+        fewest = min(b.outstanding for b in healthy)
+        return random.choice([b for b in healthy if b.outstanding == fewest])
+
+    def _record_failure(self, backend: ToolServerBackend, error: BaseException, eject: bool = False):
+        backend.consecutive_failures += 1
+        backend.stats["failures"] += 1
+        if eject or backend.consecutive_failures >= self.eject_after:
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+            backend.stats["ejections"] += 1
+            logger.warning(f"Ejecting MCP tool server {backend.url} for {self.eject_seconds}s: {error!r}")
+
+    async def _call_backend(self, backend: ToolServerBackend, fn: Callable):
+        backend.outstanding += 1
+        backend.stats["requests"] += 1
+        try:
+            result = await fn(backend.pool)
+        except BACKEND_ERRORS as e:
+            self._record_failure(backend, e)
+            raise
+        finally:
+            backend.outstanding -= 1
+        backend.consecutive_failures = 0
+        backend.ejected_until = 0.0
+        return result
+
+    async def _call(self, fn: Callable, retry: bool = True) -> tuple:
+        """回傳 (結果, 實際處理的伺服器)。"""
+        backend = self._pick()
+        for attempt in range(2):
+            try:
+                return await self._call_backend(backend, fn), backend
+            except BACKEND_ERRORS as e:
+                if attempt == 1 or len(self.backends) == 1 or (not retry and isinstance(e, ToolCallInterrupted)):
+                    raise
+                backend = self._pick(exclude=backend)
+
+    async def call_tool_on(
+        self, tool_name: str, tool_args: dict, url: Optional[str] = None, retry: bool = True
+    ) -> tuple:
+        """回傳 (結果, 實際處理的伺服器 URL)；指定 url 時只送到那一台。"""
+        fn = lambda pool: pool.call_tool(tool_name, tool_args, retry=retry)  # noqa: E731
+        if url is not None:
+            return await self._call_backend(self._by_url[url], fn), url
+        result, backend = await self._call(fn, retry)
+        return result, backend.url
+
+    async def call_tool(self, tool_name: str, tool_args: dict, url: Optional[str] = None, retry: bool = True):
+        result, _ = await self.call_tool_on(tool_name, tool_args, url, retry)
+        return result
+
+    async def call_tool_each(self, tool_name: str, tool_args: dict, retry: bool = True) -> list:
+        """同時送到每一台健康的伺服器（全部被移出時送到每一台），回傳 [(url, 結果或例外)]。"""
+        backends = [b for b in self.backends if b.healthy] or self.backends
+        results = await asyncio.gather(
+            *(self._call_backend(b, lambda pool: pool.call_tool(tool_name, tool_args, retry=retry)) for b in backends),
+            return_exceptions=True,
+        )
+        return [(backend.url, result) for backend, result in zip(backends, results)]
+
+    async def list_tools(self):
+        result, _ = await self._call(lambda pool: pool.list_tools())
+        return result
+
+    def snapshot(self) -> dict:
+        return {"backends": [backend.snapshot() for backend in self.backends]}
+
+    async def close(self):
+        await asyncio.gather(*(backend.pool.close() for backend in self.backends), return_exceptions=True)
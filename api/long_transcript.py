@@ -0,0 +1,77 @@
+import re
+
+from utils.tokens import estimate_tokens
+
+# 「講者：內容」或「[00:12:34] 講者:」這類講者開頭的行
+SPEAKER_LINE = re.compile(r"^\s*(\[[\d:.\s]+\]\s*)?[^\s:：]{1,24}\s*[:：]")
+SENTENCE_END = re.compile(r"(?<=[。！？!?；;.])\s*")
+
+
+def split_blocks(text: str) -> list:
+    """依段落（空行）與講者換人切成最小區塊，區塊內保持原本的行。"""
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        if current and SPEAKER_LINE.match(line):
+            blocks.append("\n".join(current))
+            current = []
+        current.append(line.rstrip())
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int, model: str) -> list:
+    """單一區塊超過上限時，先依句子切，仍太長的句子再依字元數硬切。"""
+    pieces = []
+    current = ""
+    for sentence in (s for s in SENTENCE_END.split(block) if s):
+        candidate = current + sentence
+        if current and estimate_tokens(candidate, model) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+
+    result = []
+    for piece in pieces:
+        tokens = estimate_tokens(piece, model)
+        if tokens <= max_tokens:
+            result.append(piece)
+            continue
+        step = max(1, len(piece) * max_tokens // tokens)
+        result.extend(piece[i:i + step] for i in range(0, len(piece), step))
+    return result
+
+
+def chunk_transcript(text: str, max_tokens: int = 3000, model: str = "gpt-4o") -> list:
+    """
+    以 token 數為上限把逐字稿切成多段，盡量在講者或段落邊界切開，
+    讓每段都保有完整的發言，可獨立交給 LLM 摘要。
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for block in split_blocks(text):
+        block_tokens = estimate_tokens(block, model)
+        if block_tokens > max_tokens:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(block, max_tokens, model))
+            continue
+        if current and current_tokens + block_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += block_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
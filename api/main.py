@@ -1,26 +1,63 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 from contextlib import asynccontextmanager
+import json
+import os
+import math
+import hashlib
+import time
 from mcp_client import MCPClient
+from conversation import Conversation
+from conversation_log import read_conversation
+from admission import ResourceLimiter, RateLimiter, Overloaded, DeadlineExceeded, new_deadline
+from transcript_store import TranscriptStore, TranscriptTooLarge, InvalidTranscript
+from utils.logger import setup_logging, instance_log_file, correlation_id, new_correlation_id
+from utils.telemetry import REGISTRY, tracer, span
+import asyncio
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
 load_dotenv()
+# 每個 uvicorn worker 寫自己的 log 檔（mcp_client.<pid>.log）
+setup_logging("mcp_client", instance_log_file(os.getenv("LOG_FILE", "mcp_client.log"), str(os.getpid())))
+tracer.configure("mcp_client")
 
 class Settings(BaseSettings):
     server_script_path: str = "/Users/steve.wang/Downloads/AI_FastAPI_MCP/mcp_server.py"
     mcp_tool_url: str = "http://localhost:8000/mcp"  # HTTP MCP 工具 URL
+    # 多台工具伺服器（逗號分隔），設定時取代 mcp_tool_url，呼叫依進行中的請求數分配
+    mcp_tool_urls: str = ""
+    # 摘要等重量級工具專用的工具伺服器（逗號分隔），未設定時與一般工具共用
+    mcp_heavy_tool_urls: str = ""
+    query_timeout: float = 120.0  # 每個查詢的預設截止時間（秒），請求可用 timeout 欄位縮短
+    max_query_timeout: float = 600.0
+    rate_limit_per_second: float = 5.0  # 每個 API key / IP 的平均請求速率，0 表示不限制
+    rate_limit_burst: float = 20.0
+    max_batch_items: int = 1000  # /query/batch 單次最多的項目數
+
+
+def split_urls(value: str) -> list:
+    return [url.strip() for url in value.split(",") if url.strip()]
 
 settings = Settings()
+# 上傳的逐字稿；工具伺服器以相同的 TRANSCRIPT_DIR 讀取
+transcript_store = TranscriptStore.from_env()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler to manage MCP client connection."""
     # 指定 HTTP 模式
-    client = MCPClient(mode="streamable_http", server_path_or_url=settings.mcp_tool_url)
+    # 多個 uvicorn worker 時，每個 worker 行程各自執行 lifespan，擁有自己的 MCPClient 與連線池
+    client = MCPClient(
+        mode="streamable_http",
+        server_path_or_url=split_urls(settings.mcp_tool_urls) or [settings.mcp_tool_url],
+        heavy_server_urls=split_urls(settings.mcp_heavy_tool_urls),
+    )
     try:
         connected = await client.connect_to_server()
         if not connected:
@@ -45,8 +82,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by method, route and status")
+HTTP_DURATION = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by method and route")
+RESOURCE_ACTIVE = REGISTRY.gauge("resource_active", "Slots in use per resource class")
+RESOURCE_WAITING = REGISTRY.gauge("resource_waiting", "Requests waiting for a slot per resource class")
+RESOURCE_REJECTED = REGISTRY.counter("resource_rejected_total", "Requests rejected (queue full or wait timeout) per resource class")
+TOOL_SERVER_HEALTHY = REGISTRY.gauge("tool_server_healthy", "1 if the MCP tool server is not ejected")
+TOOL_SERVER_OUTSTANDING = REGISTRY.gauge("tool_server_outstanding", "In-flight calls per MCP tool server")
+TOOL_CACHE_EVENTS = REGISTRY.counter("tool_cache_events_total", "Tool result cache hits / misses")
+
+
+def route_label(request: Request) -> str:
+    """以路由樣板（/summaries/{job_id}）而不是實際路徑當 label，避免 label 數量無限增長。"""
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    """每個請求一個關聯 ID（沿用 X-Request-ID 或自動產生），寫進這個請求的所有 log 並回傳給呼叫端。"""
+    request_id = request.headers.get("X-Request-ID") or new_correlation_id()
+    token = correlation_id.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        # 串流回應的 span 只涵蓋到開始回應為止，之後的階段仍以 correlation_id 歸在同一個 trace
+        with span("http.request", method=request.method, path=request.url.path) as request_span:
+            response = await call_next(request)
+            status = response.status_code
+            request_span.set(status=status, route=route_label(request))
+    finally:
+        correlation_id.reset(token)
+        route = route_label(request)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+        HTTP_DURATION.observe(time.perf_counter() - started, method=request.method, route=route)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# 同時處理中的查詢數與等待佇列；超過時立即回 503，不讓請求在伺服器上無限堆積
+query_limiter = ResourceLimiter.from_env("queries", "QUERY", limit=32, max_waiting=64, max_wait=10.0)
+rate_limiter = RateLimiter(settings.rate_limit_per_second, settings.rate_limit_burst)
+
+
+def client_key(request: Request) -> str:
+    """有 API key 時以 key（雜湊後）區分呼叫端，否則使用來源 IP。"""
+    api_key = request.headers.get("X-API-Key")
+    authorization = request.headers.get("Authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def retry_after_header(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+async def enforce_rate_limit(request: Request):
+    wait = rate_limiter.check(client_key(request))
+    if wait:
+        raise HTTPException(status_code=429, detail="rate limit exceeded", headers=retry_after_header(wait))
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=retry_after_header(exc.retry_after))
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
 class QueryRequest(BaseModel):
     query: str  
+    conversation_id: Optional[str] = None
+    timeout: Optional[float] = None  # 秒；未指定時使用 settings.query_timeout
+    transcript_id: Optional[str] = None  # POST /transcripts 上傳的逐字稿，只有 id 會放進對話
+
+
+async def query_text(request: QueryRequest) -> str:
+    """指定 transcript_id 時在查詢後附上逐字稿的 id，讓 LLM 以 id 呼叫摘要工具，全文不經過對話訊息與 log。"""
+    if not request.transcript_id:
+        return request.query
+    info = await asyncio.to_thread(transcript_store.info, request.transcript_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="transcript not found")
+    return (
+        f"{request.query}\n\n"
+        f"（使用者已上傳逐字稿 transcript_id={info.id}，共 {info.chars} 字；呼叫工具時請傳 transcript_id，不要要求貼上全文）"
+    )
+
+
+def query_deadline(request: QueryRequest) -> float:
+    return new_deadline(min(request.timeout or settings.query_timeout, settings.max_query_timeout))
 
 class Message(BaseModel):
     role: str
@@ -57,38 +187,367 @@ class ToolCall(BaseModel):
     args: Dict[str, Any]
     
     
-@app.post("/query")
+def extract_answer(messages) -> str:
+    """回傳最後一個 assistant 的回答（略過只有 tool_calls 的中間輪次）。"""
+    for msg in reversed(messages):
+        if msg["role"] == "assistant" and not msg.get("tool_calls"):
+            content = msg["content"]
+            if isinstance(content, str):
+                cleaned = content.strip()
+                # 如果尾巴有多餘 undefined，清理掉（可依需要擴充）
+                if cleaned.endswith("undefined"):
+                    cleaned = cleaned[:-len("undefined")].strip()
+                return cleaned
+            elif isinstance(content, list):
+                # 過濾 None 或空字串，並轉成字串後 join
+                filtered = [str(c).strip() for c in content if c and str(c).strip() and str(c) != "undefined"]
+                return " ".join(filtered)
+            else:
+                return str(content).strip()
+    return "沒有回覆內容。"
+
+
+@app.post("/query", dependencies=[Depends(enforce_rate_limit)])
 async def query(request: QueryRequest):
     """Process a query and return the response."""
     client: MCPClient = app.state.client
+    # 每個請求建立自己的對話狀態，共用的 client 只負責 LLM / 工具 / 連線
+    conversation = Conversation(request.conversation_id)
+    deadline = query_deadline(request)
+    query = await query_text(request)
     try:
-        messages = await client.process_query(request.query)
-        print("== messages ===")
-        for msg in reversed(messages):
-            if msg["role"] == "assistant":
-                content = msg["content"]
-                print("assistant content:", repr(content))  # <-- 這行
-        # ... 你的原本邏輯
-        # 回傳最後一個 assistant 的回答
-        for msg in reversed(messages):
-            if msg["role"] == "assistant":
-                content = msg["content"]
-                if isinstance(content, str):
-                    cleaned = content.strip()
-                    # 如果尾巴有多餘 undefined，清理掉（可依需要擴充）
-                    if cleaned.endswith("undefined"):
-                        cleaned = cleaned[:-len("undefined")].strip()
-                    return {"answer": cleaned}
-                elif isinstance(content, list):
-                    # 過濾 None 或空字串，並轉成字串後 join
-                    filtered = [str(c).strip() for c in content if c and str(c).strip() and str(c) != "undefined"]
-                    return {"answer": " ".join(filtered)}
+        async with query_limiter.slot(deadline):
+            messages = await client.process_query(query, conversation, deadline)
+        response = {"answer": extract_answer(messages), "conversation_id": conversation.id, "cached": False}
+        if "cached_similarity" in messages[-1]:
+            # 與先前的問題足夠相近，直接回傳快取的回答，沒有經過 LLM
+            response.update(cached=True, similarity=messages[-1]["cached_similarity"])
+        return response
+    except (Overloaded, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str):
+    """Rebuild a conversation from the append-only conversation log."""
+    client: MCPClient = app.state.client
+    messages = await asyncio.to_thread(read_conversation, conversation_id, client.conversation_log.directory)
+    if not messages:
+        raise HTTPException(status_code=404, detail="conversation not found")
+    return {"conversation_id": conversation_id, "messages": messages}
+
+
+async def acquire_query_slot(deadline: Optional[float]):
+    """
+    給串流回應使用：先取得 query_limiter 的名額，回傳只會生效一次的 release()。
+    由產生器的 finally 與回應的 BackgroundTask 兩邊呼叫，串流從未開始（例如連線已中斷）時也會歸還名額。
+    """
+    await query_limiter.acquire(deadline)
+    started = asyncio.get_running_loop().time()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            query_limiter.release(asyncio.get_running_loop().time() - started)
+
+    return release
+
+
+def sse_event(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.post("/query/stream", dependencies=[Depends(enforce_rate_limit)])
+async def query_stream(request: QueryRequest):
+    """Process a query and stream tokens / tool events / final answer as Server-Sent Events."""
+    client: MCPClient = app.state.client
+    conversation = Conversation(request.conversation_id)
+    deadline = query_deadline(request)
+    query = await query_text(request)
+    # 在回應開始前取得名額，滿載時才能回 503 而不是已經開始的 200 串流
+    release = await acquire_query_slot(deadline)
+
+    async def event_stream():
+        yield sse_event({"type": "start", "conversation_id": conversation.id})
+        try:
+            async for event in client.process_query_stream(query, conversation, deadline):
+                if event["type"] == "final":
+                    event["answer"] = extract_answer(conversation.messages)
+                yield sse_event(event)
+        except Exception as e:
+            yield sse_event({"type": "error", "message": str(e)})
+        finally:
+            release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # 串流從未開始（例如連線已中斷）時也要歸還名額
+        background=BackgroundTask(release),
+    )
+
+
+class BatchQueryItem(BaseModel):
+    query: str
+    conversation_id: Optional[str] = None
+
+
+class BatchQueryRequest(BaseModel):
+    # 每一筆可以是查詢字串或 {"query", "conversation_id"}
+    items: List[Union[str, BatchQueryItem]]
+    concurrency: Optional[int] = None  # 同時執行的項目數，預設 BATCH_CONCURRENCY
+    timeout: Optional[float] = None  # 每一筆的截止秒數，預設 settings.query_timeout
+
+
+@app.post("/query/batch", dependencies=[Depends(enforce_rate_limit)])
+async def query_batch(request: BatchQueryRequest):
+    """
+    Run many queries with bounded concurrency; identical items run once.
+    Results are streamed as NDJSON in completion order: one {"type": "item", "index", "status", ...} line per item,
+    then {"type": "done"}. A failed item does not fail the batch.
+    """
+    client: MCPClient = app.state.client
+    if not request.items:
+        raise HTTPException(status_code=422, detail="items must not be empty")
+    if len(request.items) > settings.max_batch_items:
+        raise HTTPException(status_code=413, detail=f"at most {settings.max_batch_items} items per batch")
+    items = [item if isinstance(item, str) else item.model_dump() for item in request.items]
+    timeout = min(request.timeout or settings.query_timeout, settings.max_query_timeout)
+    concurrency = max(1, min(request.concurrency or client.batch_concurrency, client.batch_concurrency))
+    # 整個批次佔用一個查詢名額，批次內的併發由 concurrency 與 LLM / 工具的併發上限控制
+    release = await acquire_query_slot(new_deadline(settings.query_timeout))
+
+    async def ndjson_stream():
+        started = time.perf_counter()
+        counts = {"ok": 0, "error": 0}
+        yield json.dumps({"type": "start", "items": len(items)}) + "\n"
+        try:
+            async for result in client.process_batch(items, concurrency, timeout):
+                counts[result["status"]] += 1
+                yield json.dumps({"type": "item", **result}, ensure_ascii=False) + "\n"
+            yield json.dumps({"type": "done", **counts, "elapsed_s": round(time.perf_counter() - started, 3)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            release()
+
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+
+async def copy_multipart_file(request: Request, writer) -> Optional[str]:
+    """把 multipart 的 "file" 欄位逐塊寫進 writer，回傳檔名；Starlette 解析時本身也只以 spooled 暫存檔保存檔案。"""
+    form = await request.form(max_files=1, max_fields=10)
+    try:
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise InvalidTranscript('multipart body must contain a "file" field')
+        while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+            await asyncio.to_thread(writer.write, chunk)
+        return upload.filename
+    finally:
+        await form.close()
+
+
+@app.post("/transcripts", status_code=201, dependencies=[Depends(enforce_rate_limit)])
+async def upload_transcript(request: Request, filename: Optional[str] = None):
+    """
+    Upload a transcript as multipart ("file" field) or as a raw / chunked UTF-8 body.
+    The body is streamed to a spooled temp file and hashed on the fly; identical content gets the same transcript_id,
+    which /query, /summaries and the summarization tools accept instead of the full text.
+    """
+    length = request.headers.get("content-length")
+    # multipart 另有欄位標頭與邊界，預留一點空間；實際內容大小在寫入時再檢查一次
+    if length and length.isdigit() and transcript_store.max_bytes and int(length) > transcript_store.max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"transcript exceeds {transcript_store.max_bytes} bytes")
+    with span("transcript.upload") as upload_span:
+        try:
+            with transcript_store.writer() as writer:
+                if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                    filename = await copy_multipart_file(request, writer) or filename
                 else:
-                    return {"answer": str(content).strip()}
-        return {"answer": "沒有回覆內容。"}
+                    async for chunk in request.stream():
+                        await asyncio.to_thread(writer.write, chunk)
+                info = await asyncio.to_thread(writer.commit, filename)
+        except TranscriptTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidTranscript as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        upload_span.set(bytes=info.bytes, transcript_id=info.id)
+    return info.to_dict()
+
+
+@app.get("/transcripts/{transcript_id}")
+async def get_transcript(transcript_id: str):
+    """Size, character count and hash of an uploaded transcript (the text itself is not returned)."""
+    info = await asyncio.to_thread(transcript_store.info, transcript_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="transcript not found")
+    return info.to_dict()
+
+
+class SummaryJobRequest(BaseModel):
+    text: str = ""
+    transcript_id: Optional[str] = None  # 已上傳的逐字稿，取代 text
+
+
+@app.post("/summaries", status_code=202, dependencies=[Depends(enforce_rate_limit)])
+async def submit_summary(request: SummaryJobRequest):
+    """Submit a transcript (text or an uploaded transcript_id) for background summarization; returns a job id immediately."""
+    client: MCPClient = app.state.client
+    if request.transcript_id:
+        if await asyncio.to_thread(transcript_store.info, request.transcript_id) is None:
+            raise HTTPException(status_code=404, detail="transcript not found")
+        args = {"transcript_id": request.transcript_id}
+    elif request.text.strip():
+        args = {"text": request.text}
+    else:
+        raise HTTPException(status_code=422, detail="text or transcript_id is required")
+    try:
+        job = await client.call_tool_json("submit_summary_job", args)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if job.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail=job.get("message"))
+    if job.get("status") == "rejected":
+        raise HTTPException(status_code=503, detail=job.get("message"))
+    return job
+
+
+@app.get("/summaries")
+async def list_summaries(limit: int = 20):
+    client: MCPClient = app.state.client
+    jobs = await client.call_tool_json("list_summary_jobs", {"limit": limit})
+    # 只有一筆時工具結果會被解析成單一物件
+    return {"jobs": jobs if isinstance(jobs, list) else [jobs]}
+
+
+@app.get("/summary-cache/stats")
+async def summary_cache_stats():
+    """Hit / miss counters of the meeting summary and Markdown conversion caches."""
+    client: MCPClient = app.state.client
+    return await client.call_tool_json("get_summary_cache_stats", {})
+
+
+@app.get("/cache/stats")
+async def tool_cache_stats():
+    """Hit / miss counters, size and per-tool TTLs of the client-side tool result cache."""
+    client: MCPClient = app.state.client
+    return client.tool_cache.snapshot()
+
+
+@app.get("/answer-cache/stats")
+async def answer_cache_stats():
+    """Hit rate, size and hit / miss latency percentiles of the semantic answer cache (ANSWER_CACHE=true)."""
+    client: MCPClient = app.state.client
+    if client.answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **client.answer_cache.snapshot()}
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Concurrency, queue depth and rejections per resource class, plus rate limiter counters."""
+    client: MCPClient = app.state.client
+    return {
+        "queries": query_limiter.snapshot(),
+        **client.admission_snapshot(),
+        "rate_limit": rate_limiter.snapshot(),
+    }
+
+
+def update_gauges(client: MCPClient):
+    """/metrics 被抓取時才從各元件的 snapshot 更新 gauge 與累計 counter，平常的請求路徑不多做事。"""
+    limiters = {"queries": query_limiter.snapshot(), **client.admission_snapshot()}
+    for resource, snapshot in limiters.items():
+        RESOURCE_ACTIVE.set(snapshot["active"], resource=resource)
+        RESOURCE_WAITING.set(snapshot["waiting"], resource=resource)
+        RESOURCE_REJECTED.set_total(snapshot["rejected"] + snapshot["timed_out"], resource=resource)
+    servers = client.tool_servers_snapshot()
+    for pool in ("default", "heavy"):
+        for backend in (servers[pool] or {}).get("backends", []):
+            TOOL_SERVER_HEALTHY.set(int(backend["healthy"]), pool=pool, url=backend["url"])
+            TOOL_SERVER_OUTSTANDING.set(backend["outstanding"], pool=pool, url=backend["url"])
+    cache = client.tool_cache.snapshot()
+    for event in ("hits", "misses"):
+        TOOL_CACHE_EVENTS.set_total(cache.get(event, 0), event=event)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: request / stage latency histograms, LLM tokens and cost by model, limiter and pool state."""
+    client: Optional[MCPClient] = getattr(app.state, "client", None)
+    if client is not None:
+        update_gauges(client)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/traces")
+async def traces(trace_id: Optional[str] = None, limit: int = 200):
+    """Recent spans kept in memory (TRACE_EXPORTER=memory); trace_id is the X-Request-ID of a request."""
+    if tracer.memory is None:
+        raise HTTPException(status_code=404, detail="in-memory trace exporter is disabled")
+    return {"spans": [s.to_dict() for s in tracer.memory.spans(trace_id, limit)]}
+
+
+@app.get("/tool-servers")
+async def tool_servers():
+    """Health, outstanding requests and ejections of each MCP tool server this worker talks to."""
+    client: MCPClient = app.state.client
+    return client.tool_servers_snapshot()
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """Hit rate of the deterministic fast path and the latency it saved versus the LLM agent."""
+    client: MCPClient = app.state.client
+    if client.fast_router is None:
+        return {"enabled": False}
+    return {"enabled": True, **client.fast_router.snapshot()}
+
+
+@app.get("/summaries/{job_id}")
+async def get_summary(job_id: str):
+    """Return the status and progress stage of a summarization job."""
+    client: MCPClient = app.state.client
+    job = await client.call_tool_json("get_summary_job", {"job_id": job_id})
+    if job.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+@app.get("/summaries/{job_id}/result")
+async def get_summary_result(job_id: str):
+    """Return the Markdown result of a finished summarization job."""
+    client: MCPClient = app.state.client
+    job = await client.call_tool_json("get_summary_job_result", {"job_id": job_id})
+    if job.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.get("status") in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"job is {job['status']} ({job.get('stage')})")
+    return job
+
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run('main:app', host="0.0.0.0", port=8001, reload=True)
+
+    parser = argparse.ArgumentParser(description="MCP Client API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8001)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", 1)),
+                        help="uvicorn worker 行程數；大於 1 時為正式環境模式，不啟用 reload")
+    args = parser.parse_args()
+    uvicorn.run('main:app', host=args.host, port=args.port, workers=args.workers, reload=args.workers == 1)
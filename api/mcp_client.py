@@ -1,17 +1,24 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from typing import Optional
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langgraph.prebuilt import create_react_agent
-from contextlib import AsyncExitStack
+from mcp import types
 import os
 from utils.logger import logger
-from datetime import datetime
+from utils.telemetry import span, record_llm_usage
+from conversation import Conversation
+from session_pool import MCPSessionPool
+from load_balancer import LoadBalancedPool
+from conversation_log import ConversationLogWriter
+from context_window import ContextWindow
+from tool_schemas import ToolSchemaCache, build_tool_specs, tool_annotations, schema_hash
+from tool_cache import ToolResultCache, cache_policy, is_idempotent
+from fast_router import FastRouter
+from admission import ResourceLimiter, Overloaded, DeadlineExceeded, cap_timeout, time_left, new_deadline
+from utils.tokens import estimate_tokens
 import json
 import traceback
-import copy
+import asyncio
+from collections import OrderedDict
+import time
+import uuid
 
 
 def get_env_int(key: str, default: int) -> int:
@@ -29,88 +36,140 @@ def get_env_float(key: str, default: float) -> float:
         return default
 
 
+def get_env_list(key: str, default: list) -> list:
+    val = os.getenv(key)
+    if val is None:
+        return default
+    return [item.strip() for item in val.split(",") if item.strip()]
+
+
+# 佔用瀏覽器、執行時間長的工具；設定 MCP_HEAVY_TOOL_URLS 時送到專用的工具伺服器
+DEFAULT_HEAVY_TOOLS = [
+    "summarize_meeting", "submit_summary_job", "get_summary_job", "get_summary_job_result",
+    "list_summary_jobs", "get_summary_cache_stats", "get_browser_pool_stats",
+]
+# 摘要工作的狀態存在建立它的伺服器上：建立工作時記下處理的伺服器，帶 job_id 的查詢送回同一台
+DEFAULT_STICKY_TOOLS = ["submit_summary_job", "get_summary_job", "get_summary_job_result"]
+# 列出工作要問過每一台伺服器再合併
+DEFAULT_FANOUT_TOOLS = ["list_summary_jobs"]
+# 每個 worker 最多記住幾個 job_id 對應的伺服器
+JOB_OWNER_MAX_ENTRIES = 10000
+
+
+def parse_tool_json(result):
+    """取出工具結果第一段文字的 JSON，不是 JSON 時回傳 None。"""
+    content = getattr(result, "content", None) or []
+    if not content or getattr(content[0], "type", None) != "text":
+        return None
+    try:
+        return json.loads(content[0].text)
+    except ValueError:
+        return None
+
+
+def create_chat_model(**kwargs):
+    """第一次需要 LLM 時才載入 langchain_openai（連帶 openai SDK），只跑快速路徑的 worker 不必付出 import 成本。"""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(**kwargs)
+
+
 class MCPClient:
-    def __init__(self, mode=os.getenv("MCP_MODE", "stdio"), server_path_or_url=None):
+    def __init__(self, mode=os.getenv("MCP_MODE", "stdio"), server_path_or_url=None, heavy_server_urls=None):
         self.mode = mode  # "stdio" or "sse" or "streamable_http"
-        self.server_path_or_url = server_path_or_url
-        self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
-        self.client = None
-        self.llm = ChatOpenAI(
+        # 可以是單一路徑 / URL，或多台工具伺服器的 URL 清單（呼叫會分散到各台）
+        self.server_urls = list(server_path_or_url) if isinstance(server_path_or_url, (list, tuple)) else [server_path_or_url]
+        self.server_path_or_url = ",".join(self.server_urls)
+        # 重量級工具（摘要）專用的工具伺服器；未設定時與一般工具共用
+        self.heavy_server_urls = list(heavy_server_urls or [])
+        # 工具清單合併自兩組伺服器，schema 快取也以兩組 URL 區分
+        self._tool_schema_key = ",".join(self.server_urls + self.heavy_server_urls)
+        self.heavy_tools = set(get_env_list("HEAVY_TOOLS", DEFAULT_HEAVY_TOOLS))
+        # 狀態只存在單一伺服器上的工具，依 job_id 送回建立它的那台
+        self.sticky_tools = set(get_env_list("STICKY_TOOLS", DEFAULT_STICKY_TOOLS))
+        self.fanout_tools = set(get_env_list("FANOUT_TOOLS", DEFAULT_FANOUT_TOOLS))
+        self._job_owners: "OrderedDict[str, str]" = OrderedDict()
+        self.pool: Optional[LoadBalancedPool] = None
+        self.heavy_pool: Optional[LoadBalancedPool] = None
+        self._llm = None
+        # self.tools 只會整個換掉、不會原地修改，進行中的查詢持有的是開始時的版本
+        self.tools = []
+        self.tools_hash = None
+        self.tool_annotations = {}
+        # 工具 schema 每次呼叫都會送出，載入工具後計算一次
+        self.tools_tokens = 0
+        self.tool_schema_cache = ToolSchemaCache(os.getenv("TOOL_SCHEMA_CACHE", os.path.join("cache", "tool_schemas.json")))
+        self.tool_refresh_interval = get_env_float("TOOL_REFRESH_INTERVAL", 300.0)
+        self._tools_changed = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.context_window = ContextWindow(
+            max_tokens=get_env_int("CONTEXT_MAX_TOKENS", 16000),
+            tool_result_max_tokens=get_env_int("TOOL_RESULT_MAX_TOKENS", 2000),
             model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=get_env_float("TEMPERATURE", 0.3),
-            max_tokens=get_env_int("MAX_TOKENS", 1000),
-            request_timeout=get_env_int("REQUEST_TIMEOUT", 60),
-            streaming=False,
         )
-        self.tools = []
-        self.messages = []
         self.logger = logger
+        self.conversation_log = ConversationLogWriter(
+            directory=os.getenv("CONVERSATION_LOG_DIR", "conversations"),
+            max_bytes=get_env_int("CONVERSATION_LOG_MAX_BYTES", 20 * 1024 * 1024),
+        )
+        # 伺服器標示為唯讀且冪等的工具，結果依工具名稱 + 參數快取
+        self.tool_cache = ToolResultCache(max_entries=get_env_int("TOOL_CACHE_MAX_ENTRIES", 1024))
+        self.tool_cache_enabled = os.getenv("TOOL_CACHE", "true").lower() in ("1", "true", "yes")
+        self.tool_cache_ttl = get_env_float("TOOL_CACHE_TTL", 300.0)
+        self.tool_cache_ttls = json.loads(os.getenv("TOOL_CACHE_TTLS", "{}"))
+        # 各類資源的併發上限與等待佇列（所有請求共用）：LLM、輕量工具、瀏覽器摘要等重量級工具
+        self.llm_limiter = ResourceLimiter.from_env("llm", "LLM", limit=8, max_waiting=32, max_wait=30.0)
+        self.tool_limiter = ResourceLimiter.from_env("tools", "LIGHT_TOOL", limit=16, max_waiting=64, max_wait=10.0)
+        self.heavy_tool_limiter = ResourceLimiter.from_env("browser_summary", "SUMMARY", limit=2, max_waiting=8, max_wait=300.0)
+        # 格式明確的簡單請求（加法、乘法、天氣）直接呼叫工具，不經過 LLM
+        self.fast_router = FastRouter() if os.getenv("FAST_ROUTER", "true").lower() in ("1", "true", "yes") else None
+        # 同一輪 LLM 回應中的多個 tool call 會併發執行
+        self.tool_concurrency = get_env_int("TOOL_CONCURRENCY", 4)
+        self.tool_timeout = get_env_float("TOOL_TIMEOUT", 60.0)
+        self.tool_timeouts = {"summarize_meeting": 300.0}
+        self.tool_timeouts.update(json.loads(os.getenv("TOOL_TIMEOUTS", "{}")))
+        # process_batch 同時執行的項目數
+        self.batch_concurrency = get_env_int("BATCH_CONCURRENCY", 8)
+        # 與先前問題相近的新對話直接回傳先前的回答（選用）；NumPy 只在啟用時載入
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE", "false").lower() in ("1", "true", "yes"):
+            from answer_cache import AnswerCache
+
+            self.answer_cache = AnswerCache.from_env()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = create_chat_model(
+                model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+                api_key=os.getenv("OPENAI_API_KEY"),
+                temperature=get_env_float("TEMPERATURE", 0.3),
+                max_tokens=get_env_int("MAX_TOKENS", 1000),
+                request_timeout=get_env_int("REQUEST_TIMEOUT", 60),
+                streaming=True,
+                # 串流結束時回傳實際的 token 用量
+                stream_usage=True,
+            )
+        return self._llm
 
     async def connect_to_server(self):
         try:
-            if self.mode == "stdio":
-                command = "python" if self.server_path_or_url.endswith(".py") else "node"
-                server_params = StdioServerParameters(
-                    command=command,
-                    args=[self.server_path_or_url],
-                    env=None
-                )
-                stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-                self.stdio, self.write = stdio_transport
-                self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
-                await self.session.initialize()
-            elif self.mode == "sse":
-                self.client = MultiServerMCPClient({
-                    "tool_server": {
-                        "url": self.server_path_or_url,
-                        "transport": "sse",
-                    }
-                })
-                self.session = self.client  # 統一命名給後續使用
-            elif self.mode == "streamable_http":
-                self.client = MultiServerMCPClient({
-                    "tool_server": {
-                        "url": self.server_path_or_url,
-                        "transport": "streamable_http",
-                    }
-                })
-                self.session = self.client  # 統一命名給後續使用
-            else:
-                raise ValueError("Unsupported mode. Use 'stdio' or 'http'.")
-
-            self.logger.info("Connected to MCP server")
+            self.pool = self._create_pool(self.server_urls)
+            if self.heavy_server_urls:
+                self.heavy_pool = self._create_pool(self.heavy_server_urls)
+                await self.heavy_pool.start(warm=0)
+            cached = self.tool_schema_cache.load(self._tool_schema_key)
+            # 有快取的 schema 時不預先建立連線，直接開始服務，由背景刷新確認 schema 是否有變
+            await self.pool.start(warm=0 if cached else 1)
 
-            mcp_tools = await self.get_mcp_tools()
-            def clean_schema(schema):
-                if schema is None:
-                    return {}
-                if not isinstance(schema, dict):
-                    # 如果不是 dict（可能是 function），就不處理，直接返回空 dict 或原值（視情況）
-                    return {}
-                cleaned = copy.deepcopy(schema)
-                keys_to_remove = []
-                for k, v in cleaned.items():
-                    if callable(v):
-                        keys_to_remove.append(k)
-                for k in keys_to_remove:
-                    cleaned.pop(k)
-                return cleaned
-
-            # 修改 tools 初始化：
-            self.tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "parameters": clean_schema(getattr(tool, "json_schema", None) or getattr(tool, "schema", None))
-                    }
-                }
-                for tool in mcp_tools
-            ]
-            self.logger.info(f"Loaded tools: {[t['function']['name'] for t in self.tools]}")
+            if cached:
+                self._set_tools(cached["tools"], cached["annotations"], cached["hash"])
+                self.logger.info(f"Loaded tools from schema cache: {[t['function']['name'] for t in self.tools]}")
+            else:
+                self.logger.info("Connected to MCP server")
+                await self.refresh_tools()
+            self._refresh_task = asyncio.create_task(self._refresh_loop(refresh_now=bool(cached)))
             return True
 
         except Exception as e:
@@ -118,20 +177,231 @@ class MCPClient:
             traceback.print_exc()
             raise
 
+    def _create_pool(self, urls: list) -> LoadBalancedPool:
+        """每台工具伺服器一個 session 連線池，外層依進行中的請求數分配呼叫，並暫時移出連不上的伺服器。"""
+        def session_pool(url):
+            return MCPSessionPool(
+                self._transport_factory(url),
+                # stdio 模式每個 session 都是一個獨立的子行程，預設只開一個
+                max_size=get_env_int("MCP_POOL_SIZE", 1 if self.mode == "stdio" else 4),
+                max_idle=get_env_float("MCP_POOL_MAX_IDLE", 300.0),
+                health_check_interval=get_env_float("MCP_POOL_HEALTH_CHECK_INTERVAL", 30.0),
+                connect_timeout=get_env_float("MCP_POOL_CONNECT_TIMEOUT", 30.0),
+                message_handler=self._handle_server_message,
+            )
+        return LoadBalancedPool(
+            urls,
+            session_pool,
+            eject_after=get_env_int("MCP_EJECT_AFTER_FAILURES", 3),
+            eject_seconds=get_env_float("MCP_EJECT_SECONDS", 30.0),
+        )
+
+    def _transport_factory(self, url: str):
+        """回傳一個可重複呼叫、每次建立新 transport 的函式，交給連線池使用（只載入使用中的 transport）。"""
+        if self.mode == "stdio":
+            from mcp import StdioServerParameters
+            from mcp.client.stdio import stdio_client
+
+            command = "python" if url.endswith(".py") else "node"
+            server_params = StdioServerParameters(
+                command=command,
+                args=[url],
+                env=None
+            )
+            return lambda: stdio_client(server_params)
+        elif self.mode == "sse":
+            from mcp.client.sse import sse_client
+
+            return lambda: sse_client(url)
+        elif self.mode == "streamable_http":
+            from mcp.client.streamable_http import streamablehttp_client
+
+            return lambda: streamablehttp_client(url)
+        else:
+            raise ValueError("Unsupported mode. Use 'stdio', 'sse' or 'streamable_http'.")
+
+    def _set_tools(self, tools: list, annotations: dict, digest: str):
+        tools_tokens = estimate_tokens(json.dumps(tools, ensure_ascii=False), self.context_window.model)
+        # 幾個屬性在同一步更新、中間沒有 await，對其他 task 而言是一次完成的替換
+        self.tools, self.tool_annotations, self.tools_hash, self.tools_tokens = tools, annotations, digest, tools_tokens
+        self.tool_cache.set_policies(self._tool_cache_policies(annotations) if self.tool_cache_enabled else {})
+
+    def _tool_cache_policies(self, annotations: dict) -> dict:
+        """工具名稱 -> TTL；TOOL_CACHE_TTLS 只能調整伺服器已標示可快取的工具的 TTL（0 表示不快取）。"""
+        policies = {}
+        for name, annotation in annotations.items():
+            ttl = cache_policy(annotation, self.tool_cache_ttl)
+            if ttl is None:
+                continue
+            ttl = float(self.tool_cache_ttls.get(name, ttl))
+            if ttl > 0:
+                policies[name] = ttl
+        return policies
+
+    async def refresh_tools(self) -> bool:
+        """重新取得工具清單；schema 有變時替換 self.tools 並寫回磁碟快取，回傳是否有變。"""
+        async with self._refresh_lock:
+            mcp_tools = await self.get_mcp_tools()
+            tools, annotations = build_tool_specs(mcp_tools), tool_annotations(mcp_tools)
+            digest = schema_hash(tools, annotations)
+            if digest == self.tools_hash:
+                return False
+            self._set_tools(tools, annotations, digest)
+            self.logger.info(f"Loaded tools: {[t['function']['name'] for t in self.tools]} ({self.tools_tokens} tokens)")
+            try:
+                await asyncio.to_thread(self.tool_schema_cache.save, self._tool_schema_key, tools, annotations, digest)
+            except Exception as e:
+                self.logger.warning(f"Saving tool schema cache failed: {e}")
+            return True
+
+    async def _refresh_loop(self, refresh_now: bool = False):
+        """收到 tools/list_changed 通知或每隔 TOOL_REFRESH_INTERVAL 秒（<= 0 表示只看通知）刷新一次。"""
+        if refresh_now:
+            self._tools_changed.set()
+        interval = self.tool_refresh_interval if self.tool_refresh_interval > 0 else None
+        while True:
+            try:
+                await asyncio.wait_for(self._tools_changed.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._tools_changed.clear()
+            try:
+                await self.refresh_tools()
+            except Exception as e:
+                self.logger.warning(f"Refreshing MCP tools failed: {e}")
+
+    async def _handle_server_message(self, message):
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            self.logger.info("MCP server reported a tool list change")
+            self._tools_changed.set()
+
     async def get_mcp_tools(self):
+        """
+        合併一般與重量級工具伺服器的工具清單（依名稱去重，以實際會被送去的那組為準）。
+        重量級伺服器暫時連不上時只用一般伺服器的清單，下次刷新再補上。
+        """
         try:
-            if self.mode == "stdio":
-                response = await self.session.list_tools()
-                return response.tools
-            elif self.mode == "sse" or self.mode == "streamable_http":
-                tools = await self.session.get_tools()
-                return tools
-            else:
-                raise ValueError(f"Unknown mode {self.mode} for getting tools")
+            tools = {tool.name: tool for tool in await self.pool.list_tools()}
         except Exception as e:
             self.logger.error(f"Error fetching MCP tools: {e}")
             traceback.print_exc()
             raise
+        if self.heavy_pool is not None:
+            try:
+                for tool in await self.heavy_pool.list_tools():
+                    if tool.name in self.heavy_tools or tool.name not in tools:
+                        tools[tool.name] = tool
+            except Exception as e:
+                self.logger.warning(f"Error fetching MCP tools from heavy tool servers: {e}")
+        return list(tools.values())
+
+    def _pool_for(self, tool_name: str) -> LoadBalancedPool:
+        if self.heavy_pool is not None and tool_name in self.heavy_tools:
+            return self.heavy_pool
+        return self.pool
+
+    def _retry_safe(self, tool_name: str) -> bool:
+        # 只有宣告 readOnly + idempotent 的工具在請求送出後連線中斷時重送；摘要等有副作用的工具重送會重複執行
+        return is_idempotent(self.tool_annotations.get(tool_name))
+
+    def _remember_job_owner(self, job_id: str, url: str):
+        self._job_owners[job_id] = url
+        self._job_owners.move_to_end(job_id)
+        while len(self._job_owners) > JOB_OWNER_MAX_ENTRIES:
+            self._job_owners.popitem(last=False)
+
+    async def _call_job_owner(self, pool: LoadBalancedPool, tool_name: str, tool_args: dict):
+        """送到建立該工作的伺服器；不知道是哪台時（其他 worker 建立的或重新啟動過）依序詢問直到找到。"""
+        job_id = tool_args["job_id"]
+        owner = self._job_owners.get(job_id)
+        if owner is not None:
+            return await pool.call_tool(tool_name, tool_args, url=owner, retry=self._retry_safe(tool_name))
+        result, error = None, None
+        for url in pool.urls:
+            try:
+                result = await pool.call_tool(tool_name, tool_args, url=url, retry=self._retry_safe(tool_name))
+            except Exception as e:
+                error = e
+                continue
+            data = parse_tool_json(result)
+            if not (isinstance(data, dict) and data.get("status") == "not_found"):
+                self._remember_job_owner(job_id, url)
+                return result
+        if result is None:
+            raise error
+        return result
+
+    async def _call_each(self, pool: LoadBalancedPool, tool_name: str, tool_args: dict):
+        """送到每一台伺服器並合併結果清單，依建立時間由新到舊取前 limit 筆。"""
+        items, errors = [], []
+        for url, result in await pool.call_tool_each(tool_name, tool_args, retry=self._retry_safe(tool_name)):
+            if isinstance(result, BaseException):
+                errors.append(result)
+                continue
+            if result.isError:
+                return result
+            for content in result.content:
+                try:
+                    item = json.loads(content.text)
+                except (AttributeError, ValueError):
+                    continue
+                if isinstance(item, dict) and item.get("job_id"):
+                    self._remember_job_owner(item["job_id"], url)
+                items.append(item)
+        if errors and len(errors) == len(pool.urls):
+            raise errors[0]
+        items.sort(key=lambda item: item.get("created_at", 0) if isinstance(item, dict) else 0, reverse=True)
+        limit = tool_args.get("limit")
+        if isinstance(limit, int):
+            items = items[:limit]
+        return types.CallToolResult(
+            content=[types.TextContent(type="text", text=json.dumps(item, ensure_ascii=False)) for item in items]
+        )
+
+    async def _call_pool(self, tool_name: str, tool_args: dict):
+        pool = self._pool_for(tool_name)
+        if len(pool.urls) == 1:
+            return await pool.call_tool(tool_name, tool_args, retry=self._retry_safe(tool_name))
+        if tool_name in self.fanout_tools:
+            return await self._call_each(pool, tool_name, tool_args)
+        if tool_name in self.sticky_tools and tool_args.get("job_id"):
+            return await self._call_job_owner(pool, tool_name, tool_args)
+        result, url = await pool.call_tool_on(tool_name, tool_args, retry=self._retry_safe(tool_name))
+        if tool_name in self.sticky_tools:
+            data = parse_tool_json(result)
+            if isinstance(data, dict) and data.get("job_id"):
+                self._remember_job_owner(data["job_id"], url)
+        return result
+
+    async def call_tool(self, tool_name: str, tool_args: dict):
+        """透過連線池呼叫 MCP 工具，重複使用已初始化的 session；可快取的工具先查結果快取。"""
+        with span("mcp.call_tool", tool=tool_name) as tool_span:
+            if not self.tool_cache.cacheable(tool_name):
+                result = await self._call_pool(tool_name, tool_args)
+            else:
+                hit, result = self.tool_cache.get(tool_name, tool_args)
+                tool_span.set(cache_hit=hit)
+                if hit:
+                    return result
+                result = await self._call_pool(tool_name, tool_args)
+                if not getattr(result, "isError", False):
+                    self.tool_cache.set(tool_name, tool_args, result)
+            tool_span.set(is_error=bool(getattr(result, "isError", False)))
+            return result
+
+    async def call_tool_json(self, tool_name: str, tool_args: dict):
+        """呼叫工具並把文字內容解析為 JSON（給 FastAPI 端點直接使用，不經過 LLM）。"""
+        result = await self.call_tool(tool_name, tool_args)
+        texts = [c.text for c in result.content if getattr(c, "text", None) is not None]
+        if getattr(result, "isError", False):
+            raise RuntimeError(texts[0] if texts else f"Tool {tool_name} failed")
+        parsed = []
+        for text in texts:
+            try:
+                parsed.append(json.loads(text))
+            except ValueError:
+                parsed.append(text)
+        return parsed[0] if len(parsed) == 1 else parsed
 
     def serialize_tool_result(self, obj):
         if isinstance(obj, (str, int, float, bool, type(None))):
@@ -148,83 +418,382 @@ class MCPClient:
             return self.serialize_tool_result(vars(obj))
         return str(obj)
 
-    async def process_query(self, query: str):
+    async def process_query(self, query: str, conversation: Optional[Conversation] = None, deadline: Optional[float] = None):
+        """執行 agent 迴圈；對話狀態只存在 conversation 中，MCPClient 可安全地被多個請求共用。"""
+        if conversation is None:
+            conversation = Conversation()
+        async for _ in self.process_query_stream(query, conversation, deadline):
+            pass
+        return conversation.messages
+
+    async def process_batch(self, items: list, concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        批次執行多個查詢，依完成順序逐筆產生結果：
+
+        - {"index", "status": "ok", "answer", "conversation_id", "elapsed_s", "deduplicated"}
+        - {"index", "status": "error", "error", "error_type", "elapsed_s", "deduplicated"}（Overloaded 另附 retry_after）
+
+        items 為查詢字串或 {"query", "conversation_id"}；query 與 conversation_id 都相同的項目只執行一次，
+        結果分給每一筆（除了第一筆以外 deduplicated=True）。最多同時執行 concurrency（預設 BATCH_CONCURRENCY）個，
+        所有項目共用同一組 LLM / 工具連線池與併發上限；timeout 是每一筆開始執行後的截止秒數。
+        單筆失敗或逾時只影響該筆，不會中斷整個批次。
+        """
+        groups = {}
+        for index, item in enumerate(items):
+            query, conversation_id = (item, None) if isinstance(item, str) else (item["query"], item.get("conversation_id"))
+            groups.setdefault((query.strip(), conversation_id), []).append(index)
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+
+        async def run(key) -> dict:
+            query, conversation_id = key
+            async with semaphore:
+                started = time.perf_counter()
+                conversation = Conversation(conversation_id)
+                try:
+                    await self.process_query(query, conversation, new_deadline(timeout))
+                except Exception as e:
+                    result = {"status": "error", "error": str(e) or type(e).__name__, "error_type": type(e).__name__}
+                    if isinstance(e, Overloaded):
+                        result["retry_after"] = e.retry_after
+                else:
+                    result = {
+                        "status": "ok",
+                        "answer": conversation.last_assistant_content() or "",
+                        "conversation_id": conversation.id,
+                        "cached": "cached_similarity" in conversation.messages[-1],
+                    }
+                result["elapsed_s"] = round(time.perf_counter() - started, 3)
+                return result
+
+        tasks = {asyncio.create_task(run(key)): indices for key, indices in groups.items()}
+        self.logger.info(f"Batch of {len(items)} queries ({len(tasks)} unique)")
+        pending = set(tasks)
         try:
-            self.logger.info(f"Processing query: {query}")
-            self.messages = [{"role": "user", "content": query}]
-            MAX_ITERATIONS = get_env_int("MAX_ITERATIONS", 5)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    for n, index in enumerate(tasks[task]):
+                        yield {"index": index, **result, "deduplicated": n > 0}
+        finally:
+            # 呼叫端中途離開時取消尚未完成的項目
+            for task in pending:
+                task.cancel()
+
+    async def process_query_stream(self, query: str, conversation: Optional[Conversation] = None, deadline: Optional[float] = None):
+        """
+        process_query 的 async generator 版本，邊執行邊產生事件：
+
+        - {"type": "token", "content": ...}                 LLM 產生的文字片段
+        - {"type": "tool_start", "id", "name", "args"}       開始呼叫工具
+        - {"type": "tool_end", "id", "name", "result"}       工具完成（依完成順序）
+        - {"type": "final", "answer", "conversation_id", "cached"}  最終回答；cached 表示取自回答快取
+
+        deadline 是 event loop 時間上的截止時間（admission.new_deadline），會限制每次 LLM 與工具呼叫，
+        到期時拋出 DeadlineExceeded；LLM 的等待佇列已滿時拋出 Overloaded。
+        """
+        if conversation is None:
+            conversation = Conversation()
+        try:
+            self.logger.info(f"[{conversation.id}] Processing query ({len(query)} chars)")
+            self.logger.debug(f"[{conversation.id}] Query: {query}")
+            conversation.add_message("user", query)
+            started = time.perf_counter()
+            fast_events = await self._try_fast_path(query, conversation, deadline) if self.fast_router is not None else None
+            cached, vector = None, None
+            # 只有新對話的第一個問題才查快取，接續的問題依賴前面的對話內容
+            if fast_events is None and self.answer_cache is not None and len(conversation.messages) == 1:
+                cached, vector = await self._lookup_answer(query)
+            if fast_events is not None:
+                for event in fast_events:
+                    yield event
+                await self.log_conversation(conversation)
+            elif cached is not None:
+                conversation.add_message("assistant", cached["answer"], cached_similarity=cached["similarity"])
+                elapsed = time.perf_counter() - started
+                self.answer_cache.record_latency(elapsed, hit=True)
+                self.logger.info(f"[{conversation.id}] Answer cache hit (similarity {cached['similarity']}) in {elapsed * 1000:.1f}ms")
+                yield {"type": "token", "content": cached["answer"]}
+                await self.log_conversation(conversation)
+            else:
+                async for event in self._run_agent(conversation, deadline):
+                    yield event
+                elapsed = time.perf_counter() - started
+                if self.fast_router is not None:
+                    self.fast_router.record_agent(elapsed)
+                if vector is not None:
+                    self.answer_cache.record_latency(elapsed, hit=False)
+                    await self._remember_answer(query, conversation, vector)
+
+            yield {
+                "type": "final",
+                "answer": conversation.last_assistant_content() or "",
+                "conversation_id": conversation.id,
+                "cached": cached is not None,
+            }
+
+        except Exception as e:
+            self.logger.error(f"[{conversation.id}] Error processing query: {e}")
+            raise
+
+    def _answer_cache_context(self) -> str:
+        # 換模型或工具 schema 改變後，先前的回答不再沿用
+        return f"{os.getenv('OPENAI_MODEL', 'gpt-4o')}|{self.tools_hash}"
+
+    async def _lookup_answer(self, query: str):
+        """回傳 (命中的項目或 None, 查詢向量)；問題太長不適合快取時向量為 None。"""
+        if not self.answer_cache.cacheable(query):
+            return None, None
+        with span("agent.answer_cache") as cache_span:
+            vector = await asyncio.to_thread(self.answer_cache.encode, query)
+            cached = self.answer_cache.lookup(query, self._answer_cache_context(), vector)
+            cache_span.set(hit=cached is not None)
+        return cached, vector
+
+    async def _remember_answer(self, query: str, conversation: Conversation, vector):
+        answer = conversation.last_assistant_content()
+        # 達到迭代上限等錯誤回覆不快取
+        if not answer or answer.startswith("Error:"):
+            return
+        if self.answer_cache.store(query, answer, self._answer_cache_context(), vector):
+            try:
+                await asyncio.to_thread(self.answer_cache.save)
+            except Exception as e:
+                self.logger.error(f"Saving answer cache failed: {e}")
+
+    async def _run_agent(self, conversation: Conversation, deadline: Optional[float] = None):
+        """LLM agent 迴圈：反覆呼叫 LLM 與它要求的工具，直到產生最終回答或達到 MAX_ITERATIONS。"""
+        MAX_ITERATIONS = get_env_int("MAX_ITERATIONS", 5)
+        # 整個查詢使用同一版工具 schema，背景刷新不影響進行中的查詢
+        tools, tools_tokens = self.tools, self.tools_tokens
 
-            for _ in range(MAX_ITERATIONS):
-                response = await self.call_llm()
-                self.logger.info(f"LLM response: {response}")
+        for iteration in range(1, MAX_ITERATIONS + 1):
+            time_left(deadline)
+            with span("agent.iteration", conversation=conversation.id, iteration=iteration) as iteration_span:
+                prompt, context = self.context_window.build(conversation, reserved_tokens=tools_tokens)
+                self.logger.info(
+                    f"[{conversation.id}] Iteration {iteration}: prompt ~{context['prompt_tokens']}/{context['budget']} tokens, "
+                    f"{context['messages']} messages, compacted={context['compacted_turns']} dropped={context['dropped_turns']} "
+                    f"omitted={context['omitted_tool_results']} truncated={context['truncated_tool_results']} "
+                    f"truncated_messages={context['truncated_messages']}"
+                )
+                response = None
+                async with self.llm_limiter.slot(deadline):
+                    async for event in self.stream_llm(prompt, tools, deadline):
+                        if event["type"] == "token":
+                            yield event
+                        else:
+                            response = event["response"]
+                usage = response.get("usage")
+                if usage:
+                    self.logger.info(
+                        f"[{conversation.id}] Iteration {iteration} usage: input={usage.get('input_tokens')} "
+                        f"output={usage.get('output_tokens')} total={usage.get('total_tokens')}"
+                    )
+                self.logger.info(
+                    f"[{conversation.id}] LLM response: {len(response.get('content') or '')} chars, "
+                    f"tools={[call['name'] for call in response.get('tool_calls') or []]}"
+                )
+                self.logger.debug(f"[{conversation.id}] LLM response: {response}")
 
                 content = response.get("content", "")
-                if content.strip():
-                    self.messages.append({"role": "assistant", "content": content})
-                    await self.log_conversation()
-                    break
-                
                 tool_calls = response.get("tool_calls", [])
+                iteration_span.set(tool_calls=len(tool_calls))
                 if tool_calls:
+                    conversation.add_message("assistant", content, tool_calls=tool_calls)
+                    results = {}
+                    async for event in self.stream_tool_calls(tool_calls, conversation.id, deadline):
+                        results[event["id"]] = event["result"]
+                        yield event
+                    # 結果依原本 tool_calls 的順序寫回對話
                     for call in tool_calls:
-                        func = call.get("function", {})
-                        tool_name = func.get("name")
-                        args_json = func.get("arguments", "{}")
-                        tool_args = json.loads(args_json)
-                        if self.mode == "stdio" or self.mode == "streamable_http" or self.mode == "sse":
-                            async with self.client.session("tool_server") as session:
-                                result = await session.call_tool(tool_name, tool_args)
-                        else:
-                            raise ValueError(f"Unknown mode {self.mode}")
-                        tool_result = result.result if hasattr(result, "result") else result
-                        tool_result_str = json.dumps(self.serialize_tool_result(tool_result), ensure_ascii=False)
-                        self.messages.append({"role": "user", "content": f"Tool {tool_name} result:\n{tool_result_str}"})
-                    await self.log_conversation()
+                        conversation.add_message("tool", results[call["id"]], tool_call_id=call["id"], name=call["name"])
+                    await self.log_conversation(conversation)
                     continue
+                if content.strip():
+                    conversation.add_message("assistant", content)
+                    await self.log_conversation(conversation)
                 break
-            else:
-                self.messages.append({"role": "assistant", "content": "Error: exceeded maximum reasoning steps."})
-
-            return self.messages
+        else:
+            conversation.add_message("assistant", "Error: exceeded maximum reasoning steps.")
+            await self.log_conversation(conversation)
 
+    async def _try_fast_path(self, query: str, conversation: Conversation, deadline: Optional[float] = None):
+        """
+        query 符合 FastRouter 的規則時直接呼叫工具並以範本產生回答，回傳要送出的事件；
+        不符合或工具失敗時回傳 None，由 LLM agent 處理。
+        """
+        matched = self.fast_router.match(query, self.tools)
+        if matched is None:
+            return None
+        route, args, lang = matched
+        started = time.perf_counter()
+        try:
+            with span("agent.fast_path", tool=route.tool):
+                timeout = cap_timeout(self.tool_timeouts.get(route.tool, self.tool_timeout), deadline)
+                async with self._limiter_for(route.tool).slot(deadline):
+                    result = await asyncio.wait_for(self.call_tool_json(route.tool, args), timeout)
+                answer = route.answer(args, result, lang)
         except Exception as e:
-            self.logger.error(f"Error processing query: {e}")
-            raise
+            self.fast_router.record_error()
+            self.logger.warning(f"[{conversation.id}] Fast path {route.tool} failed, falling back to LLM: {e}")
+            return None
 
-    async def call_llm(self):
-        formatted_messages = []
-        for msg in self.messages:
-            if msg["role"] == "user":
-                formatted_messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                formatted_messages.append(AIMessage(content=msg["content"]))
-            elif msg["role"] == "tool":
-                formatted_messages.append(ToolMessage(content=msg["content"], tool_call_id=msg["tool_call_id"]))
-
-        response = await self.llm.ainvoke(
-            formatted_messages,
-            tools=self.tools,
-            tool_choice="auto"
-        )
+        # 與 LLM 呼叫工具時的訊息結構相同，之後的對話仍可接續
+        call = {"name": route.tool, "args": args, "id": f"fast_{uuid.uuid4().hex[:16]}"}
+        result_text = json.dumps(result, ensure_ascii=False)
+        conversation.add_message("assistant", "", tool_calls=[call])
+        conversation.add_message("tool", result_text, tool_call_id=call["id"], name=route.tool)
+        conversation.add_message("assistant", answer)
+        elapsed = time.perf_counter() - started
+        self.fast_router.record_hit(elapsed)
+        self.logger.info(f"[{conversation.id}] Fast path {route.tool} answered in {elapsed * 1000:.1f}ms")
+        return [
+            {"type": "tool_start", "id": call["id"], "name": route.tool, "args": args},
+            {"type": "tool_end", "id": call["id"], "name": route.tool, "result": result_text},
+            {"type": "token", "content": answer},
+        ]
+
+    def _limiter_for(self, tool_name: str) -> ResourceLimiter:
+        return self.heavy_tool_limiter if tool_name in self.heavy_tools else self.tool_limiter
+
+    async def _run_tool_call(
+        self, call: dict, semaphore: asyncio.Semaphore, conversation_id: str, deadline: Optional[float] = None
+    ) -> str:
+        tool_name = call["name"]
+        tool_args = call.get("args") or {}
+        timeout = self.tool_timeouts.get(tool_name, self.tool_timeout)
+        async with semaphore:
+            try:
+                async with self._limiter_for(tool_name).slot(deadline):
+                    limit = cap_timeout(timeout, deadline)
+                    result = await asyncio.wait_for(self.call_tool(tool_name, tool_args), limit)
+            except Overloaded as e:
+                self.logger.warning(f"[{conversation_id}] Tool {tool_name} rejected: {e}")
+                return json.dumps(
+                    {"error": f"Tool {tool_name} is busy, retry after {e.retry_after:.0f}s"}, ensure_ascii=False
+                )
+            except DeadlineExceeded:
+                return json.dumps({"error": f"Tool {tool_name} skipped: request deadline exceeded"}, ensure_ascii=False)
+            except asyncio.TimeoutError:
+                if limit is not None and (timeout is None or limit < timeout):
+                    message = f"Tool {tool_name} stopped after {limit:.2f}s: request deadline exceeded"
+                else:
+                    message = f"Tool {tool_name} timed out after {timeout}s (tool timeout)"
+                self.logger.error(f"[{conversation_id}] {message}")
+                return json.dumps({"error": message}, ensure_ascii=False)
+            except Exception as e:
+                self.logger.error(f"[{conversation_id}] Tool {tool_name} failed: {e}")
+                return json.dumps({"error": f"Tool {tool_name} failed: {e}"}, ensure_ascii=False)
+        tool_result = result.result if hasattr(result, "result") else result
+        return json.dumps(self.serialize_tool_result(tool_result), ensure_ascii=False)
+
+    async def stream_tool_calls(self, tool_calls: list, conversation_id: str = "-", deadline: Optional[float] = None):
+        """
+        併發執行同一輪的 tool calls，每個工具開始與完成時都會產生事件（tool_end 依完成順序）。
+
+        最多同時執行 TOOL_CONCURRENCY 個，每個工具受各自的 timeout 限制；
+        單一工具失敗或逾時只會讓該筆結果變成錯誤訊息，不影響其他工具。
+        """
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+        tasks = {}
+        for call in tool_calls:
+            task = asyncio.create_task(self._run_tool_call(call, semaphore, conversation_id, deadline))
+            tasks[task] = call
+            yield {"type": "tool_start", "id": call["id"], "name": call["name"], "args": call.get("args") or {}}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    call = tasks[task]
+                    yield {"type": "tool_end", "id": call["id"], "name": call["name"], "result": task.result()}
+        finally:
+            # 呼叫端中途離開（例如前端斷線）時取消尚未完成的工具
+            for task in pending:
+                task.cancel()
+
+    async def stream_llm(self, messages, tools: Optional[list] = None, deadline: Optional[float] = None):
+        """
+        以串流方式呼叫 LLM：每個文字片段產生 {"type": "token"}，
+        結束時產生 {"type": "response", "response": {"content", "tool_calls", "usage"}}，
+        tool_calls 為 LangChain 已解析好的格式：[{"name", "args", "id"}]。
+        有 deadline 時，等待下一個片段超過剩餘時間就拋出 DeadlineExceeded。
+        """
+        full = None
+        with span("llm.call", model=self.llm.model_name, streaming=True) as llm_span:
+            started = time.perf_counter()
+            stream = self.llm.astream(
+                messages,
+                tools=self.tools if tools is None else tools,
+                tool_choice="auto"
+            )
+            try:
+                while True:
+                    try:
+                        if deadline is None:
+                            chunk = await stream.__anext__()
+                        else:
+                            chunk = await asyncio.wait_for(stream.__anext__(), time_left(deadline))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("request deadline exceeded while waiting for the LLM") from None
+                    if full is None:
+                        llm_span.set(time_to_first_chunk=round(time.perf_counter() - started, 4))
+                    full = chunk if full is None else full + chunk
+                    if isinstance(chunk.content, str) and chunk.content:
+                        yield {"type": "token", "content": chunk.content}
+            finally:
+                await stream.aclose()
+            self._record_usage(llm_span, getattr(full, "usage_metadata", None))
+        yield {
+            "type": "response",
+            "response": {
+                "content": full.content if full is not None else "",
+                "tool_calls": (getattr(full, "tool_calls", None) or []) if full is not None else [],
+                "usage": getattr(full, "usage_metadata", None),
+            },
+        }
+
+    def _record_usage(self, llm_span, usage: Optional[dict]):
+        """把 usage_metadata 記到 span 上，並累加到依模型區分的 token / 成本計數。"""
+        if not usage:
+            return
+        llm_span.set(prompt_tokens=usage.get("input_tokens"), completion_tokens=usage.get("output_tokens"))
+        record_llm_usage(self.llm.model_name, usage.get("input_tokens"), usage.get("output_tokens"), caller="agent")
+
+    def admission_snapshot(self) -> dict:
+        return {limiter.name: limiter.snapshot() for limiter in (self.llm_limiter, self.tool_limiter, self.heavy_tool_limiter)}
+
+    def tool_servers_snapshot(self) -> dict:
         return {
-            "content": response.content if hasattr(response, "content") else "",
-            "tool_calls": response.additional_kwargs.get("tool_calls", [])
+            "default": self.pool.snapshot() if self.pool is not None else None,
+            "heavy": self.heavy_pool.snapshot() if self.heavy_pool is not None else None,
+            "heavy_tools": sorted(self.heavy_tools) if self.heavy_pool is not None else [],
         }
 
     async def cleanup(self):
         try:
-            await self.exit_stack.aclose()
+            if self._refresh_task is not None:
+                self._refresh_task.cancel()
+                self._refresh_task = None
+            await self.conversation_log.close()
+            if self.answer_cache is not None:
+                await asyncio.to_thread(self.answer_cache.save)
+            if self.pool is not None:
+                await self.pool.close()
+            if self.heavy_pool is not None:
+                await self.heavy_pool.close()
             self.logger.info("Disconnected.")
         except Exception as e:
             self.logger.error(f"Cleanup error: {e}")
 
-    async def log_conversation(self):
+    async def log_conversation(self, conversation: Conversation):
+        """把尚未記錄的新訊息交給背景寫入器，每則訊息一行，不在 event loop 上做檔案 I/O。"""
         try:
-            os.makedirs("conversations", exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            path = os.path.join("conversations", f"conversation_{timestamp}.json")
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.messages, f, indent=2, ensure_ascii=False)
-            self.logger.info(f"Logged to {path}")
+            for seq in range(conversation.logged_count, len(conversation.messages)):
+                self.conversation_log.append(conversation.id, seq, conversation.messages[seq], turn=conversation.turn_id)
+            conversation.logged_count = len(conversation.messages)
         except Exception as e:
             self.logger.error(f"Logging error: {e}")
@@ -1,41 +1,108 @@
 from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
 # -*- coding: utf-8 -*- 
 from dotenv import load_dotenv
 import os
 import logging
-import json
+import asyncio
+import atexit
 from article_generator import ArticleGenerator
+from browser_pool import BrowserPool, BrowserPoolFull
+from artifacts import ArtifactStore
+from summary_cache import ResultCache, make_cache_key
+from transcript_store import TranscriptStore, TranscriptNotFound
+from utils.tokens import estimate_tokens
+from utils.logger import setup_logging, instance_log_file, correlation_id
+from utils.telemetry import REGISTRY, tracer, span
+from summary_jobs import (
+    SummaryJobManager, JobQueueFull, create_job_store,
+    STAGE_BROWSER, STAGE_MARKDOWN,
+)
 
 # 加载环境变量
 load_dotenv()
-# 紀錄程式執行狀況
-# 配置日誌記錄器
-logging.basicConfig(
-    level=logging.INFO, # 設置日誌級別 INFO
-    format='%(asctime)s - %(levelname)s - %(message)s' # 日誌格式
-)
+tracer.configure("mcp_server")
 
 logger = logging.getLogger(__name__)
 
+# 關閉時不註冊摘要相關工具、不啟動瀏覽器工作池，只提供 add / get_weather 等輕量工具
+ENABLE_SUMMARIZATION = os.getenv('ENABLE_SUMMARIZATION', 'true').lower() in ('1', 'true', 'yes')
 
+# 建構時只讀取設定；Selenium 與 LangChain 在第一次摘要時才載入
 article_generator = ArticleGenerator()
 
 
+# 同一台機器上執行多個工具伺服器時的實例名稱，用來區分各自的 Chrome 使用者資料夾與 log 檔
+INSTANCE_NAME = os.getenv('MCP_INSTANCE_NAME', '')
+
+
+def launch_pool_driver(index: int):
+    # 同一個 Chrome 使用者資料夾不能同時被兩個 driver 使用，第 2 個之後的 worker 使用各自的資料夾
+    user_data_dir = article_generator.user_data_dir
+    if INSTANCE_NAME and user_data_dir:
+        user_data_dir = f"{user_data_dir}-{INSTANCE_NAME}"
+    if index > 0 and user_data_dir:
+        user_data_dir = f"{user_data_dir}-worker{index}"
+    return article_generator.launch_webdriver(user_data_dir=user_data_dir)
+
+
+artifact_store = ArtifactStore(
+    os.path.join(article_generator.DIR or '.', 'runs'),
+    max_age=float(os.getenv('ARTIFACT_MAX_AGE_HOURS', 168)) * 3600,
+    max_runs=int(os.getenv('ARTIFACT_MAX_RUNS', 200)),
+)
+
+cache_dir = os.getenv('RESULT_CACHE_DIR', os.path.join(article_generator.DIR or '.', 'cache'))
+cache_options = dict(
+    memory_entries=int(os.getenv('RESULT_CACHE_MEMORY_ENTRIES', 128)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL_HOURS', 168)) * 3600,
+    max_disk_bytes=int(float(os.getenv('RESULT_CACHE_MAX_MB', 200)) * 1024 * 1024),
+)
+# NotebookLM 摘要（瀏覽器階段）與 OpenAI Markdown 轉換各自快取
+summary_cache = ResultCache('notebooklm_summary', os.path.join(cache_dir, 'summary'), **cache_options)
+markdown_cache = ResultCache('markdown', os.path.join(cache_dir, 'markdown'), **cache_options)
+
+# API 的 POST /transcripts 上傳的逐字稿；與 API 使用相同的 TRANSCRIPT_DIR
+transcript_store = TranscriptStore.from_env()
+
+browser_pool = BrowserPool(
+    launch_pool_driver,
+    size=int(os.getenv('BROWSER_POOL_SIZE', 1)),
+    queue_depth=int(os.getenv('BROWSER_QUEUE_DEPTH', 8)),
+    max_jobs_per_driver=int(os.getenv('BROWSER_MAX_JOBS_PER_DRIVER', 20)),
+)
+
+
 mcp = FastMCP('ToolServer')
 
-@mcp.tool()
+# 唯讀且冪等（相同參數一定得到相同結果）的工具，client 端可以快取結果；cacheTtlSeconds 為建議的快取秒數
+PURE_TOOL = ToolAnnotations(readOnlyHint=True, idempotentHint=True, openWorldHint=False, cacheTtlSeconds=3600)
+# 有副作用的工具：明確標示，避免被誤當成可快取
+SIDE_EFFECT_TOOL = ToolAnnotations(readOnlyHint=False, idempotentHint=False)
+
+
+def summarization_tool(*args, **kwargs):
+    """與 mcp.tool 相同，但 ENABLE_SUMMARIZATION=false 時不註冊（client 端看不到這些工具）。"""
+    if ENABLE_SUMMARIZATION:
+        return mcp.tool(*args, **kwargs)
+    return lambda fn: fn
+
+@mcp.tool(annotations=PURE_TOOL)
 async def add(a: float, b: float) -> float:
     """Add two numbers."""
     logger.info(f"The add method is called: a={a}, b={b}")
     return a + b
 
-@mcp.tool()
+@mcp.tool(annotations=PURE_TOOL)
 async def multiply(a: float, b: float) -> float:
     """Multiply two numbers."""
     logger.info(f"The multiply method is called: a={a}, b={b}")
     return a * b
 
-@mcp.tool()
+# 天氣會變動，只短暫快取
+@mcp.tool(annotations=ToolAnnotations(readOnlyHint=True, idempotentHint=True, openWorldHint=True, cacheTtlSeconds=300))
 async def get_weather(location: str) -> dict:
     """Get weather information for a specific location."""
     logger.info(f"The get_weather method is called: location={location}")
@@ -48,8 +115,8 @@ async def get_weather(location: str) -> dict:
     return weather_data
 
 
-@mcp.tool("summarize_meeting", description="輸入會議記錄，透過 Selenium 自動生成會議摘要文章，輸入文字後會自動操作瀏覽器並回傳結果。")
-async def summarize_meeting(text: str) -> dict:
+@summarization_tool("summarize_meeting", description="輸入會議記錄（text），或已上傳逐字稿的 transcript_id，透過 Selenium 自動生成會議摘要文章，輸入文字後會自動操作瀏覽器並回傳結果。", annotations=SIDE_EFFECT_TOOL)
+async def summarize_meeting(text: str = "", transcript_id: str = "") -> dict:
     """
     文章摘要生成工具
     
@@ -58,17 +125,239 @@ async def summarize_meeting(text: str) -> dict:
     
     Parameters:
     - text: 要生成文章的文字內容
+    - transcript_id: 以 POST /transcripts 上傳的逐字稿 id；指定時忽略 text，執行時才讀取內容
     
     Returns:
     - dict 格式的結果，包含生成狀態與訊息
     """
     
-    is_success = article_generator.summarize_meeting(text)
-    if not is_success:
+    return await run_summary_pipeline(text, transcript_id=transcript_id or None)
+
+
+async def run_summary_pipeline(text: str, set_stage=lambda stage: None, run_id=None, transcript_id=None) -> dict:
+    """
+    瀏覽器產生摘要 -> OpenAI 轉 Markdown；set_stage 用來回報目前階段（摘要工作使用）。
+
+    兩個階段之間的摘要文字直接在記憶體中傳遞，產出物寫入這次執行專屬的資料夾，
+    多個摘要同時執行也不會互相覆蓋。指定 transcript_id 時到這裡才從 transcript_store 讀出逐字稿。
+    """
+    if transcript_id:
+        try:
+            text = await asyncio.to_thread(transcript_store.read_text, transcript_id)
+        except TranscriptNotFound:
+            return {"status": "failed", "message": f"找不到逐字稿 {transcript_id}，請重新上傳"}
+    if not text.strip():
+        return {"status": "failed", "message": "沒有提供逐字稿內容"}
+    run = artifact_store.new_run(run_id)
+    # 這次執行的 log 都帶上 run id，方便與產出物資料夾對應；span 也以 run id 作為 trace id
+    correlation_id.set(run.id)
+    with span("summary.pipeline", chars=len(text), transcript_id=transcript_id) as pipeline_span:
+        result = await _run_summary_stages(text, set_stage, run)
+        pipeline_span.set(status=result.get("status"), mode=result.get("mode", "notebooklm"))
+    return result
+
+
+async def _run_summary_stages(text: str, set_stage, run) -> dict:
+    if use_long_transcript_mode(text):
+        return await run_long_transcript_pipeline(text, set_stage, run)
+    # Selenium 是阻塞式操作，交給瀏覽器工作池的執行緒執行，避免卡住 MCP 的 event loop
+    set_stage(STAGE_BROWSER)
+    summary_key = make_cache_key(text, engine='notebooklm', prompt=article_generator.SUMMARY_PROMPT)
+    try:
+        with span("summary.browser"):
+            summary = await summary_cache.get_or_compute(summary_key, lambda: browser_pool.submit(
+                lambda driver: article_generator.summarize_meeting(text, driver=driver, progress=set_stage)))
+    except BrowserPoolFull as e:
+        return {"status": "failed", "message": f"目前摘要工作過多，請稍後再試：{e}"}
+    except Exception as e:
+        logger.error(f"summarize_meeting failed: {e}")
+        summary = None
+    if not summary:
         return {"status": "failed", "message": "摘要生成失敗"}
-    is_success = article_generator.convert_to_markdown_from_openai()
-    return {"status": "success" if is_success else "failed"}
+    set_stage(STAGE_MARKDOWN)
+    language = "繁體中文"
+    markdown_key = make_cache_key(
+        summary,
+        prompt=article_generator.markdown_system_prompt(language),
+        model=article_generator.MODEL,
+        temperature=article_generator.TEMPERATURE,
+        max_tokens=article_generator.MAX_TOKENS,
+        language=language,
+    )
+    try:
+        with span("summary.markdown"):
+            markdown = await markdown_cache.get_or_compute(
+                markdown_key, lambda: article_generator.convert_to_markdown_from_openai(summary, language))
+    except Exception as e:
+        logger.error(f"convert_to_markdown_from_openai failed: {e}")
+        return {"status": "failed", "message": "Markdown 轉換失敗"}
+    await asyncio.to_thread(save_run_artifacts, run, summary, markdown)
+    return {"status": "success", "markdown": markdown, "run_id": run.id, "artifact_dir": run.path}
+
+
+def use_long_transcript_mode(text: str) -> bool:
+    # auto：超過門檻才改走 map-reduce；always / never 可強制開關
+    mode = os.getenv('LONG_TRANSCRIPT_MODE', 'auto')
+    if mode == 'always':
+        return True
+    if mode == 'never':
+        return False
+    return estimate_tokens(text, article_generator.MODEL) > int(os.getenv('LONG_TRANSCRIPT_THRESHOLD_TOKENS', 12000))
+
+
+async def run_long_transcript_pipeline(text: str, set_stage, run) -> dict:
+    """長逐字稿：不經過 NotebookLM，直接以 OpenAI 分段摘要後合併成 Markdown。"""
+    language = "繁體中文"
+    key = make_cache_key(
+        text,
+        engine='map_reduce',
+        chunk_prompt=article_generator.CHUNK_PROMPT,
+        merge_prompt=article_generator.MERGE_PROMPT,
+        prompt=article_generator.markdown_system_prompt(language),
+        model=article_generator.MODEL,
+        temperature=article_generator.TEMPERATURE,
+        max_tokens=article_generator.MAX_TOKENS,
+        chunk_tokens=article_generator.LONG_TRANSCRIPT_CHUNK_TOKENS,
+        language=language,
+    )
+    try:
+        markdown = await markdown_cache.get_or_compute(
+            key, lambda: article_generator.summarize_long_transcript(text, language, progress=set_stage))
+    except Exception as e:
+        logger.error(f"summarize_long_transcript failed: {e}")
+        return {"status": "failed", "message": "長逐字稿摘要失敗"}
+    if not markdown:
+        return {"status": "failed", "message": "長逐字稿摘要失敗"}
+    await asyncio.to_thread(save_run_artifacts, run, None, markdown)
+    return {"status": "success", "markdown": markdown, "mode": "long_transcript", "run_id": run.id, "artifact_dir": run.path}
+
+
+def save_run_artifacts(run, summary, markdown: str):
+    try:
+        if summary is not None:
+            run.write_text('summary.txt', summary)
+        run.write_text('summary.md', markdown)
+        logger.info(f"Summary artifacts saved to {run.path}")
+    except Exception as e:
+        # 產出物存檔失敗不影響回傳結果
+        logger.error(f"Saving summary artifacts failed: {e}")
+    artifact_store.cleanup()
+
+
+summary_jobs = SummaryJobManager(
+    run_summary_pipeline,
+    create_job_store(
+        os.getenv('SUMMARY_JOB_STORE', 'memory'),
+        os.getenv('SUMMARY_JOB_DB', 'summary_jobs.db'),
+        max_age=float(os.getenv('SUMMARY_JOB_MAX_AGE_HOURS', 24)) * 3600,
+        max_finished=int(os.getenv('SUMMARY_JOB_MAX_FINISHED', 200)),
+    ),
+    workers=int(os.getenv('SUMMARY_JOB_WORKERS', os.getenv('BROWSER_POOL_SIZE', 1))),
+    max_pending=int(os.getenv('SUMMARY_JOB_MAX_PENDING', 32)),
+)
+
+
+@summarization_tool("submit_summary_job", description="送出會議逐字稿（text 或已上傳的 transcript_id）摘要工作，立即回傳 job_id；之後用 get_summary_job 查詢進度與結果。", annotations=SIDE_EFFECT_TOOL)
+async def submit_summary_job(text: str = "", transcript_id: str = "") -> dict:
+    text_length = None
+    if transcript_id:
+        info = await asyncio.to_thread(transcript_store.info, transcript_id)
+        if info is None:
+            return {"status": "not_found", "message": f"找不到逐字稿 {transcript_id}"}
+        text_length = info.chars
+    elif not text.strip():
+        return {"status": "rejected", "message": "需要 text 或 transcript_id"}
+    try:
+        job = await summary_jobs.submit(text, transcript_id=transcript_id or None, text_length=text_length)
+    except JobQueueFull as e:
+        return {"status": "rejected", "message": str(e)}
+    return {"job_id": job.id, "status": job.status, "pending": summary_jobs.pending()}
+
+
+@summarization_tool("get_summary_job", description="查詢摘要工作的狀態與進度階段（queued / browser / notebooklm_answer / chunk_summaries / markdown / done）。")
+async def get_summary_job(job_id: str) -> dict:
+    job = await summary_jobs.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "not_found"}
+    return job.to_dict()
+
+
+@summarization_tool("get_summary_job_result", description="取得已完成摘要工作的 Markdown 結果。")
+async def get_summary_job_result(job_id: str) -> dict:
+    job = await summary_jobs.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "not_found"}
+    return job.to_dict(include_result=True)
+
+
+@summarization_tool("list_summary_jobs", description="列出最近的摘要工作與其狀態。")
+async def list_summary_jobs(limit: int = 20) -> list:
+    return [job.to_dict() for job in await summary_jobs.list(limit)]
+
+
+@summarization_tool("get_summary_cache_stats", description="查詢會議摘要與 Markdown 轉換結果快取的命中 / 未命中統計。")
+async def get_summary_cache_stats() -> dict:
+    return {"summary": summary_cache.snapshot(), "markdown": markdown_cache.snapshot()}
+
+
+BROWSER_POOL = REGISTRY.gauge("browser_pool", "Browser pool state: size, busy workers and queued jobs")
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    """Prometheus text format：瀏覽器各階段與摘要流程的耗時、OpenAI token / 成本、瀏覽器工作池狀態。"""
+    if ENABLE_SUMMARIZATION:
+        stats = browser_pool.stats()
+        for key in ("size", "busy", "queue_depth", "jobs_completed", "jobs_failed", "recycled", "rejected"):
+            if key in stats:
+                BROWSER_POOL.set(stats[key], stat=key)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@summarization_tool("get_browser_pool_stats", description="查詢 Selenium 瀏覽器工作池狀態：池大小、忙碌數、佇列深度與每個工作的執行時間。")
+async def get_browser_pool_stats() -> dict:
+    return browser_pool.stats()
+
+async def shutdown():
+    """
+    伺服器結束時釋放資源：停止摘要工作 worker、關閉瀏覽器工作池的 Chrome / chromedriver 與 OpenAI 連線。
+
+    瀏覽器 worker 是 daemon 執行緒，沒有明確關閉時 Chrome 行程會在每次重啟後留下來。
+    """
+    await summary_jobs.close()
+    await asyncio.to_thread(browser_pool.shutdown, True, float(os.getenv('BROWSER_SHUTDOWN_TIMEOUT', 30)))
+    await article_generator.aclose()
+
+
+async def serve():
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        await shutdown()
+
+
+# serve() 以外的結束方式（例如未處理的例外）仍會關閉 Chrome；shutdown 可重複呼叫
+atexit.register(browser_pool.shutdown, True, 5.0)
 
 if __name__ == "__main__":
-    # 啟動 MCP 服務
-    mcp.run(transport="streamable-http")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MCP tool server")
+    parser.add_argument("--host", default=os.getenv("MCP_SERVER_HOST", mcp.settings.host))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_SERVER_PORT", mcp.settings.port)))
+    parser.add_argument("--instance-name", default=INSTANCE_NAME,
+                        help="同一台機器執行多個實例時的名稱，預設非 8000 埠時為 port<埠號>")
+    args = parser.parse_args()
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    INSTANCE_NAME = args.instance_name or (f"port{args.port}" if args.port != 8000 else "")
+    # 紀錄程式執行狀況（與 API 共用佇列式、結構化的 log 設定）；
+    # 同一台機器上的每個實例寫自己的 log 檔（mcp_server.<實例名稱>.log），不會互相輪替
+    setup_logging("mcp_server", instance_log_file(os.getenv("MCP_SERVER_LOG_FILE", "mcp_server.log"), INSTANCE_NAME))
+
+    # 預先啟動瀏覽器工作池，讓第一個摘要請求不用等 Chrome 開啟；
+    # BROWSER_PRELAUNCH=false 時延到第一個摘要工作才啟動（加快啟動、閒置的實例不佔 Chrome 記憶體）
+    if ENABLE_SUMMARIZATION and os.getenv('BROWSER_PRELAUNCH', 'true').lower() in ('1', 'true', 'yes'):
+        browser_pool.start()
+    # 啟動 MCP 服務（Ctrl+C / SIGTERM 時由 uvicorn 正常結束，再執行 shutdown()）
+    asyncio.run(serve())
@@ -0,0 +1,250 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+import anyio
+import httpx
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+
+from utils.logger import logger
+
+# 代表連線本身已壞掉（而不是工具執行失敗）的例外，遇到時丟棄 session 並重新連線
+RETRYABLE_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    httpx.TransportError,
+)
+
+
+class ToolCallInterrupted(ConnectionError):
+    """請求送出後連線才中斷：伺服器可能已經開始執行，有副作用的工具不能重送。"""
+
+
+class PooledSession:
+    """
+    一個已初始化、可長期重複使用的 MCP ClientSession
+
+    transport 與 ClientSession 都是 anyio 的 context manager，必須在同一個 task 中進入與離開，
+    因此每個 session 由專屬的背景 task 持有，close() 只負責通知該 task 結束。
+    """
+
+    def __init__(self, transport_factory: Callable, message_handler: Optional[Callable] = None):
+        self._transport_factory = transport_factory
+        self._message_handler = message_handler
+        self.session: Optional[ClientSession] = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self, timeout: float):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except BaseException:
+            # 逾時或被取消後伺服器才回應的話，初始化好的 session 沒有人持有，會一直等 _closing；先結束背景 task
+            self._closing.set()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            raise
+        if self._error is not None:
+            raise self._error
+        return self
+
+    async def _run(self):
+        try:
+            async with self._transport_factory() as streams:
+                # streamable_http 會多回傳 get_session_id，只取前兩個 stream
+                read_stream, write_stream = streams[0], streams[1]
+                async with ClientSession(read_stream, write_stream, message_handler=self._message_handler) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.warning(f"MCP session closed with error: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            self.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"MCP session health check failed: {e}")
+            return False
+
+    async def close(self, timeout: float = 5.0):
+        self._closing.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except Exception:
+            self._task.cancel()
+
+
+class MCPSessionPool:
+    """
+    有上限的 MCP session 連線池
+
+    - 最多同時存在 max_size 個 session，超過時等待其他呼叫歸還
+    - 取用前若閒置超過 health_check_interval 秒，先送 ping 檢查，失敗則重新連線
+    - 閒置超過 max_idle 秒的 session 會被背景 task 回收
+    - 連線層錯誤（非工具本身的錯誤）會丟棄該 session 並以新連線重試
+    """
+
+    def __init__(
+        self,
+        transport_factory: Callable,
+        max_size: int = 4,
+        max_idle: float = 300.0,
+        health_check_interval: float = 30.0,
+        connect_timeout: float = 30.0,
+        retries: int = 1,
+        message_handler: Optional[Callable] = None,
+    ):
+        self._transport_factory = transport_factory
+        # 伺服器送來的通知（例如 tools/list_changed）交給這個 handler
+        self._message_handler = message_handler
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self._idle: deque[PooledSession] = deque()
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._in_use = 0
+        self._closed = False
+        self._reaper: Optional[asyncio.Task] = None
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "evicted": 0, "reconnects": 0}
+
+    async def start(self, warm: int = 1):
+        """預先建立 warm 個 session，並啟動閒置回收 task。"""
+        for _ in range(min(warm, self.max_size)):
+            self._idle.append(await self._open_new())
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def _open_new(self) -> PooledSession:
+        pooled = await PooledSession(self._transport_factory, self._message_handler).open(self.connect_timeout)
+        self.stats["created"] += 1
+        return pooled
+
+    async def _discard(self, pooled: PooledSession):
+        self.stats["discarded"] += 1
+        await pooled.close()
+
+    async def _acquire(self) -> PooledSession:
+        while self._idle:
+            pooled = self._idle.pop()  # LIFO：優先使用最近用過、最可能仍健康的連線
+            if not pooled.alive or pooled.idle_for() > self.max_idle:
+                await self._discard(pooled)
+                continue
+            if time.monotonic() - pooled.last_checked > self.health_check_interval:
+                if not await pooled.ping(timeout=5.0):
+                    await self._discard(pooled)
+                    continue
+            self.stats["reused"] += 1
+            return pooled
+        return await self._open_new()
+
+    def _release(self, pooled: PooledSession):
+        pooled.last_used = time.monotonic()
+        self._idle.append(pooled)
+
+    @asynccontextmanager
+    async def session(self):
+        if self._closed:
+            raise RuntimeError("MCP session pool is closed")
+        async with self._semaphore:
+            pooled = await self._acquire()
+            self._in_use += 1
+            try:
+                yield pooled.session
+            except McpError:
+                # 工具回傳的協定錯誤，連線仍然可用
+                self._release(pooled)
+                raise
+            except BaseException:
+                await self._discard(pooled)
+                raise
+            else:
+                if self._closed or not pooled.alive:
+                    await self._discard(pooled)
+                else:
+                    self._release(pooled)
+            finally:
+                self._in_use -= 1
+
+    async def call_tool(self, tool_name: str, tool_args: dict, retry: bool = True):
+        """
+        連線失敗時換新的 session 重試；retry=False（有副作用的工具）時只重試還沒送出請求的失敗
+        （建立連線、初始化），請求送出後才中斷則拋出 ToolCallInterrupted，避免重複執行。
+        """
+        for attempt in range(self.retries + 1):
+            sent = False
+            try:
+                async with self.session() as session:
+                    sent = True
+                    return await session.call_tool(tool_name, tool_args)
+            except RETRYABLE_ERRORS as e:
+                if sent and not retry:
+                    raise ToolCallInterrupted(f"MCP connection lost during {tool_name}: {e!r}") from e
+                if attempt >= self.retries:
+                    raise
+                self.stats["reconnects"] += 1
+                logger.warning(f"MCP connection lost during {tool_name} ({e}), reconnecting...")
+
+    async def list_tools(self):
+        async with self.session() as session:
+            response = await session.list_tools()
+            return response.tools
+
+    async def _reap_loop(self):
+        interval = max(1.0, min(self.max_idle, self.health_check_interval))
+        while not self._closed:
+            await asyncio.sleep(interval)
+            keep = deque()
+            while self._idle:
+                pooled = self._idle.popleft()
+                if pooled.alive and pooled.idle_for() <= self.max_idle:
+                    keep.append(pooled)
+                else:
+                    self.stats["evicted"] += 1
+                    await pooled.close()
+            self._idle.extend(keep)
+
+    def snapshot(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            **self.stats,
+        }
+
+    async def close(self):
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        while self._idle:
+            await self._idle.pop().close()
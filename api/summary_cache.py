@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_transcript(text: str) -> str:
+    """正規化逐字稿：統一全半形、去除行首尾與多餘空白、移除空行，讓只差在排版的內容得到相同的 hash。"""
+    text = unicodedata.normalize("NFKC", text)
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_transcript(text).encode("utf-8")).hexdigest()
+
+
+def make_cache_key(text: str, **params) -> str:
+    """以正規化內容的 hash 加上會影響結果的參數（prompt、模型、溫度、語言…）組成快取 key。"""
+    payload = {"content": content_hash(text)}
+    for name, value in params.items():
+        # prompt 之類的長字串只取 hash
+        if isinstance(value, str) and len(value) > 64:
+            value = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        payload[name] = value
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    兩層結果快取
+
+    - 記憶體：LRU，最多 memory_entries 筆
+    - 磁碟：每筆一個 JSON 檔，超過 ttl 秒視為過期，總大小超過 max_disk_bytes 時從最久未寫入的開始刪除
+      （寫入時累計目前大小，只有超過上限或距上次掃描超過 scan_interval 秒才走訪整個資料夾）
+    get_or_compute() 會合併相同 key 的同時請求，只實際計算一次。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        memory_entries: int = 128,
+        ttl: float = 7 * 24 * 3600,
+        max_disk_bytes: int = 200 * 1024 * 1024,
+        scan_interval: float = 600,
+    ):
+        self.name = name
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.scan_interval = scan_interval
+        # 磁碟上快取檔的總大小；第一次寫入前掃描一次，之後隨寫入 / 刪除增減
+        self._disk_bytes = None
+        self._last_scan = 0.0
+        self._memory: "OrderedDict[str, tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        if now - entry["created_at"] > self.ttl:
+            self._remove_file(path)
+            self._count("misses")
+            return None
+        self._remember(key, entry["created_at"], entry["value"])
+        self._count("disk_hits")
+        return entry["value"]
+
+    def set(self, key: str, value):
+        created_at = time.time()
+        self._remember(key, created_at, value)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "value": value}, f, ensure_ascii=False)
+            written = f.tell()
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["stores"] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += written - replaced
+            scan = (
+                self._disk_bytes is None
+                or self._disk_bytes > self.max_disk_bytes
+                or created_at - self._last_scan > self.scan_interval
+            )
+        if scan:
+            self._evict_disk()
+
+    def _remember(self, key: str, created_at: float, value):
+        with self._lock:
+            self._memory[key] = (created_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.stats["evictions"] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    self._remove_file(path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        files.sort()  # 最舊的在前
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove_file(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self._last_scan = now
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable]):
+        """
+        先查快取，沒有才呼叫 compute()；只有非空的結果會被寫入快取。
+        相同 key 正在計算中時，後到的請求直接等待同一個結果；
+        原本計算的請求被取消時，等待者不會跟著收到 CancelledError，而是由其中一個接手重新計算。
+        """
+        value = await asyncio.to_thread(self.get, key)
+        if value is not None:
+            return value
+
+        while (inflight := self._inflight.get(key)) is not None:
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    # 被取消的是這個等待者自己
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            if value:
+                await asyncio.to_thread(self.set, key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["inflight"] = len(self._inflight)
+        return stats
@@ -0,0 +1,333 @@
+import abc
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 工作狀態
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# 執行階段：瀏覽器操作 -> 等待 NotebookLM 回答 -> OpenAI 轉 Markdown
+# 長逐字稿模式則為：分段摘要 -> 合併轉 Markdown
+STAGE_QUEUED = "queued"
+STAGE_BROWSER = "browser"
+STAGE_NOTEBOOKLM_ANSWER = "notebooklm_answer"
+STAGE_CHUNK_SUMMARIES = "chunk_summaries"
+STAGE_MARKDOWN = "markdown"
+STAGE_DONE = "done"
+
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(Exception):
+    """待處理的摘要工作已達上限。"""
+
+
+@dataclass
+class SummaryJob:
+    id: str
+    text: str
+    status: str = QUEUED
+    stage: str = STAGE_QUEUED
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    # 以上傳的逐字稿建立的工作只存 id（text 為空），執行時才由 runner 讀出內容
+    transcript_id: Optional[str] = None
+    # 逐字稿字數；未指定時為 len(text)（transcript_id 工作由呼叫端提供上傳時記錄的字數）
+    text_length: Optional[int] = None
+
+    def to_dict(self, include_result: bool = False) -> dict:
+        data = asdict(self)
+        data.pop("text")
+        data["text_length"] = self.text_length if self.text_length is not None else len(self.text)
+        if not include_result:
+            data.pop("result")
+        return data
+
+
+class JobStore(abc.ABC):
+    """
+    摘要工作的持久化介面；所有方法都必須是 thread-safe（瀏覽器執行緒會回報進度）。
+
+    已完成（成功或失敗）的工作依保留政策清除：超過 max_age 秒，或總數超過 max_finished 時從最舊的開始刪除。
+    """
+
+    def __init__(self, max_age: float = 24 * 3600, max_finished: int = 200):
+        self.max_age = max_age
+        self.max_finished = max_finished
+
+    @abc.abstractmethod
+    def save(self, job: SummaryJob):
+        ...
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        ...
+
+    def update(self, job_id: str, **fields):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = time.time()
+        self.save(job)
+        return job
+
+    @abc.abstractmethod
+    def list(self, limit: int = 50) -> list:
+        ...
+
+    @abc.abstractmethod
+    def unfinished(self) -> list:
+        ...
+
+    @abc.abstractmethod
+    def cleanup(self) -> int:
+        """依保留政策刪除已完成的舊工作，回傳刪除的數量。"""
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self, max_age: float = 24 * 3600, max_finished: int = 200):
+        super().__init__(max_age, max_finished)
+        self._jobs: dict[str, SummaryJob] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: SummaryJob):
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> list:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return jobs[:limit]
+
+    def unfinished(self) -> list:
+        with self._lock:
+            return [j for j in self._jobs.values() if j.status in (QUEUED, RUNNING)]
+
+    def cleanup(self) -> int:
+        now = time.time()
+        with self._lock:
+            finished = sorted((j for j in self._jobs.values() if j.status in FINISHED), key=lambda j: j.updated_at, reverse=True)
+            expired = [j.id for index, j in enumerate(finished) if index >= self.max_finished or now - j.updated_at > self.max_age]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """以 SQLite 保存工作狀態，供本機測試或單機部署在重啟後仍可查詢結果。"""
+
+    def __init__(self, path: str = "summary_jobs.db", max_age: float = 24 * 3600, max_finished: int = 200):
+        super().__init__(max_age, max_finished)
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS summary_jobs (
+                    id TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    transcript_id TEXT,
+                    text_length INTEGER
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(summary_jobs)")}
+            # 舊版建立的資料庫沒有這些欄位
+            for column, kind in (("transcript_id", "TEXT"), ("text_length", "INTEGER")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE summary_jobs ADD COLUMN {column} {kind}")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    # 明確列出欄位，不受舊資料庫 ALTER TABLE 後的欄位順序影響
+    COLUMNS = "id, text, status, stage, created_at, updated_at, result, error, transcript_id, text_length"
+
+    @staticmethod
+    def _row_to_job(row) -> SummaryJob:
+        return SummaryJob(
+            id=row[0], text=row[1], status=row[2], stage=row[3],
+            created_at=row[4], updated_at=row[5],
+            result=json.loads(row[6]) if row[6] else None, error=row[7], transcript_id=row[8], text_length=row[9],
+        )
+
+    def save(self, job: SummaryJob):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO summary_jobs ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.text, job.status, job.stage, job.created_at, job.updated_at,
+                 json.dumps(job.result, ensure_ascii=False) if job.result is not None else None, job.error,
+                 job.transcript_id, job.text_length),
+            )
+
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT {self.COLUMNS} FROM summary_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, limit: int = 50) -> list:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(f"SELECT {self.COLUMNS} FROM summary_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def unfinished(self) -> list:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {self.COLUMNS} FROM summary_jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def cleanup(self) -> int:
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM summary_jobs WHERE status IN (?, ?) AND (updated_at < ? OR id NOT IN "
+                "(SELECT id FROM summary_jobs WHERE status IN (?, ?) ORDER BY updated_at DESC LIMIT ?))",
+                (*FINISHED, time.time() - self.max_age, *FINISHED, self.max_finished),
+            )
+        return cursor.rowcount
+
+
+def create_job_store(kind: str, path: str = "summary_jobs.db", max_age: float = 24 * 3600, max_finished: int = 200) -> JobStore:
+    if kind == "sqlite":
+        return SQLiteJobStore(path, max_age, max_finished)
+    if kind == "memory":
+        return MemoryJobStore(max_age, max_finished)
+    raise ValueError(f"Unknown job store: {kind}")
+
+
+# runner(text, set_stage, run_id=job_id, transcript_id=...) -> result dict；set_stage 可在任何執行緒呼叫，
+# transcript_id 不為 None 時 text 為空，由 runner 讀取上傳的逐字稿
+Runner = Callable[..., Awaitable[dict]]
+
+
+class SummaryJobManager:
+    """
+    行程內的摘要工作佇列
+
+    submit() 只建立工作並放入佇列就立即回傳 job id，實際摘要由背景 worker task 執行，
+    進度階段與結果寫入 JobStore，可透過 get() 查詢。
+
+    JobStore 的呼叫（SQLite 是阻塞式 I/O）都交給單一的背景執行緒依序執行，不佔用 event loop；
+    set_stage 不論從 event loop 或瀏覽器執行緒呼叫都排進同一個執行緒，階段更新不會晚於最終狀態寫入。
+    """
+
+    def __init__(self, runner: Runner, store: JobStore, workers: int = 1, max_pending: int = 32):
+        self.runner = runner
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary-job-store")
+
+    async def _store_call(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._store_thread, lambda: fn(*args, **kwargs))
+
+    async def _ensure_started(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        # 上次行程結束時尚未完成的工作：執行到一半的標記失敗，還在排隊的重新排入
+        for job in await self._store_call(self.store.unfinished):
+            if job.status == RUNNING:
+                await self._store_call(self.store.update, job.id, status=FAILED, error="interrupted by server restart")
+            else:
+                try:
+                    self._queue.put_nowait(job.id)
+                except asyncio.QueueFull:
+                    await self._store_call(self.store.update, job.id, status=FAILED, error="dropped: queue full on restart")
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+
+    async def submit(self, text: str = "", transcript_id: Optional[str] = None, text_length: Optional[int] = None) -> SummaryJob:
+        await self._ensure_started()
+        job = SummaryJob(id=uuid.uuid4().hex, text=text, transcript_id=transcript_id, text_length=text_length)
+        if self._queue.full():
+            raise JobQueueFull(f"too many pending summary jobs ({self.max_pending})")
+        await self._store_call(self.store.save, job)
+        self._queue.put_nowait(job.id)
+        source = f"transcript {transcript_id}" if transcript_id else f"{len(text)} chars"
+        logger.info(f"Summary job {job.id} queued ({source}, {self._queue.qsize()} pending)")
+        return job
+
+    async def get(self, job_id: str) -> Optional[SummaryJob]:
+        return await self._store_call(self.store.get, job_id)
+
+    async def list(self, limit: int = 50) -> list:
+        return await self._store_call(self.store.list, limit)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await self._store_call(self.store.get, job_id)
+        if job is None:
+            return
+        await self._store_call(self.store.update, job_id, status=RUNNING, stage=STAGE_BROWSER)
+        started = time.monotonic()
+
+        def set_stage(stage: str):
+            try:
+                self._store_thread.submit(self.store.update, job_id, stage=stage)
+            except RuntimeError:
+                # close() 之後仍在執行的瀏覽器工作回報進度
+                pass
+
+        try:
+            # 以 job id 作為產出物資料夾名稱，方便從工作對應到檔案
+            result = await self.runner(job.text, set_stage, run_id=job_id, transcript_id=job.transcript_id)
+        except Exception as e:
+            logger.error(f"Summary job {job_id} failed: {e}")
+            await self._store_call(self.store.update, job_id, status=FAILED, error=str(e))
+        else:
+            if result.get("status") == "success":
+                await self._store_call(self.store.update, job_id, status=SUCCEEDED, stage=STAGE_DONE, result=result)
+            else:
+                await self._store_call(self.store.update, job_id, status=FAILED, result=result,
+                                       error=result.get("message", "摘要生成失敗"))
+            logger.info(f"Summary job {job_id} finished in {time.monotonic() - started:.1f}s")
+        removed = await self._store_call(self.store.cleanup)
+        if removed:
+            logger.info(f"Removed {removed} finished summary job(s)")
+
+    async def close(self):
+        """停止 worker 並等待尚未寫入的狀態更新完成。"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._store_thread.shutdown, True)
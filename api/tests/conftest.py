@@ -0,0 +1,5 @@
+import os
+import sys
+
+# api/ 底下的模組以頂層名稱互相 import（與 main.py、mcp_server.py 的執行方式相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from admission import DeadlineExceeded, Overloaded, ResourceLimiter, new_deadline
+
+
+async def hold(limiter: ResourceLimiter, seconds: float):
+    async with limiter.slot():
+        await asyncio.sleep(seconds)
+
+
+def test_expired_deadline_is_not_reported_as_overload():
+    async def scenario():
+        limiter = ResourceLimiter("tools", limit=1, max_waiting=4, max_wait=5.0)
+        holder = asyncio.create_task(hold(limiter, 0.2))
+        await asyncio.sleep(0)
+        deadline = asyncio.get_running_loop().time() - 1
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(deadline)
+        await holder
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.stats["timed_out"] == 0
+    assert limiter.stats["queued"] == 0
+    assert limiter.waiting == 0
+
+
+def test_deadline_reached_while_queued_raises_deadline_exceeded():
+    async def scenario():
+        limiter = ResourceLimiter("tools", limit=1, max_waiting=4, max_wait=5.0)
+        holder = asyncio.create_task(hold(limiter, 0.3))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(new_deadline(0.05))
+        await holder
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.stats["timed_out"] == 0
+    assert limiter.waiting == 0
+
+
+def test_queue_timeout_is_overload():
+    async def scenario():
+        limiter = ResourceLimiter("tools", limit=1, max_waiting=4, max_wait=0.05)
+        holder = asyncio.create_task(hold(limiter, 0.3))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await limiter.acquire(new_deadline(10))
+        await holder
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.stats["timed_out"] == 1
+    assert limiter.waiting == 0
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        limiter = ResourceLimiter("tools", limit=1, max_waiting=0, max_wait=5.0)
+        holder = asyncio.create_task(hold(limiter, 0.1))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        await holder
+        return limiter
+
+    assert asyncio.run(scenario()).stats["rejected"] == 1
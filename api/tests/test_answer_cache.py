@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from answer_cache import AnswerCache, HashedNgramEncoder  # noqa: E402
+
+CONTEXT = "gpt-4o|tools"
+
+
+def hits(cached: str, query: str) -> bool:
+    cache = AnswerCache(HashedNgramEncoder())
+    cache.store(cached, "answer", CONTEXT)
+    return cache.lookup(query, CONTEXT) is not None
+
+
+@pytest.mark.parametrize(
+    "cached, query",
+    [
+        ("這場會議有哪些待辦事項？", "這場會議有哪些待辦事項"),
+        ("summarize the decisions of this meeting", "Summarize the decisions from this meeting"),
+        ("會議中誰負責前端排版？", "會議中前端排版是誰負責？"),
+    ],
+)
+def test_paraphrase_hits(cached, query):
+    assert hits(cached, query)
+
+
+@pytest.mark.parametrize(
+    "cached, query",
+    [
+        ("what is the weather in Tokyo today", "what is the weather in Kyoto today"),
+        ("台北今天的天氣如何", "台南今天的天氣如何"),
+        ("is it safe to deploy on friday", "is it not safe to deploy on friday"),
+        ("這個版本可以上線嗎", "這個版本不可以上線嗎"),
+        ("summarize the decisions of this meeting", "summarize the action items of this meeting"),
+        ("請幫我計算 3 加 5", "請幫我計算 3 加 6"),
+        ("台北到台南要多久", "台南到台北要多久"),
+    ],
+)
+def test_different_question_misses(cached, query):
+    assert not hits(cached, query)
+
+
+def test_scope_keeps_negation_and_drops_function_words():
+    assert AnswerCache.scope_for("Is it safe?") == AnswerCache.scope_for("is it safe")
+    assert AnswerCache.scope_for("is it safe") != AnswerCache.scope_for("is it not safe")
+
+
+def test_workers_sharing_a_path_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "answer_cache.npz")
+    first, second = AnswerCache(HashedNgramEncoder(), path=path), AnswerCache(HashedNgramEncoder(), path=path)
+    first.store("台北今天的天氣如何", "晴天", CONTEXT)
+    second.store("summarize the decisions of this meeting", "decisions", CONTEXT)
+    first.save()
+    second.save()
+    restarted = AnswerCache(HashedNgramEncoder(), path=path)
+    assert restarted.lookup("台北今天的天氣如何", CONTEXT)["answer"] == "晴天"
+    assert restarted.lookup("summarize the decisions of this meeting", CONTEXT)["answer"] == "decisions"
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("selenium")
+pytest.importorskip("langchain_core")
+
+from selenium.webdriver.common.keys import Keys  # noqa: E402
+
+from article_generator import ArticleGenerator  # noqa: E402
+from benchmarks.fakes import FakeNotebookDriver  # noqa: E402
+
+ANSWER = "## 技術討論要點\n- 前端調整結果卡片排版"
+
+
+def wait_for_answer(prompt_echo: str) -> str:
+    driver = FakeNotebookDriver({"answer": ANSWER, "answer_start_ms": 2000, "answer_stream_ms": 0, "prompt_echo": prompt_echo})
+    generator = ArticleGenerator()
+    generator.ANSWER_TIMEOUT = 10
+    generator.ANSWER_POLL_INTERVAL = 0.5
+    generator.ANSWER_STABLE_POLLS = 2
+    driver.state = "sources"
+    message_count = len(generator._chat_messages(driver))
+    driver._send_keys("prompt_input", generator.SUMMARY_PROMPT)
+    driver._send_keys("prompt_input", Keys.RETURN)
+    return generator._wait_for_answer(driver, message_count)
+
+
+def test_answer_is_the_reply_after_a_relabelled_prompt():
+    # 提示那一則多了標籤且被截短，回答晚一點才出現：不能把提示當成摘要
+    assert wait_for_answer("你說：\n" + ArticleGenerator.SUMMARY_PROMPT[:40] + "…") == ANSWER
+
+
+def test_answer_is_the_reply_after_a_verbatim_prompt():
+    assert wait_for_answer("{prompt}") == ANSWER
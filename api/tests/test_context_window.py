@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from context_window import ContextWindow  # noqa: E402
+from conversation import Conversation  # noqa: E402
+
+LONG_TEXT = "會議紀錄：前端需要調整結果卡片的排版，後端維持 top_k 參數。" * 400
+
+
+def build(window: ContextWindow, conversation: Conversation, reserved_tokens: int = 0):
+    messages, stats = window.build(conversation, reserved_tokens=reserved_tokens)
+    assert stats["prompt_tokens"] <= window.max_tokens
+    return messages, stats
+
+
+def test_small_prompt_is_untouched():
+    window = ContextWindow(max_tokens=1000)
+    conversation = Conversation()
+    conversation.add_message("user", "台北天氣如何")
+    messages, stats = build(window, conversation)
+    assert messages[0].content == "台北天氣如何"
+    assert stats["truncated_messages"] == 0
+
+
+def test_single_oversized_user_message_is_truncated_to_budget():
+    window = ContextWindow(max_tokens=500)
+    conversation = Conversation()
+    conversation.add_message("user", LONG_TEXT)
+    messages, stats = build(window, conversation, reserved_tokens=100)
+    assert stats["truncated_messages"] == 1
+    assert stats["prompt_tokens"] <= 500
+    assert messages[0].content.startswith(LONG_TEXT[:50])
+    assert "[truncated" in messages[0].content
+
+
+def test_oversized_tool_result_in_first_turn_fits_budget():
+    window = ContextWindow(max_tokens=600, tool_result_max_tokens=5000, min_tool_result_tokens=400)
+    conversation = Conversation()
+    conversation.add_message("user", "幫我摘要這份逐字稿")
+    conversation.add_message("assistant", "", tool_calls=[{"name": "summarize_meeting", "args": {}, "id": "call_1"}])
+    conversation.add_message("tool", LONG_TEXT, tool_call_id="call_1", name="summarize_meeting")
+    messages, stats = build(window, conversation, reserved_tokens=150)
+    # 使用者問題與 tool_call 對應都保留，只截短內容
+    assert messages[0].content == "幫我摘要這份逐字稿"
+    assert messages[2].tool_call_id == "call_1"
+    assert stats["prompt_tokens"] <= 600
+
+
+def test_newest_oversized_message_is_truncated_first():
+    window = ContextWindow(max_tokens=2000, tool_result_max_tokens=5000)
+    conversation = Conversation()
+    question = "請根據下面的會議內容回答：" + LONG_TEXT[:600]
+    conversation.add_message("user", question)
+    conversation.add_message("assistant", "", tool_calls=[{"name": "get_summary_job_result", "args": {}, "id": "call_1"}])
+    conversation.add_message("tool", LONG_TEXT, tool_call_id="call_1", name="get_summary_job_result")
+    messages, stats = build(window, conversation)
+    assert messages[0].content == question
+    assert "[truncated" in messages[2].content
+    assert stats["prompt_tokens"] <= 2000
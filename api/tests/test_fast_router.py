@@ -0,0 +1,61 @@
+import pytest
+
+from fast_router import FastRouter
+
+TOOLS = [
+    {"function": {"name": "add", "parameters": {"properties": {"a": {"type": "number"}, "b": {"type": "number"}}, "required": ["a", "b"]}}},
+    {"function": {"name": "multiply", "parameters": {"properties": {"a": {"type": "number"}, "b": {"type": "number"}}, "required": ["a", "b"]}}},
+    {"function": {"name": "get_weather", "parameters": {"properties": {"location": {"type": "string"}}, "required": ["location"]}}},
+]
+
+
+def route(query: str):
+    matched = FastRouter().match(query, TOOLS)
+    return None if matched is None else (matched[0].tool, matched[1])
+
+
+@pytest.mark.parametrize("query, location", [
+    ("台北天氣如何", "台北"),
+    ("請問高雄天氣怎麼樣？", "高雄"),
+    ("台北今天的天氣", "台北"),
+    ("台北現在天氣如何", "台北"),
+    ("天津天氣如何", "天津"),
+    ("weather in Tokyo", "Tokyo"),
+    ("What's the weather like in New York today?", "New York"),
+    ("weather for Kansas City", "Kansas City"),
+])
+def test_weather_with_clean_location(query, location):
+    assert route(query) == ("get_weather", {"location": location})
+
+
+@pytest.mark.parametrize("query", [
+    # 時間詞、代名詞、動詞或贅字出現在地點的位置，不是乾淨的地名
+    "今天天氣如何",
+    "現在天氣怎麼樣",
+    "你覺得天氣如何",
+    "幫我查高雄天氣",
+    "我想知道台北天氣",
+    "weather in general",
+    "how is the weather in my area",
+    "what is the weather like here",
+    "weather in the area",
+    # 多個地點或預報
+    "台北和高雄天氣如何",
+    "weather in Paris and London",
+    "weather for Tokyo tomorrow",
+])
+def test_weather_without_clean_location_falls_back(query):
+    assert route(query) is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("add 3 and 5", ("add", {"a": 3.0, "b": 5.0})),
+    ("3 加 5 等於多少", ("add", {"a": 3.0, "b": 5.0})),
+    ("what is 6 times 7?", ("multiply", {"a": 6.0, "b": 7.0})),
+])
+def test_arithmetic(query, expected):
+    assert route(query) == expected
+
+
+def test_missing_tool_falls_back():
+    assert FastRouter().match("台北天氣如何", TOOLS[:2]) is None
@@ -0,0 +1,111 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from load_balancer import LoadBalancedPool  # noqa: E402
+from session_pool import MCPSessionPool, PooledSession, ToolCallInterrupted  # noqa: E402
+
+
+class FlakySession:
+    """前 failures 次 call_tool 在請求送出後連線中斷。"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def call_tool(self, tool_name, tool_args):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("connection reset")
+        return f"{tool_name} ok"
+
+
+def make_pool(session: FlakySession, connect_failures: int = 0) -> MCPSessionPool:
+    pool = MCPSessionPool(transport_factory=None, retries=1)
+    state = {"connect_failures": connect_failures}
+
+    @asynccontextmanager
+    async def fake_session():
+        if state["connect_failures"]:
+            state["connect_failures"] -= 1
+            raise ConnectionError("connection refused")
+        yield session
+
+    pool.session = fake_session
+    return pool
+
+
+def test_idempotent_call_is_retried_after_interruption():
+    session = FlakySession(failures=1)
+    assert asyncio.run(make_pool(session).call_tool("get_weather", {}, retry=True)) == "get_weather ok"
+    assert session.calls == 2
+
+
+def test_side_effect_call_is_not_resent_after_interruption():
+    session = FlakySession(failures=1)
+    with pytest.raises(ToolCallInterrupted):
+        asyncio.run(make_pool(session).call_tool("submit_summary_job", {}, retry=False))
+    assert session.calls == 1
+
+
+def test_side_effect_call_is_retried_when_connecting_fails():
+    session = FlakySession(failures=0)
+    pool = make_pool(session, connect_failures=1)
+    assert asyncio.run(pool.call_tool("submit_summary_job", {}, retry=False)) == "submit_summary_job ok"
+    assert session.calls == 1
+
+
+class StubBackendPool:
+    def __init__(self, url: str, error: BaseException = None):
+        self.url = url
+        self.error = error
+        self.calls = 0
+
+    async def call_tool(self, tool_name, tool_args, retry=True):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.url
+
+
+def make_balancer(error: BaseException) -> LoadBalancedPool:
+    pools = {"a": StubBackendPool("a", error), "b": StubBackendPool("b", error)}
+    return LoadBalancedPool(["a", "b"], lambda url: pools[url])
+
+
+def test_balancer_does_not_reroute_interrupted_side_effect_call():
+    balancer = make_balancer(ToolCallInterrupted("lost"))
+    with pytest.raises(ToolCallInterrupted):
+        asyncio.run(balancer.call_tool("submit_summary_job", {}, retry=False))
+    assert sum(backend.pool.calls for backend in balancer.backends) == 1
+
+
+def test_balancer_reroutes_unreachable_backend():
+    balancer = make_balancer(None)
+    balancer.backends[0].pool.error = ConnectionError("refused")
+    balancer.backends[0].outstanding = -1  # 讓第一次一定挑到 a
+    assert asyncio.run(balancer.call_tool("submit_summary_job", {}, retry=False)) == "b"
+
+
+def test_open_timeout_stops_the_background_task():
+    entered = []
+
+    @asynccontextmanager
+    async def slow_transport():
+        entered.append(True)
+        await asyncio.sleep(10)
+        yield None, None
+
+    async def scenario():
+        pooled = PooledSession(slow_transport)
+        with pytest.raises(asyncio.TimeoutError):
+            await pooled.open(timeout=0.05)
+        # 仍在同一個 event loop 中：背景 task 必須已經結束，而不是等 loop 關閉時才被取消
+        assert pooled._task.done()
+        assert not pooled.alive
+
+    asyncio.run(scenario())
+    assert entered
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import json
+import time
+
+import pytest
+
+pytest.importorskip("mcp")
+pytest.importorskip("langchain_core")
+
+from mcp import types  # noqa: E402
+
+from load_balancer import LoadBalancedPool  # noqa: E402
+from mcp_client import MCPClient  # noqa: E402
+
+
+class StubSessionPool:
+    """代替 MCPSessionPool 的一台工具伺服器：list_tools 回傳 Tool 清單，call_tool 回傳 CallToolResult。"""
+
+    def __init__(self, url: str, tools: list):
+        self.url = url
+        self.tools = tools
+
+    async def start(self, warm: int = 1):
+        pass
+
+    async def close(self):
+        pass
+
+    def snapshot(self) -> dict:
+        return {}
+
+    async def list_tools(self):
+        return [types.Tool(name=name, description=self.url, inputSchema={"type": "object"}) for name in self.tools]
+
+    async def call_tool(self, tool_name: str, tool_args: dict, retry: bool = True):
+        # 模擬 mcp_server 的摘要工作工具：工作只存在建立它的那台
+        jobs = JOBS.setdefault(self.url, {})
+        if tool_name == "submit_summary_job":
+            job_id = f"{self.url}-{len(jobs)}"
+            jobs[job_id] = next(CLOCK)
+            items = [{"job_id": job_id, "status": "queued"}]
+        elif tool_name == "get_summary_job":
+            job_id = tool_args["job_id"]
+            items = [{"job_id": job_id, "status": "queued" if job_id in jobs else "not_found", "server": self.url}]
+        elif tool_name == "list_summary_jobs":
+            items = [{"job_id": job_id, "created_at": created_at} for job_id, created_at in jobs.items()]
+        else:
+            raise ValueError(tool_name)
+        return types.CallToolResult(content=[types.TextContent(type="text", text=json.dumps(item)) for item in items])
+
+
+JOBS: dict = {}
+# 建立時間用遞增的計數，避免同一個時間戳記讓排序不確定
+CLOCK = itertools.count()
+JOB_TOOLS = ["submit_summary_job", "get_summary_job", "list_summary_jobs"]
+
+
+def make_client(default_tools: dict, heavy_tools: dict = None) -> MCPClient:
+    client = MCPClient(mode="streamable_http", server_path_or_url=list(default_tools), heavy_server_urls=list(heavy_tools or {}))
+    client.pool = LoadBalancedPool(list(default_tools), lambda url: StubSessionPool(url, default_tools[url]))
+    if heavy_tools:
+        client.heavy_pool = LoadBalancedPool(list(heavy_tools), lambda url: StubSessionPool(url, heavy_tools[url]))
+    return client
+
+
+def test_list_tools_from_single_pool():
+    client = make_client({"light": ["add", "get_weather"]})
+    tools = asyncio.run(client.get_mcp_tools())
+    assert isinstance(tools, list)
+    assert [tool.name for tool in tools] == ["add", "get_weather"]
+
+
+def test_list_tools_merges_heavy_pool():
+    client = make_client({"light": ["add", "get_weather"]}, {"heavy": ["add", "summarize_meeting", "submit_summary_job"]})
+    tools = {tool.name: tool for tool in asyncio.run(client.get_mcp_tools())}
+    assert set(tools) == {"add", "get_weather", "summarize_meeting", "submit_summary_job"}
+    # 同名工具以實際會被送去的那組伺服器為準
+    assert tools["add"].description == "light"
+    assert tools["summarize_meeting"].description == "heavy"
+
+
+def test_list_tools_ignores_unreachable_heavy_pool():
+    client = make_client({"light": ["add"]}, {"heavy": ["summarize_meeting"]})
+
+    async def unreachable():
+        raise ConnectionError("refused")
+
+    client.heavy_pool.list_tools = unreachable
+    assert [tool.name for tool in asyncio.run(client.get_mcp_tools())] == ["add"]
+
+
+@pytest.fixture
+def job_client(monkeypatch):
+    JOBS.clear()
+    # 建立工作輪流送到兩台
+    turn = itertools.count()
+    monkeypatch.setattr("load_balancer.random.choice", lambda backends: backends[next(turn) % len(backends)])
+    return make_client({"light": ["add"]}, {"heavy1": JOB_TOOLS, "heavy2": JOB_TOOLS})
+
+
+def call(client: MCPClient, tool_name: str, tool_args: dict):
+    result = asyncio.run(client._call_pool(tool_name, tool_args))
+    return [json.loads(content.text) for content in result.content]
+
+
+def submit_jobs(client: MCPClient, count: int) -> list:
+    job_ids = [call(client, "submit_summary_job", {"text": "逐字稿"})[0]["job_id"] for _ in range(count)]
+    # 兩台都有工作，查詢才有送錯伺服器的可能
+    assert {job_id.split("-")[0] for job_id in job_ids} == {"heavy1", "heavy2"}
+    return job_ids
+
+
+def test_job_lookup_goes_to_the_owner_even_when_it_is_ejected(job_client):
+    job_ids = submit_jobs(job_client, 4)
+    for backend in job_client.heavy_pool.backends:
+        backend.ejected_until = time.monotonic() + 60
+    for job_id in job_ids:
+        [job] = call(job_client, "get_summary_job", {"job_id": job_id})
+        assert job["status"] == "queued"
+        assert job["server"] == job_id.split("-")[0]
+
+
+def test_unknown_job_is_found_by_asking_each_server(job_client):
+    job_ids = submit_jobs(job_client, 4)
+    # 其他 worker 建立的工作：這個 client 沒有記錄
+    job_client._job_owners.clear()
+    for job_id in job_ids:
+        assert call(job_client, "get_summary_job", {"job_id": job_id})[0]["status"] == "queued"
+        assert job_client._job_owners[job_id] == job_id.split("-")[0]
+    assert call(job_client, "get_summary_job", {"job_id": "missing"})[0]["status"] == "not_found"
+    assert "missing" not in job_client._job_owners
+
+
+def test_list_jobs_merges_every_server(job_client):
+    job_ids = submit_jobs(job_client, 4)
+    job_client._job_owners.clear()
+    listed = call(job_client, "list_summary_jobs", {"limit": 3})
+    # 依建立時間由新到舊，跨伺服器合併後取前 limit 筆
+    assert [job["job_id"] for job in listed] == job_ids[::-1][:3]
+    assert all(job_client._job_owners[job["job_id"]] == job["job_id"].split("-")[0] for job in listed)
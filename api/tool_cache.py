@@ -0,0 +1,113 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def _canonical(value):
+    # 3 與 3.0 視為相同參數
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def tool_cache_key(tool_name: str, tool_args: dict) -> str:
+    args = json.dumps(_canonical(tool_args or {}), ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{tool_name}:{args}"
+
+
+def is_idempotent(annotations: Optional[dict]) -> bool:
+    """同時宣告 readOnlyHint 與 idempotentHint：重送不會有副作用，結果可以快取，連線中斷時也可以重試。"""
+    return bool(annotations) and bool(annotations.get("readOnlyHint") and annotations.get("idempotentHint"))
+
+
+def cache_policy(annotations: dict, default_ttl: float) -> Optional[float]:
+    """
+    依工具的 MCP annotations 決定 TTL（秒）；只有同時宣告 readOnlyHint 與 idempotentHint 的工具才會快取，
+    其他（例如有副作用的 summarize_meeting）回傳 None。
+    伺服器可在 annotations 中額外帶 cacheTtlSeconds 指定該工具的 TTL。
+    """
+    if not is_idempotent(annotations):
+        return None
+    ttl = annotations.get("cacheTtlSeconds", default_ttl)
+    try:
+        ttl = float(ttl)
+    except (TypeError, ValueError):
+        return None
+    return ttl if ttl > 0 else None
+
+
+class ToolResultCache:
+    """
+    純函式型 MCP 工具結果的記憶體快取
+
+    key 為工具名稱加上正規化後的 JSON 參數，每個工具有自己的 TTL，
+    超過 max_entries 時淘汰最久沒用到的項目（LRU）。
+    只有在 policies 中的工具會被快取，policies 會隨工具 schema 刷新整個替換。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.policies = {}
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+        self.tool_stats = {}
+
+    def set_policies(self, policies: dict):
+        """policies：工具名稱 -> TTL（秒）；不再可快取的工具，其舊結果一併移除。"""
+        self.policies = dict(policies)
+        for key in [k for k in self._entries if k.split(":", 1)[0] not in self.policies]:
+            del self._entries[key]
+
+    def cacheable(self, tool_name: str) -> bool:
+        return tool_name in self.policies
+
+    def _count(self, tool_name: str, field: str):
+        counters = self.tool_stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+        counters[field] += 1
+        self.stats[field] += 1
+
+    def get(self, tool_name: str, tool_args: dict):
+        """回傳 (是否命中, 結果)。"""
+        key = tool_cache_key(tool_name, tool_args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(tool_name, "hits")
+                return True, result
+            del self._entries[key]
+            self.stats["expired"] += 1
+        self._count(tool_name, "misses")
+        return False, None
+
+    def set(self, tool_name: str, tool_args: dict, result):
+        ttl = self.policies.get(tool_name)
+        if ttl is None:
+            return
+        key = tool_cache_key(tool_name, tool_args)
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "policies": self.policies,
+            "tools": self.tool_stats,
+        }
@@ -0,0 +1,109 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+from utils.logger import logger
+
+CACHE_FORMAT_VERSION = 2
+
+
+def clean_schema(schema):
+    if schema is None:
+        return {}
+    if not isinstance(schema, dict):
+        # 如果不是 dict（可能是 function），就不處理，直接返回空 dict 或原值（視情況）
+        return {}
+    cleaned = copy.deepcopy(schema)
+    keys_to_remove = []
+    for k, v in cleaned.items():
+        if callable(v):
+            keys_to_remove.append(k)
+    for k in keys_to_remove:
+        cleaned.pop(k)
+    return cleaned
+
+
+def build_tool_specs(mcp_tools) -> list:
+    """把 MCP 的工具定義轉成 OpenAI function calling 的格式。"""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": clean_schema(getattr(tool, "inputSchema", None))
+            }
+        }
+        for tool in mcp_tools
+    ]
+
+
+def tool_annotations(mcp_tools) -> dict:
+    """工具名稱 -> MCP annotations（readOnlyHint、idempotentHint 等，以及伺服器自訂的欄位）。"""
+    annotations = {}
+    for tool in mcp_tools:
+        value = getattr(tool, "annotations", None)
+        if value is None:
+            continue
+        annotations[tool.name] = value.model_dump(exclude_none=True) if hasattr(value, "model_dump") else dict(value)
+    return annotations
+
+
+def schema_hash(tools: list, annotations: Optional[dict] = None) -> str:
+    canonical = json.dumps([tools, annotations or {}], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ToolSchemaCache:
+    """
+    工具 schema 的磁碟快取
+
+    以 server（路徑或 URL）區分，內容帶有格式版本與 schema 雜湊；
+    啟動時先載入上次的 schema，不必等連線與 list_tools 完成就能開始服務。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, server: str) -> Optional[dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable tool schema cache {self.path}: {e}")
+            return None
+        if data.get("version") != CACHE_FORMAT_VERSION or data.get("server") != server:
+            return None
+        tools, annotations = data.get("tools"), data.get("annotations")
+        if not isinstance(tools, list) or not isinstance(annotations, dict) or data.get("hash") != schema_hash(tools, annotations):
+            logger.warning(f"Tool schema cache {self.path} is inconsistent, ignoring it")
+            return None
+        return data
+
+    def save(self, server: str, tools: list, annotations: dict, digest: str):
+        data = {
+            "version": CACHE_FORMAT_VERSION,
+            "server": server,
+            "hash": digest,
+            "saved_at": time.time(),
+            "tools": tools,
+            "annotations": annotations,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # 先寫暫存檔再改名，其他行程不會讀到寫到一半的檔案
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tools-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
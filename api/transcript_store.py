@@ -0,0 +1,213 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# transcript id 是內容 sha256 的前 32 個十六進位字元；只接受這個格式，避免被拿來組出任意路徑
+TRANSCRIPT_ID = re.compile(r"^[0-9a-f]{32}$")
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class TranscriptTooLarge(Exception):
+    """上傳的逐字稿超過大小上限。"""
+
+
+class InvalidTranscript(ValueError):
+    """上傳的內容是空的或不是 UTF-8 文字。"""
+
+
+class TranscriptNotFound(LookupError):
+    """找不到指定的 transcript id（不存在、格式錯誤或已過期被清除）。"""
+
+
+@dataclass
+class TranscriptInfo:
+    id: str
+    sha256: str
+    bytes: int
+    chars: int
+    filename: Optional[str]
+    created_at: float
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["transcript_id"] = data.pop("id")
+        return data
+
+
+class TranscriptWriter:
+    """
+    接收一份上傳中的逐字稿
+
+    每個 write() 的片段都同步更新 sha256 與字元數（以增量 decoder 檢查 UTF-8），內容寫進 SpooledTemporaryFile：
+    不超過 spool_bytes 時留在記憶體，超過就自動落到磁碟，整份逐字稿不會同時出現在記憶體裡。
+    commit() 之後以內容 hash 登記到 TranscriptStore。
+    """
+
+    def __init__(self, store: "TranscriptStore"):
+        self.store = store
+        self.bytes = 0
+        self.chars = 0
+        self._hash = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        self._file = tempfile.SpooledTemporaryFile(max_size=store.spool_bytes, dir=store.tmp_dir)
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.bytes += len(chunk)
+        if self.store.max_bytes and self.bytes > self.store.max_bytes:
+            raise TranscriptTooLarge(f"transcript exceeds {self.store.max_bytes} bytes")
+        try:
+            self.chars += len(self._decoder.decode(chunk))
+        except UnicodeDecodeError as e:
+            raise InvalidTranscript("transcript must be UTF-8 text") from e
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self, filename: Optional[str] = None) -> TranscriptInfo:
+        """完成上傳並登記；會寫檔，在 async 程式中請以 asyncio.to_thread 呼叫。"""
+        try:
+            self.chars += len(self._decoder.decode(b"", final=True))
+        except UnicodeDecodeError as e:
+            raise InvalidTranscript("transcript must be UTF-8 text") from e
+        if not self.chars:
+            raise InvalidTranscript("transcript is empty")
+        return self.store._register(self._file, self._hash.hexdigest(), self.bytes, self.chars, filename)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TranscriptStore:
+    """
+    上傳逐字稿的存放位置（<directory>/<id 前兩碼>/<id>.txt 與 <id>.json 中繼資料）
+
+    API 寫入、工具伺服器以 transcript id 讀取，兩者必須看得到同一個資料夾（同一台機器或共用儲存空間）。
+    以內容 hash 作為 id，同一份逐字稿重複上傳只會存一份；超過 max_age 秒沒有再被上傳的逐字稿會被清除。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 200 * 1024 * 1024,
+        spool_bytes: int = 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+    ):
+        self.directory = directory
+        self.tmp_dir = os.path.join(directory, "tmp")
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.max_age = max_age
+
+    @classmethod
+    def from_env(cls) -> "TranscriptStore":
+        """讀取 TRANSCRIPT_DIR（預設 <DIR>/uploads）、TRANSCRIPT_MAX_MB、TRANSCRIPT_SPOOL_KB、TRANSCRIPT_MAX_AGE_HOURS。"""
+        return cls(
+            os.getenv("TRANSCRIPT_DIR") or os.path.join(os.getenv("DIR") or ".", "uploads"),
+            max_bytes=int(float(os.getenv("TRANSCRIPT_MAX_MB", 200)) * 1024 * 1024),
+            spool_bytes=int(float(os.getenv("TRANSCRIPT_SPOOL_KB", 1024)) * 1024),
+            max_age=float(os.getenv("TRANSCRIPT_MAX_AGE_HOURS", 168)) * 3600,
+        )
+
+    def writer(self) -> TranscriptWriter:
+        return TranscriptWriter(self)
+
+    def _path(self, transcript_id: str, suffix: str) -> str:
+        if not TRANSCRIPT_ID.match(transcript_id or ""):
+            raise TranscriptNotFound(f"invalid transcript id: {transcript_id!r}")
+        return os.path.join(self.directory, transcript_id[:2], f"{transcript_id}{suffix}")
+
+    def _register(self, spooled, digest: str, size: int, chars: int, filename: Optional[str]) -> TranscriptInfo:
+        transcript_id = digest[:32]
+        path = self._path(transcript_id, ".txt")
+        existing = self.info(transcript_id)
+        if existing is not None:
+            # 相同內容已經上傳過：只更新時間，延後被清除
+            os.utime(path)
+            logger.info(f"Transcript {transcript_id} already stored ({size} bytes)")
+            return existing
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先寫暫存檔再改名，讀取端不會看到寫到一半的內容；同時上傳同一份內容也只是覆蓋成相同的檔案
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        spooled.seek(0)
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(spooled, f, COPY_CHUNK_BYTES)
+        os.replace(tmp_path, path)
+        info = TranscriptInfo(transcript_id, digest, size, chars, filename, time.time())
+        meta_path = self._path(transcript_id, ".json")
+        tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(info), f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+        logger.info(f"Transcript {transcript_id} stored ({size} bytes, {chars} chars)")
+        self.cleanup()
+        return info
+
+    def info(self, transcript_id: str) -> Optional[TranscriptInfo]:
+        try:
+            with open(self._path(transcript_id, ".json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (TranscriptNotFound, OSError, ValueError):
+            return None
+        if not os.path.exists(self._path(transcript_id, ".txt")):
+            return None
+        return TranscriptInfo(**data)
+
+    def read_text(self, transcript_id: str) -> str:
+        """讀出整份逐字稿；工具真正需要內容時才呼叫（會讀檔，在 async 程式中請以 asyncio.to_thread 呼叫）。"""
+        try:
+            with open(self._path(transcript_id, ".txt"), "r", encoding="utf-8-sig") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise TranscriptNotFound(f"transcript not found: {transcript_id}") from None
+
+    def cleanup(self) -> int:
+        """刪除超過 max_age 秒的逐字稿與遺留的暫存檔，回傳刪除的逐字稿數量。"""
+        if not os.path.isdir(self.directory):
+            return 0
+        now = time.time()
+        removed = 0
+        for root, _, names in os.walk(self.directory):
+            if root == self.tmp_dir:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    expired = now - os.stat(path).st_mtime > self.max_age
+                except OSError:
+                    continue
+                if not expired:
+                    continue
+                if name.endswith(".txt"):
+                    try:
+                        os.remove(path)
+                        os.remove(path[:-len(".txt")] + ".json")
+                    except OSError:
+                        pass
+                    removed += 1
+                elif name.endswith(".tmp"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        if removed:
+            logger.info(f"Removed {removed} expired transcript(s) from {self.directory}")
+        return removed
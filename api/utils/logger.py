@@ -1,22 +1,129 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# 每個請求 / 工作的關聯 ID，同一個請求產生的所有 log 都帶有相同的值
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class ContextFilter(logging.Filter):
+    """
+    在呼叫端的執行緒 / task 中補上 correlation_id 與 service，並處理過大的訊息：
+    超過 max_chars 的訊息會被截斷，DEBUG 等級的大訊息另外依 sample_rate 抽樣保留。
+    必須掛在 QueueHandler 上（而不是 listener 端），contextvar 才會是正確的值。
+    """
+
+    def __init__(self, service: str, max_chars: int = 2000, sample_rate: float = 1.0):
+        super().__init__()
+        self.service = service
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        record.service = self.service
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            if record.levelno <= logging.DEBUG and random.random() >= self.sample_rate:
+                return False
+            record.msg = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": getattr(record, "service", None),
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def instance_log_file(path: str, instance: str) -> str:
+    """
+    在副檔名前加上行程 / 實例名稱（mcp_client.log -> mcp_client.<instance>.log），instance 為空時原樣回傳。
+    RotatingFileHandler 只能由單一行程輪替，多個 worker 或同一台機器上的多個工具伺服器各寫自己的檔案。
+    """
+    if not instance:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{instance}{ext}"
+
+
+def setup_logging(service: str, log_file: str) -> logging.handlers.QueueListener:
+    """
+    設定非同步的 log 輸出（main.py 與 mcp_server.py 共用）
+
+    所有 logger 只把紀錄放進記憶體佇列（QueueHandler），
+    實際的檔案與 stdout 寫入由 QueueListener 的背景執行緒負責，不會在 event loop 上做 I/O：
+    - 檔案：JSON 格式、DEBUG 以上、依大小輪替（LOG_MAX_BYTES / LOG_BACKUP_COUNT）
+    - stdout：文字格式、LOG_LEVEL（預設 INFO）以上
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file,
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", 5)),
+        encoding="utf-8",
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    console_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s")
+    )
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(
+        service,
+        max_chars=int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000)),
+        sample_rate=float(os.getenv("LOG_LARGE_SAMPLE_RATE", 1.0)),
+    ))
+
+    # 第三方套件（httpx、openai…）維持 INFO，專案本身的 MCPClient logger 保留 DEBUG
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    logging.getLogger("MCPClient").setLevel(logging.DEBUG)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
 
 # Configure logging
 logger = logging.getLogger("MCPClient")
-logger.setLevel(logging.DEBUG)
-
-# File handler with DEBUG level
-file_handler = logging.FileHandler("mcp_client.log")
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-)
-logger.addHandler(file_handler)
-
-# Console handler with INFO level
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-)
-logger.addHandler(console_handler)
\ No newline at end of file
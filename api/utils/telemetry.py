@@ -0,0 +1,314 @@
+import asyncio
+import json
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+from utils.logger import correlation_id
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# 每百萬 token 的美元價格（輸入, 輸出），可用 LLM_PRICES='{"model": [in, out]}' 覆寫或新增
+LLM_PRICES = {
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+}
+LLM_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, total: float, **labels):
+        """以元件自己累計的次數更新（只增不減），用於抓取時才從 snapshot 同步的 counter。"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = max(self._values.get(key, 0.0), total)
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._values.items()]
+        lines = self.header()
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """不依賴 prometheus_client 的最小實作，輸出 Prometheus text exposition format。"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, documentation: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._get(Counter, name, documentation)
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._get(Gauge, name, documentation)
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_DURATION = REGISTRY.histogram("span_duration_seconds", "Duration of traced stages by span name")
+SPAN_ERRORS = REGISTRY.counter("span_errors_total", "Traced stages that raised, by span name")
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM tokens by model and kind (prompt / completion)")
+LLM_COST = REGISTRY.counter("llm_cost_usd_total", "Estimated LLM cost in USD by model")
+LLM_CALLS = REGISTRY.counter("llm_calls_total", "LLM calls by model and caller")
+
+
+def record_llm_usage(model: str, prompt_tokens: int, completion_tokens: int, caller: str, cost: Optional[float] = None):
+    """記錄一次 LLM 呼叫的 token 數與成本；cost 未提供時依 LLM_PRICES 估算。"""
+    LLM_CALLS.inc(model=model, caller=caller)
+    LLM_TOKENS.inc(prompt_tokens or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens or 0, model=model, kind="completion")
+    if cost is None:
+        prices = LLM_PRICES.get(model)
+        if prices is None:
+            return
+        cost = ((prompt_tokens or 0) * prices[0] + (completion_tokens or 0) * prices[1]) / 1_000_000
+    LLM_COST.inc(cost, model=model)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    service: str
+    start_time: float
+    attributes: dict = field(default_factory=dict)
+    duration: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class InMemoryExporter:
+    """保留最近 max_spans 個 span，給 /traces 與測試使用。"""
+
+    def __init__(self, max_spans: int = 2000):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None, limit: Optional[int] = None) -> list:
+        with self._lock:
+            spans = [s for s in self._spans if trace_id is None or s.trace_id == trace_id]
+        return spans[-limit:] if limit else spans
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter:
+    """每個 span 寫成一行 JSON，由背景執行緒寫檔，不阻塞 event loop。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name="span-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < 500:
+                batch.append(self._queue.get_nowait())
+            with open(self.path, "a", encoding="utf-8") as f:
+                for span in batch:
+                    f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+class Tracer:
+    def __init__(self):
+        self.service = "-"
+        self.exporters = []
+        self.memory: Optional[InMemoryExporter] = None
+
+    def configure(self, service: str):
+        """
+        TRACE_EXPORTER（逗號分隔）：memory（預設，保留在記憶體供 /traces 查詢）、file（寫到 TRACE_FILE）、none
+        """
+        self.service = service
+        self.exporters = []
+        self.memory = None
+        for kind in (k.strip() for k in os.getenv("TRACE_EXPORTER", "memory").split(",")):
+            if kind == "memory":
+                self.memory = InMemoryExporter(int(os.getenv("TRACE_MEMORY_SPANS", 2000)))
+                self.exporters.append(self.memory)
+            elif kind == "file":
+                self.exporters.append(FileExporter(os.getenv("TRACE_FILE", f"traces/{service}.jsonl")))
+
+    def export(self, span: Span):
+        for exporter in self.exporters:
+            exporter.export(span)
+
+
+tracer = Tracer()
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    記錄一個階段的耗時：結束時寫入 span_duration_seconds{span=name} 並交給 exporter
+
+    父子關係由 contextvar 傳遞；沒有父 span 時以目前的 correlation_id 作為 trace_id，
+    讓 trace 與同一個請求的 log 可以互相對應。可在 Selenium 執行緒等同步程式碼中使用。
+    """
+    parent = current_span.get()
+    if parent is not None:
+        trace_id = parent.trace_id
+    else:
+        trace_id = correlation_id.get()
+        if trace_id == "-":
+            trace_id = uuid.uuid4().hex[:16]
+    current = Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent is not None else None,
+        service=tracer.service,
+        start_time=time.time(),
+        attributes=dict(attributes),
+    )
+    token = current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except (GeneratorExit, asyncio.CancelledError):
+        current.status = "cancelled"
+        raise
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        try:
+            current_span.reset(token)
+        except ValueError:
+            # async generator 在不同的 context 中被恢復時無法 reset，直接改回父 span
+            current_span.set(parent)
+        SPAN_DURATION.observe(current.duration, span=name)
+        tracer.export(current)
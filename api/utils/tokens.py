@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def estimate_tokens(text: str, model: str = "gpt-4o") -> int:
+    """估算文字的 token 數；有 tiktoken 時精確計算，否則以字元數粗估（中文約 1 字 1 token，英文約 4 字元 1 token）。"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
@@ -5,32 +5,47 @@ import { Card, CardContent } from "@/components/ui/card";
 import { Wand2, Sparkles, Loader2 } from "lucide-react";
 import { motion, AnimatePresence } from "framer-motion";
 
-function TypingText({ text }: { text: string }) {
-  const [displayed, setDisplayed] = useState("");
-  useEffect(() => {
-    let index = 0;
-    setDisplayed("");
-    if (!text) return;
-
-    const interval = setInterval(() => {
-      if (index >= text.length) {
-        clearInterval(interval);
-        return;
-      }
-      const char = text.charAt(index);
-      setDisplayed((d) => d + char);
-      index++;
-    }, 20);
+type StreamEvent =
+  | { type: "start"; conversation_id: string }
+  | { type: "token"; content: string }
+  | { type: "tool_start"; id: string; name: string; args: Record<string, unknown> }
+  | { type: "tool_end"; id: string; name: string; result: string }
+  | { type: "final"; answer: string; conversation_id: string }
+  | { type: "error"; message: string };
 
-    return () => clearInterval(interval);
-  }, [text]);
+// 讀取 /query/stream 的 Server-Sent Events，每解析出一個事件就呼叫 onEvent
+async function streamQuery(query: string, onEvent: (event: StreamEvent) => void) {
+  const res = await fetch("http://localhost:8001/query/stream", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ query }),
+  });
+  if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
 
-  return <p className="whitespace-pre-wrap text-gray-800 leading-relaxed text-lg font-sans">{displayed}</p>;
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const frames = buffer.split("\n\n");
+    buffer = frames.pop() ?? "";
+    for (const frame of frames) {
+      const data = frame
+        .split("\n")
+        .filter((line) => line.startsWith("data: "))
+        .map((line) => line.slice(6))
+        .join("\n");
+      if (data) onEvent(JSON.parse(data) as StreamEvent);
+    }
+  }
 }
 
 export default function AIInterface() {
   const [query, setQuery] = useState("");
   const [answer, setAnswer] = useState("");
+  const [status, setStatus] = useState("");
   const [loading, setLoading] = useState(false);
   const textareaRef = useRef<HTMLTextAreaElement>(null);
 
@@ -42,14 +57,31 @@ export default function AIInterface() {
     if (!query.trim()) return;
     setLoading(true);
     setAnswer("");
+    setStatus("");
     try {
-      const res = await fetch("http://localhost:8001/query", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ query }),
+      await streamQuery(query, (event) => {
+        switch (event.type) {
+          case "token":
+            setAnswer((a) => a + event.content);
+            break;
+          case "tool_start":
+            // 工具呼叫前的文字只是中間輪次，清掉等待最終回答
+            setAnswer("");
+            setStatus(`🔧 正在呼叫 ${event.name}...`);
+            break;
+          case "tool_end":
+            setStatus(`✅ ${event.name} 完成`);
+            break;
+          case "final":
+            setAnswer(String(event.answer || "沒有回覆內容。"));
+            setStatus("");
+            break;
+          case "error":
+            setAnswer("❌ 發生錯誤，請稍後再試。");
+            setStatus("");
+            break;
+        }
       });
-      const data = await res.json();
-      setAnswer(String(data.answer || "沒有回覆內容。"));
     } catch (error) {
       console.error(error);
       setAnswer("❌ 發生錯誤，請稍後再試。");
@@ -103,6 +135,8 @@ export default function AIInterface() {
         </motion.div>
       </motion.div>
 
+      {status && <p className="mb-6 text-indigo-700 text-lg font-sans">{status}</p>}
+
       <AnimatePresence>
         {answer && (
           <motion.div
@@ -114,7 +148,7 @@ export default function AIInterface() {
           >
             <Card className="bg-white shadow-2xl rounded-3xl border border-gray-200">
               <CardContent className="p-8 whitespace-pre-wrap text-gray-900 leading-loose text-lg font-serif">
-                <TypingText text={answer} />
+                <p className="whitespace-pre-wrap text-gray-800 leading-relaxed text-lg font-sans">{answer}</p>
               </CardContent>
             </Card>
           </motion.div>